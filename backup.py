@@ -137,6 +137,71 @@ def _estimate_ppb_for_object(
     return base * (1.0 + float(brightness_weight) * brightness_norm)
 
 
+def _fill_object_holes(mask: np.ndarray) -> np.ndarray:
+    """Isi lubang di dalam objek.
+
+    Hasilnya sama dengan `cv2.drawContours(..., cv2.FILLED)` untuk setiap
+    kontur RETR_EXTERNAL: latar belakang yang tidak terhubung (4-connected)
+    ke tepi gambar ikut menjadi bagian objek.
+    """
+    height, width = mask.shape
+    padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+    padded[1:-1, 1:-1] = mask
+    cv2.floodFill(padded, None, (0, 0), 128, flags=4)
+    return cv2.compare(padded[1:-1, 1:-1], 128, cv2.CMP_NE)
+
+
+def _compute_object_stats(grade_labels: np.ndarray, gray: np.ndarray) -> list[dict]:
+    """Statistik per objek dari satu kali pelabelan connected components.
+
+    `grade_labels` berisi 0 untuk latar belakang dan 1..3 untuk
+    REJECT / GRADE D / GRADE C. Objek dikembalikan dengan urutan yang sama
+    seperti `cv2.findContours(RETR_EXTERNAL)` sehingga nomor ID objek tidak
+    berubah dibanding loop per kontur yang lama.
+    """
+    num_grades = 3
+    filled_mask = _fill_object_holes(cv2.compare(grade_labels, 0, cv2.CMP_GT))
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+        filled_mask, connectivity=8, ltype=cv2.CV_32S
+    )
+    if num_labels <= 1:
+        return []
+
+    # Hanya pixel objek yang dibaca ulang, bukan seluruh frame.
+    fg_index = np.flatnonzero(filled_mask)
+    object_of_pixel = labels.ravel()[fg_index]
+    grade_of_pixel = grade_labels.ravel()[fg_index]
+
+    pixels_per_grade = np.bincount(
+        object_of_pixel * (num_grades + 1) + grade_of_pixel,
+        minlength=num_labels * (num_grades + 1),
+    ).reshape(num_labels, num_grades + 1)
+    brightness_sum = np.bincount(
+        object_of_pixel,
+        weights=gray.ravel()[fg_index],
+        minlength=num_labels,
+    )
+
+    objects = []
+    for label in range(1, num_labels):
+        x, y, w, h, area = (int(v) for v in stats[label])
+        start_x = x + int(np.argmax(labels[y, x : x + w] == label))
+        objects.append(
+            {
+                "start": (y, start_x),
+                "bounding_box": (x, y, w, h),
+                "area": area,
+                "pixels_per_grade": tuple(int(v) for v in pixels_per_grade[label, 1:]),
+                # Sama dengan cv2.mean: sum * (1 / n), bukan sum / n.
+                "mean_brightness": float(brightness_sum[label] * (1.0 / area)) if area > 0 else 0.0,
+            }
+        )
+
+    # findContours menemukan kontur dengan raster scan lalu mengembalikannya terbalik.
+    objects.sort(key=lambda obj: obj["start"], reverse=True)
+    return objects
+
+
 def _get_mysql_connection():
     host = os.getenv("MYSQL_HOST", "127.0.0.1")
     port = int(os.getenv("MYSQL_PORT", "3306"))
@@ -414,8 +479,6 @@ async def grade_using_cv(
     # TAHAP 1: KLASIFIKASI & PEWARNAAN PIKSEL (SEGMENTASI)
     # ----------------------------------------------------
     # Buat mask untuk setiap level secara EKSKLUSIF agar tidak tumpang tindih
-    level_masks = {}
-
     # Reset area dan count untuk semua level
     for level_name in INTENSITY_LEVELS.keys():
         INTENSITY_LEVELS[level_name]["area"] = 0
@@ -430,35 +493,38 @@ async def grade_using_cv(
     # Terapkan prioritas: grade terparah menang jika ada tumpang tindih
     # Urutan sudah benar di INTENSITY_LEVELS: REJECT > GRADE D > GRADE C
     processed_pixels = np.zeros(NDFI_normalized.shape, dtype=np.uint8)
+    # Label grade per pixel: 0 = latar, 1 = REJECT, 2 = GRADE D, 3 = GRADE C
+    grade_labels = np.zeros(NDFI_normalized.shape, dtype=np.uint8)
 
-    for level_name in INTENSITY_LEVELS.keys():
+    for grade_index, level_name in enumerate(INTENSITY_LEVELS.keys(), start=1):
         # Ambil mask mentah untuk level ini
         raw_mask = all_masks[level_name]
 
         # Hapus pixel yang sudah diklaim oleh grade lebih parah
         exclusive_mask = cv2.bitwise_and(raw_mask, cv2.bitwise_not(processed_pixels))
-        level_masks[level_name] = exclusive_mask
 
         # Tandai pixel ini sebagai sudah diproses
         processed_pixels = cv2.bitwise_or(processed_pixels, exclusive_mask)
 
         # Warnai isian pada gambar output sesuai warna levelnya
         labeled_image[exclusive_mask > 0] = INTENSITY_LEVELS[level_name]["color"]
+        grade_labels[exclusive_mask > 0] = grade_index
 
         # Hitung area (jumlah pixel) untuk level ini
         INTENSITY_LEVELS[level_name]["area"] = int(np.count_nonzero(exclusive_mask))
 
-        # Hitung jumlah objek terpisah untuk level ini
-        contours, _ = cv2.findContours(exclusive_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        INTENSITY_LEVELS[level_name]["count"] = len([c for c in contours if cv2.contourArea(c) > min_contour_area])
-
     # Gunakan processed_pixels sebagai master mask untuk tahap berikutnya
     processed_mask = processed_pixels
 
     # TAHAP 2: DETEKSI & PELABELAN OBJEK
     # -------------------------------------
-    # Gabungkan semua mask untuk menemukan objek/pulau kontaminasi yang utuh
+    # Satu kali connected components untuk semua objek; kontur hanya dipakai
+    # untuk filter luas minimum (contourArea), dicocokkan lewat titik awal kontur.
     contours, _ = cv2.findContours(processed_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contour_areas = {
+        (int(contour[0][0][1]), int(contour[0][0][0])): cv2.contourArea(contour)
+        for contour in contours
+    }
 
     # Dictionary untuk menyimpan informasi objek per grade
     objects_by_grade = {
@@ -471,27 +537,29 @@ async def grade_using_cv(
     ppb_total = 0.0
 
     gray_for_brightness = cv2.cvtColor(filtered_image, cv2.COLOR_BGR2GRAY)
-    for contour in contours:
-        if cv2.contourArea(contour) < min_contour_area:
-            continue
+    object_stats = [
+        obj
+        for obj in _compute_object_stats(grade_labels, gray_for_brightness)
+        if contour_areas.get(obj["start"], 0.0) >= min_contour_area
+    ]
+
+    # Hitung jumlah objek yang mengandung tiap level
+    level_names = list(INTENSITY_LEVELS.keys())
+    for grade_index, level_name in enumerate(level_names):
+        INTENSITY_LEVELS[level_name]["count"] = sum(
+            1 for obj in object_stats if obj["pixels_per_grade"][grade_index] > 0
+        )
 
+    for obj in object_stats:
         object_counter += 1
 
-        # Buat mask sementara hanya untuk kontur saat ini
-        contour_mask_temp = np.zeros_like(processed_mask)
-        cv2.drawContours(contour_mask_temp, [contour], -1, 255, cv2.FILLED)
-
         # Hitung pixel untuk setiap grade dalam objek ini
         object_pixels_per_grade = {}
         total_object_pixels = 0
         priority_level_name = None
 
         # Cek dari grade terparah ke teringan
-        for level_name in INTENSITY_LEVELS.keys():
-            # Hitung pixel untuk grade ini dalam objek
-            intersection = cv2.bitwise_and(contour_mask_temp, level_masks[level_name])
-            pixel_count = int(np.count_nonzero(intersection))
-
+        for level_name, pixel_count in zip(level_names, obj["pixels_per_grade"]):
             if pixel_count > 0:
                 grade_short = level_name.split("(")[0].strip()
                 object_pixels_per_grade[grade_short] = pixel_count
@@ -507,12 +575,8 @@ async def grade_using_cv(
             grade_short = priority_level_name.split("(")[0].strip()
             label = f"ID {object_counter}"
 
-            # Hitung kecerahan rata-rata pada area kontaminasi objek (pakai grayscale 0-255)
-            contour_pixels = cv2.countNonZero(contour_mask_temp)
-            if contour_pixels > 0:
-                mean_brightness = float(cv2.mean(gray_for_brightness, mask=contour_mask_temp)[0])
-            else:
-                mean_brightness = 0.0
+            # Kecerahan rata-rata grayscale (0-255) pada area objek
+            mean_brightness = obj["mean_brightness"]
 
             # Skor ppb per objek (kalibrasi) = bobot(REJECT,D,C) * pixel_per_grade
             px_reject = int(object_pixels_per_grade.get("REJECT", 0))
@@ -535,7 +599,7 @@ async def grade_using_cv(
                 ppb_object = 0.0
             ppb_total += ppb_object
 
-            x, y, w, h = cv2.boundingRect(contour)
+            x, y, w, h = obj["bounding_box"]
             # Gambar KOTAK dan TULISAN dengan warna prioritas tertinggi
             cv2.rectangle(labeled_image, (x, y), (x + w, y + h), priority_color, 2)
             cv2.putText(labeled_image, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, priority_color, 2)
@@ -0,0 +1,200 @@
+import os
+import subprocess
+import threading
+import time
+
+try:
+    import gphoto2 as gphoto2_lib
+except ImportError:  # python-gphoto2 opsional; tanpa itu pakai CLI gphoto2
+    gphoto2_lib = None
+
+
+def parse_camera_config(spec: str | None) -> dict:
+    """`"iso=400,shutterspeed=1/60,focusmode=Manual"` -> dict pengaturan kamera."""
+    config = {}
+    if not spec:
+        return config
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, value = item.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Invalid camera config entry: {item!r} (expected name=value)")
+        config[name.strip()] = value.strip()
+    return config
+
+
+class CameraService:
+    """Sesi kamera yang dibuka sekali dan dipakai ulang untuk setiap capture.
+
+    Dengan python-gphoto2 kamera di-init sekali, konfigurasinya di-set sekali
+    (mis. ISO, shutter, autofocus mati) dan gambar diambil langsung ke memori.
+    Jika terjadi error USB, sesi ditutup, dibuka ulang dan capture diulang
+    sekali. Tanpa python-gphoto2, capture tetap lewat CLI `gphoto2`.
+
+    Konfigurasi lewat environment variables:
+    - CAMERA_BACKEND: auto / libgphoto2 / cli
+    - CAMERA_CONFIG: pengaturan kamera, mis. "iso=400,shutterspeed=1/60,focusmode=Manual"
+    - CAMERA_DELETE_AFTER_DOWNLOAD: hapus file dari kartu kamera setelah diunduh (default 1)
+    """
+
+    def __init__(self, backend: str | None = None, config: dict | None = None):
+        if backend is None:
+            backend = os.getenv("CAMERA_BACKEND", "auto").strip().lower()
+        if config is None:
+            config = parse_camera_config(os.getenv("CAMERA_CONFIG"))
+        if backend == "auto":
+            backend = "libgphoto2" if gphoto2_lib is not None else "cli"
+        if backend == "libgphoto2" and gphoto2_lib is None:
+            raise RuntimeError("CAMERA_BACKEND=libgphoto2 requires the python-gphoto2 package")
+        if backend not in ("libgphoto2", "cli"):
+            raise ValueError(f"Unknown camera backend: {backend}")
+
+        self.backend = backend
+        self.desired_config = dict(config)
+        self.delete_after_download = os.getenv("CAMERA_DELETE_AFTER_DOWNLOAD", "1") != "0"
+
+        self._camera = None
+        self._lock = threading.Lock()
+        self.cached_config = {}
+
+        self.captures = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.capture_seconds_total = 0.0
+        self.capture_seconds_max = 0.0
+        self.last_capture_seconds = None
+
+    def open(self):
+        """Buka sesi kamera saat startup; kegagalan hanya dicatat (dicoba lagi saat capture)."""
+        if self.backend != "libgphoto2":
+            print("✅ Camera service using gphoto2 CLI")
+            return
+        try:
+            with self._lock:
+                self._ensure_open()
+            print(f"✅ Camera session opened {self.cached_config}")
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️  Camera not available at startup, will retry on capture: {e}")
+
+    def close(self):
+        with self._lock:
+            self._close_camera()
+
+    def _close_camera(self):
+        if self._camera is None:
+            return
+        try:
+            self._camera.exit()
+        except Exception:
+            pass
+        self._camera = None
+
+    def _ensure_open(self):
+        if self._camera is not None:
+            return self._camera
+        camera = gphoto2_lib.Camera()
+        camera.init()
+        try:
+            self.cached_config = self._apply_config(camera)
+        except Exception:
+            camera.exit()
+            raise
+        self._camera = camera
+        return camera
+
+    def _apply_config(self, camera) -> dict:
+        """Set konfigurasi sekali per sesi, lalu simpan nilai yang benar-benar aktif."""
+        if not self.desired_config:
+            return {}
+        config = camera.get_config()
+        for name, value in self.desired_config.items():
+            widget = config.get_child_by_name(name)
+            widget.set_value(value)
+        camera.set_config(config)
+
+        config = camera.get_config()
+        return {name: config.get_child_by_name(name).get_value() for name in self.desired_config}
+
+    def _capture_with_session(self) -> bytes:
+        camera = self._ensure_open()
+        file_path = camera.capture(gphoto2_lib.GP_CAPTURE_IMAGE)
+        camera_file = camera.file_get(file_path.folder, file_path.name, gphoto2_lib.GP_FILE_TYPE_NORMAL)
+        data = bytes(memoryview(camera_file.get_data_and_size()))
+        if self.delete_after_download:
+            camera.file_delete(file_path.folder, file_path.name)
+        return data
+
+    def _cli_command(self, *args) -> list:
+        command = []
+        for name, value in self.desired_config.items():
+            command += ["--set-config", f"{name}={value}"]
+        command += ["--capture-image-and-download", *args]
+        if not self.delete_after_download:
+            command.append("--keep")
+        return command
+
+    def _capture_cli_bytes(self) -> bytes:
+        # `--stdout`: JPEG langsung lewat pipe, tanpa file sementara di SD card.
+        # Pakai subprocess (bukan sh) karena sh men-decode stdout sebagai teks.
+        result = subprocess.run(["gphoto2", *self._cli_command("--stdout")], capture_output=True)
+        if result.returncode != 0:
+            error = result.stderr.decode(errors="replace").strip()
+            raise RuntimeError(f"gphoto2 failed ({result.returncode}): {error}")
+        data = result.stdout
+        if not data:
+            raise RuntimeError("gphoto2 returned no image data")
+        return data
+
+    def _observe(self, started: float):
+        elapsed = time.monotonic() - started
+        self.captures += 1
+        self.capture_seconds_total += elapsed
+        self.capture_seconds_max = max(self.capture_seconds_max, elapsed)
+        self.last_capture_seconds = elapsed
+
+    def _capture_session_retrying(self) -> bytes:
+        try:
+            return self._capture_with_session()
+        except gphoto2_lib.GPhoto2Error as e:
+            # Biasanya USB terputus / kamera tidur: buka sesi baru lalu coba sekali lagi.
+            print(f"⚠️  Camera error, reconnecting: {e}")
+            self.last_error = str(e)
+            self._close_camera()
+            self.reconnects += 1
+            return self._capture_with_session()
+
+    def capture_bytes(self) -> bytes:
+        """Ambil satu foto dan kembalikan isi JPEG-nya (blocking)."""
+        with self._lock:
+            started = time.monotonic()
+            try:
+                if self.backend == "libgphoto2":
+                    data = self._capture_session_retrying()
+                else:
+                    data = self._capture_cli_bytes()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                raise
+            self._observe(started)
+            return data
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "connected": self._camera is not None,
+            "config": self.cached_config or self.desired_config,
+            "captures": self.captures,
+            "errors": self.errors,
+            "reconnects": self.reconnects,
+            "last_error": self.last_error,
+            "capture_seconds": {
+                "last": self.last_capture_seconds,
+                "avg": self.capture_seconds_total / self.captures if self.captures else 0.0,
+                "max": self.capture_seconds_max,
+            },
+        }
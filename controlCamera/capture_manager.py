@@ -0,0 +1,189 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import anyio
+
+
+class CaptureQueueFull(RuntimeError):
+    """Terlalu banyak request capture yang menunggu kamera."""
+
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return int(default)
+
+
+def _get_float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return float(default)
+
+
+@dataclass
+class CapturedImage:
+    """Hasil satu capture: isi JPEG di memori + path arsip di disk."""
+
+    path: str
+    data: bytes
+    archived: asyncio.Future
+
+    async def wait_archived(self) -> str:
+        await asyncio.shield(self.archived)
+        return self.path
+
+
+class CaptureManager:
+    """Akses kamera fisik yang aman untuk request paralel.
+
+    - Path file selalu absolut per request (tanpa `os.chdir` yang global per proses).
+    - Kamera dipakai bergantian lewat `asyncio.Lock` (antrian FIFO) dengan batas antrian.
+    - Request capture yang datang dalam jendela singkat setelah capture lain
+      dimulai (mis. tombol ditekan dua kali) memakai foto yang sama.
+    - JPEG diambil ke memori; penulisan arsip ke disk berjalan di background
+      sehingga response/grading tidak menunggu I/O SD card.
+
+    Konfigurasi lewat environment variables:
+    - CAPTURE_COALESCE_SECONDS: lebar jendela penggabungan request (0 = nonaktif)
+    - CAPTURE_MAX_QUEUE: jumlah request yang boleh menunggu kamera
+    """
+
+    def __init__(self, camera, root: str, coalesce_window: float | None = None, max_queue: int | None = None):
+        if coalesce_window is None:
+            coalesce_window = _get_float_env("CAPTURE_COALESCE_SECONDS", 0.5)
+        if max_queue is None:
+            max_queue = _get_int_env("CAPTURE_MAX_QUEUE", 4)
+
+        self.camera = camera
+        self.root = os.path.abspath(root)
+        self.coalesce_window = max(float(coalesce_window), 0.0)
+        self.max_queue = max(int(max_queue), 0)
+
+        self._lock = None
+        self._waiting = 0
+        self._last = None  # (started_at, future)
+        self._reserved = set()  # path arsip yang belum selesai ditulis
+        self._archives = set()
+
+        self.captures = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.archived = 0
+        self.archive_errors = 0
+        self.archive_bytes = 0
+
+    def _new_path(self, suffix: str = "") -> str:
+        now = datetime.now()
+        folder = os.path.join(self.root, now.strftime("%Y-%m-%d"))
+        os.makedirs(folder, exist_ok=True)
+        base = "PiShots_" + now.strftime("%Y-%m-%d_%H-%M-%S") + suffix
+        path = os.path.join(folder, base + ".jpg")
+        counter = 1
+        while path in self._reserved or os.path.exists(path):
+            path = os.path.join(folder, f"{base}_{counter}.jpg")
+            counter += 1
+        self._reserved.add(path)
+        return path
+
+    async def capture_image(self, coalesce: bool = True, suffix: str = "") -> CapturedImage:
+        """Ambil satu foto ke memori; arsip ke disk ditulis di background."""
+        if coalesce and self.coalesce_window > 0 and self._last is not None:
+            started_at, future = self._last
+            if time.monotonic() - started_at <= self.coalesce_window:
+                self.coalesced += 1
+                return await asyncio.shield(future)
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        if self._lock.locked() and self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise CaptureQueueFull("Camera is busy, try again later")
+
+        # Didaftarkan saat request datang, sehingga request duplikat yang masih
+        # antre di belakang capture lain juga ikut bergabung.
+        future = asyncio.get_running_loop().create_future()
+        if coalesce:
+            self._last = (time.monotonic(), future)
+
+        try:
+            self._waiting += 1
+            try:
+                await self._lock.acquire()
+            finally:
+                self._waiting -= 1
+            try:
+                data = await anyio.to_thread.run_sync(self.camera.capture_bytes)
+            finally:
+                self._lock.release()
+
+            # Masih di dalam try: jika folder arsip gagal dibuat (disk penuh,
+            # tanpa izin tulis), request yang bergabung ikut menerima error-nya.
+            path = self._new_path(suffix)
+            print("Captured the image: " + os.path.basename(path))
+            archive = asyncio.create_task(self._archive(path, data))
+            self._archives.add(archive)
+            archive.add_done_callback(self._archive_done)
+            shot = CapturedImage(path=path, data=data, archived=archive)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Hindari warning "exception was never retrieved" jika tidak ada yang bergabung.
+                future.exception()
+            else:
+                future.cancel()
+            raise
+
+        future.set_result(shot)
+        self.captures += 1
+        return shot
+
+    async def _archive(self, path: str, data: bytes):
+        try:
+            await anyio.to_thread.run_sync(self._write_file, path, data)
+        except Exception as e:
+            self.archive_errors += 1
+            print(f"⚠️  Failed to archive capture {path}: {e}")
+            raise
+        finally:
+            self._reserved.discard(path)
+        self.archived += 1
+        self.archive_bytes += len(data)
+
+    def _archive_done(self, task):
+        self._archives.discard(task)
+        if not task.cancelled():
+            # Error sudah dicatat di `_archive`; ambil agar tidak muncul warning asyncio.
+            task.exception()
+
+    @staticmethod
+    def _write_file(path: str, data: bytes):
+        # Tulis ke file sementara lalu rename: pembaca tidak pernah melihat JPEG setengah jadi.
+        tmp_path = path + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def flush(self):
+        """Tunggu semua arsip yang masih ditulis (dipanggil saat shutdown)."""
+        if self._archives:
+            await asyncio.gather(*list(self._archives), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "busy": self._lock.locked() if self._lock is not None else False,
+            "waiting": self._waiting,
+            "captures": self.captures,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "coalesce_window": self.coalesce_window,
+            "archive_pending": len(self._archives),
+            "archived": self.archived,
+            "archive_errors": self.archive_errors,
+            "archive_bytes": self.archive_bytes,
+        }
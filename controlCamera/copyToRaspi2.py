@@ -1,4 +1,5 @@
 import cv2
+import hashlib
 import numpy as np
 import os
 import sys
@@ -23,14 +24,16 @@ if not os.path.exists(FOLDER_PATH):
 
 # --- Fungsi Inti Deteksi dan Grading ---
 
-async def detect_and_grade_aflatoxin(filepath: str):
+async def detect_and_grade_aflatoxin(filepath: str, image: np.ndarray | None = None):
     """
     Mendeteksi dan mengklasifikasikan aflatoksin pada gambar jagung.
     - Warna isian sesuai dengan grade piksel masing-masing.
     - Warna kotak dan label sesuai dengan grade terparah dalam satu area.
+    - Jika `image` sudah di-decode, file di `filepath` tidak dibaca ulang.
     """
     print("Detecting and Grading Aflatoxin using OpenCV...")
-    image = cv2.imread(str(filepath))
+    if image is None:
+        image = cv2.imread(str(filepath))
     if image is None:
         print(f"Error: Image not found at path: {filepath}")
         raise ValueError("Image not found or the path is incorrect")
@@ -163,6 +166,82 @@ async def detect_and_grade_aflatoxin(filepath: str):
     
     return response_data
 
+# --- HTTP client ke Raspberry Pi ---
+# Satu AsyncClient dipakai ulang selama aplikasi hidup: koneksi (TCP + TLS ke
+# LINK_ADDRESS) tetap keep-alive sehingga /DetectAndGrade tidak membayar
+# handshake baru setiap request.
+#
+# Environment variables:
+# - RELAY_HTTP2: 1 untuk HTTP/2 (butuh `pip install httpx[http2]`)
+# - RELAY_MAX_CONNECTIONS / RELAY_MAX_KEEPALIVE: ukuran pool koneksi
+# - RELAY_KEEPALIVE_EXPIRY: detik koneksi idle dipertahankan
+# - RELAY_CONNECT_TIMEOUT / RELAY_READ_TIMEOUT / RELAY_POOL_TIMEOUT: timeout (detik)
+
+def _get_float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return float(default)
+
+
+http_client = None
+relay_stats = {
+    "requests": 0,
+    "errors": 0,
+    "connections_opened": 0,
+    "tls_handshakes": 0,
+    "seconds_total": 0.0,
+    "seconds_max": 0.0,
+    "http2_enabled": False,
+}
+
+
+def _create_http_client() -> httpx.AsyncClient:
+    http2 = os.getenv("RELAY_HTTP2", "0") == "1"
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("⚠️  RELAY_HTTP2=1 but the 'h2' package is not installed, using HTTP/1.1")
+            http2 = False
+    relay_stats["http2_enabled"] = http2
+
+    limits = httpx.Limits(
+        max_connections=int(_get_float_env("RELAY_MAX_CONNECTIONS", 10)),
+        max_keepalive_connections=int(_get_float_env("RELAY_MAX_KEEPALIVE", 5)),
+        keepalive_expiry=_get_float_env("RELAY_KEEPALIVE_EXPIRY", 60.0),
+    )
+    timeout = httpx.Timeout(
+        connect=_get_float_env("RELAY_CONNECT_TIMEOUT", 5.0),
+        read=_get_float_env("RELAY_READ_TIMEOUT", 60.0),
+        write=_get_float_env("RELAY_CONNECT_TIMEOUT", 5.0),
+        pool=_get_float_env("RELAY_POOL_TIMEOUT", 10.0),
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+async def _trace_connection(event_name: str, info: dict):
+    # Dipanggil httpcore: hanya handshake baru yang dihitung, reuse keep-alive tidak.
+    if event_name == "connection.connect_tcp.complete":
+        relay_stats["connections_opened"] += 1
+    elif event_name == "connection.start_tls.complete":
+        relay_stats["tls_handshakes"] += 1
+
+
+def _http_pool_stats() -> dict:
+    stats = dict(relay_stats)
+    stats["seconds_avg"] = stats["seconds_total"] / stats["requests"] if stats["requests"] else 0.0
+    if http_client is None:
+        return {"open": False, **stats}
+    connections = []
+    try:
+        # Detail koneksi dari pool httpcore (bukan API publik httpx, jadi opsional).
+        connections = [str(conn.info()) for conn in http_client._transport._pool.connections]
+    except Exception:
+        pass
+    return {"open": True, "connections": connections, **stats}
+
+
 # --- Konfigurasi FastAPI ---
 app = FastAPI()
 origins = ["*"]
@@ -174,16 +253,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-async def fetch_data_from_third_party_api(url: str):
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, timeout=60.0)
+@app.on_event("startup")
+async def _open_http_client():
+    global http_client
+    http_client = _create_http_client()
+
+
+@app.on_event("shutdown")
+async def _close_http_client():
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
+async def fetch_data_from_third_party_api(url: str, save_path: str) -> tuple[bytes, str]:
+    """Stream body dari Pi: setiap chunk di-hash dan langsung ditulis ke `save_path`.
+
+    Chunk digabung sekali menjadi `bytes` (immutable) yang dipakai untuk decode
+    dan upload; SDK Storage menolak bytearray. Mengembalikan (isi, sha256 hex).
+    """
+    started = time.monotonic()
+    relay_stats["requests"] += 1
+    chunks = []
+    digest = hashlib.sha256()
+    try:
+        async with http_client.stream("GET", url, extensions={"trace": _trace_connection}) as response:
             response.raise_for_status()
-            return response
-        except httpx.HTTPStatusError as e:
+            async with aiofiles.open(save_path, "wb") as img_file:
+                async for chunk in response.aiter_bytes():
+                    digest.update(chunk)
+                    chunks.append(chunk)
+                    await img_file.write(chunk)
+        return b"".join(chunks), digest.hexdigest()
+    except BaseException as e:
+        relay_stats["errors"] += 1
+        # Jangan tinggalkan JPEG terpotong: error jaringan, gagal tulis, atau request dibatalkan.
+        if os.path.exists(save_path):
+            os.remove(save_path)
+        if isinstance(e, httpx.HTTPStatusError):
             raise HTTPException(status_code=e.response.status_code, detail=f"HTTP error from image source: {e}")
-        except httpx.RequestError as e:
+        if isinstance(e, httpx.RequestError):
             raise HTTPException(status_code=500, detail=f"Request error to image source: {e}")
+        raise
+    finally:
+        elapsed = time.monotonic() - started
+        relay_stats["seconds_total"] += elapsed
+        relay_stats["seconds_max"] = max(relay_stats["seconds_max"], elapsed)
 
 # --- Endpoints API ---
 
@@ -195,16 +311,18 @@ async def detect_and_grade_endpoint():
     """
     try:
         image_source_url = f"{LINK_ADDRESS}/captureImage"
-        image_data = await fetch_data_from_third_party_api(image_source_url)
-        
         timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
         original_save_path = os.path.join(FOLDER_PATH, f"original-{timestamp}.jpg")
-        
-        async with aiofiles.open(original_save_path, "wb") as img_file:
-            await img_file.write(image_data.content)
+
+        image_bytes, image_sha256 = await fetch_data_from_third_party_api(image_source_url, original_save_path)
         print(f"✅ Original image successfully saved to {original_save_path}")
-        
-        grading_result = await detect_and_grade_aflatoxin(original_save_path)
+
+        image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("Image from source could not be decoded")
+
+        grading_result = await detect_and_grade_aflatoxin(original_save_path, image=image)
+        grading_result["original_sha256"] = image_sha256
         
         return JSONResponse(content={"message": "Success", "data": grading_result}, status_code=200)
 
@@ -216,6 +334,11 @@ async def detect_and_grade_endpoint():
         print(f"An unexpected error occurred: {e}", file=sys.stderr)
         return JSONResponse(content={"message": f"An unexpected server error occurred: {str(e)}"}, status_code=500)
 
+@app.get("/relayStats")
+async def relay_stats_endpoint():
+    """Statistik pool HTTP ke Raspberry Pi (handshake baru vs request total)."""
+    return {"data": _http_pool_stats()}
+
 @app.get("/getImage")
 async def get_image_endpoint(filepath: str):
     """
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class UploadDiscarded(RuntimeError):
+    """Upload dibatalkan lewat `discard_upload` sebelum sempat dimulai."""
+
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return int(default)
+
+
+def _get_float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return float(default)
+
+
+def _default_transient_errors() -> tuple:
+    """Error upload yang layak diulang: koneksi, timeout, 429 dan 5xx."""
+    errors = [ConnectionError, TimeoutError]
+    try:
+        from google.api_core import exceptions as api_exceptions
+
+        errors += [api_exceptions.TooManyRequests, api_exceptions.ServerError]
+    except ImportError:
+        pass
+    try:
+        from google.auth.exceptions import TransportError
+
+        errors.append(TransportError)
+    except ImportError:
+        pass
+    try:
+        import requests
+
+        errors += [requests.exceptions.ConnectionError, requests.exceptions.Timeout]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+class StorageUploader:
+    """Upload ke Firebase Storage tanpa memblokir event loop.
+
+    SDK google-cloud-storage bersifat sinkron, jadi setiap upload dijalankan di
+    thread pool sendiri; beberapa upload (mis. gambar original dan hasil
+    grading) berjalan paralel. Data di-upload langsung dari bytes di memori.
+
+    Hanya error sementara (`transient_errors`: koneksi, timeout, 429 / 5xx)
+    yang diulang dengan exponential backoff. Error lain (mis. TypeError,
+    403 izin) langsung dilempar agar tidak tersembunyi di balik retry.
+
+    `bucket_factory()` mengembalikan bucket (default `firebase_admin.storage.bucket`),
+    sehingga bisa diganti bucket palsu saat pengujian. Dipanggil sekali saat
+    init (setelah `firebase_admin.initialize_app`), bukan dari thread upload. Untuk emulator lokal
+    cukup set `STORAGE_EMULATOR_HOST` (mis. http://127.0.0.1:9199), yang
+    dibaca otomatis oleh google-cloud-storage.
+
+    Konfigurasi lewat environment variables:
+    - FIREBASE_UPLOAD_WORKERS: jumlah upload paralel
+    - FIREBASE_UPLOAD_RETRIES: jumlah percobaan ulang setelah gagal
+    - FIREBASE_UPLOAD_BACKOFF: jeda awal (detik) sebelum percobaan ulang, dikali 2 tiap percobaan
+    - FIREBASE_MAKE_PUBLIC: 0 untuk tidak memanggil `make_public` (mis. di emulator)
+    """
+
+    def __init__(
+        self,
+        bucket_factory=None,
+        prefix: str = "image/",
+        max_workers: int | None = None,
+        retries: int | None = None,
+        backoff: float | None = None,
+        transient_errors: tuple | None = None,
+    ):
+        if bucket_factory is None:
+            from firebase_admin import storage
+
+            bucket_factory = storage.bucket
+        if max_workers is None:
+            max_workers = _get_int_env("FIREBASE_UPLOAD_WORKERS", 4)
+        if retries is None:
+            retries = _get_int_env("FIREBASE_UPLOAD_RETRIES", 3)
+        if backoff is None:
+            backoff = _get_float_env("FIREBASE_UPLOAD_BACKOFF", 0.5)
+        if transient_errors is None:
+            transient_errors = _default_transient_errors()
+
+        self.prefix = prefix
+        self.max_workers = max(int(max_workers), 1)
+        self.retries = max(int(retries), 0)
+        self.backoff = max(float(backoff), 0.0)
+        self.transient_errors = tuple(transient_errors)
+        self.make_public = os.getenv("FIREBASE_MAKE_PUBLIC", "1") != "0"
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="firebase-upload")
+        self._bucket = bucket_factory()
+        self._lock = threading.Lock()
+        self._discarded = set()
+
+        self.in_flight = 0
+        self.uploaded = 0
+        self.failed = 0
+        self.retried = 0
+        self.discarded = 0
+        self.bytes_uploaded = 0
+        self.seconds_total = 0.0
+        self.last_error = None
+
+    def _upload_sync(self, data: bytes, unique_name: str, content_type: str) -> str:
+        if unique_name in self._discarded:
+            raise UploadDiscarded(f"Upload of {unique_name} was discarded")
+        blob = self._bucket.blob(f"{self.prefix}{unique_name}")
+        blob.upload_from_string(data, content_type=content_type)
+        if self.make_public:
+            blob.make_public()
+        return blob.public_url
+
+    async def upload_bytes(self, data: bytes, unique_name: str, content_type: str = "image/jpeg") -> str:
+        """Upload `data` dan kembalikan public URL-nya."""
+        if not isinstance(data, bytes):
+            # SDK Storage hanya menerima bytes / str (mis. bytearray ditolak).
+            data = bytes(data)
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            attempt = 0
+            while True:
+                try:
+                    url = await loop.run_in_executor(self._executor, self._upload_sync, data, unique_name, content_type)
+                    break
+                except UploadDiscarded:
+                    raise
+                except Exception as e:
+                    retry = isinstance(e, self.transient_errors) and attempt < self.retries
+                    with self._lock:
+                        self.last_error = str(e)
+                        if retry:
+                            self.retried += 1
+                        else:
+                            self.failed += 1
+                    if not retry:
+                        raise
+                    delay = self.backoff * (2 ** attempt)
+                    attempt += 1
+                    print(f"⚠️  Firebase upload of {unique_name} failed ({e}), retry {attempt} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        with self._lock:
+            self.uploaded += 1
+            self.bytes_uploaded += len(data)
+            self.seconds_total += time.monotonic() - started
+        return url
+
+    def start_upload(self, data: bytes, unique_name: str, content_type: str = "image/jpeg") -> asyncio.Task:
+        """Mulai upload di background; hasilnya di-await belakangan lewat task yang dikembalikan."""
+        task = asyncio.create_task(self.upload_bytes(data, unique_name, content_type))
+        # Jika pemanggil batal menunggu (mis. grading error), error upload tetap "diambil".
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def discard_upload(self, task: asyncio.Task, unique_name: str):
+        """Buang upload yang hasilnya tidak dipakai (mis. grading gagal) tanpa meninggalkan blob yatim.
+
+        Upload yang belum mulai dilewati. Upload yang sudah berjalan di thread
+        tidak bisa dihentikan, jadi ditunggu selesai lalu blob-nya dihapus.
+        """
+        self._discarded.add(unique_name)
+        try:
+            try:
+                await asyncio.shield(task)
+            except UploadDiscarded:
+                return
+            except Exception:
+                # Upload gagal; blob bisa saja sudah tertulis (mis. make_public yang gagal).
+                pass
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(self._executor, self._delete_sync, unique_name)
+            except Exception as e:
+                print(f"⚠️  Failed to delete discarded Firebase upload {unique_name}: {e}")
+                return
+            with self._lock:
+                self.discarded += 1
+        finally:
+            self._discarded.discard(unique_name)
+
+    def _delete_sync(self, unique_name: str):
+        blob = self._bucket.blob(f"{self.prefix}{unique_name}")
+        if blob.exists():
+            blob.delete()
+
+    def shutdown(self):
+        """Tunggu upload yang masih berjalan lalu hentikan thread pool."""
+        self._executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "in_flight": self.in_flight,
+                "uploaded": self.uploaded,
+                "failed": self.failed,
+                "retried": self.retried,
+                "discarded": self.discarded,
+                "bytes_uploaded": self.bytes_uploaded,
+                "avg_seconds": self.seconds_total / self.uploaded if self.uploaded else 0.0,
+                "last_error": self.last_error,
+            }
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import zipfile
+import zlib
+
+import numpy as np
+
+
+class ArtifactCorrupt(ValueError):
+    """File artifact ada tetapi tidak bisa dibaca (terpotong / rusak)."""
+
+
+def save_artifact(path: str, meta: dict, planes: dict):
+    """Simpan plane uint8 (zlib level 1) + meta JSON ke satu file `.npz`.
+
+    zlib level 1 dipilih karena plane label (sebagian besar nol) terkompres
+    ke ~100-200 KB dalam waktu lebih singkat dari encode JPEG overlay.
+    """
+    arrays = {"meta": np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8)}
+    shapes = {}
+    for name, plane in planes.items():
+        if plane is None:
+            continue
+        plane = np.ascontiguousarray(plane, dtype=np.uint8)
+        shapes[name] = list(plane.shape)
+        arrays[name] = np.frombuffer(zlib.compress(plane.tobytes(), 1), dtype=np.uint8)
+    arrays["shapes"] = np.frombuffer(json.dumps(shapes).encode("utf-8"), dtype=np.uint8)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path: str, names=("labels",)) -> tuple[dict, dict]:
+    """Baca meta + plane yang diminta; plane yang tidak disimpan bernilai None.
+
+    FileNotFoundError diteruskan apa adanya; isi yang rusak menjadi `ArtifactCorrupt`.
+    """
+    try:
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            shapes = json.loads(data["shapes"].tobytes().decode("utf-8"))
+            planes = {}
+            for name in names:
+                if name not in shapes:
+                    planes[name] = None
+                    continue
+                raw = zlib.decompress(data[name].tobytes())
+                planes[name] = np.frombuffer(raw, dtype=np.uint8).reshape(shapes[name])
+    except FileNotFoundError:
+        raise
+    except (OSError, EOFError, KeyError, ValueError, zlib.error, zipfile.BadZipFile) as e:
+        raise ArtifactCorrupt(f"Grading artifact {path} is unreadable: {e}") from e
+    return meta, planes
+
+
+class GradingArtifactStore:
+    """Artifact per run grading: plane label grade (+ opsional NDFI & grayscale).
+
+    Dengan mode "lazy", grading tidak menggambar / encode overlay; yang
+    disimpan hanya artifact kecil ini. Overlay di `graded_image_path` baru
+    dirender (lalu disimpan sebagai cache) saat pertama kali diminta. Plane
+    NDFI + grayscale memungkinkan re-threshold run lama tanpa decode dan blur
+    ulang gambar original.
+
+    Konfigurasi lewat environment variables:
+    - GRADING_OVERLAY_MODE: lazy (default) / eager (overlay langsung digambar seperti dulu)
+    - GRADING_ARTIFACT_DIR: folder artifact
+    - GRADING_ARTIFACT_NDFI: 1 untuk ikut menyimpan plane NDFI + grayscale (~10 MB per run 24 MP)
+    """
+
+    def __init__(self, root: str | None = None, mode: str | None = None, store_ndfi: bool | None = None):
+        if root is None:
+            root = os.getenv("GRADING_ARTIFACT_DIR", "/home/ubuntu/fotohasil/artifacts")
+        if mode is None:
+            mode = os.getenv("GRADING_OVERLAY_MODE", "lazy").strip().lower()
+        if store_ndfi is None:
+            store_ndfi = os.getenv("GRADING_ARTIFACT_NDFI", "0") == "1"
+        if mode not in ("lazy", "eager"):
+            raise ValueError("GRADING_OVERLAY_MODE must be 'lazy' or 'eager'")
+
+        self.root = root
+        self.mode = mode
+        self.store_ndfi = bool(store_ndfi)
+
+        self._rendering = {}
+        self.rendered = 0
+        self.render_errors = 0
+
+    @property
+    def lazy(self) -> bool:
+        return self.mode == "lazy"
+
+    def path_for(self, graded_image_path: str) -> str:
+        name = os.path.splitext(os.path.basename(str(graded_image_path)))[0]
+        return os.path.join(self.root, name + ".npz")
+
+    def exists(self, graded_image_path: str) -> bool:
+        return os.path.isfile(self.path_for(graded_image_path))
+
+    def available(self, graded_image_path: str) -> bool:
+        """Overlay sudah ada, atau bisa dirender dari artifact."""
+        return os.path.isfile(str(graded_image_path)) or self.exists(graded_image_path)
+
+    async def ensure_rendered(self, graded_image_path: str, render) -> bool:
+        """Pastikan file overlay ada; `render(artifact_path, out_path)` dipanggil sekali per file.
+
+        Mengembalikan False jika overlay tidak ada dan tidak punya artifact.
+        """
+        if os.path.isfile(graded_image_path):
+            return True
+        artifact_path = self.path_for(graded_image_path)
+        if not os.path.isfile(artifact_path):
+            return False
+
+        future = self._rendering.get(graded_image_path)
+        if future is None:
+            future = asyncio.ensure_future(render(artifact_path, graded_image_path))
+            self._rendering[graded_image_path] = future
+            future.add_done_callback(lambda _: self._rendering.pop(graded_image_path, None))
+            future.add_done_callback(self._record_render)
+        await asyncio.shield(future)
+        return True
+
+    def _record_render(self, future):
+        if future.cancelled() or future.exception() is not None:
+            self.render_errors += 1
+        else:
+            self.rendered += 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "root": self.root,
+            "store_ndfi": self.store_ndfi,
+            "rendering": len(self._rendering),
+            "rendered": self.rendered,
+            "render_errors": self.render_errors,
+        }
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return int(default)
+
+
+def hash_image_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash isi file gambar (bukan path-nya), dibaca per potongan."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_image_array(image: np.ndarray) -> str:
+    """Hash frame yang sudah di-decode (shape + dtype + pixel)."""
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image.shape}|{image.dtype.str}".encode("ascii"))
+    digest.update(memoryview(np.ascontiguousarray(image)).cast("B"))
+    return digest.hexdigest()
+
+
+def make_cache_key(image_digest: str, thresholds, ppb_params: dict, roi, engine_version: str) -> str:
+    payload = {
+        "image": image_digest,
+        "thresholds": [int(t) for t in thresholds],
+        "ppb": {key: float(ppb_params[key]) for key in sorted(ppb_params)},
+        "roi": roi,
+        "engine": engine_version,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class GradingResultCache:
+    """Cache hasil grading: tier LRU di memori + tier JSON di disk.
+
+    Konfigurasi lewat environment variables:
+    - GRADING_CACHE_MEMORY_ITEMS: jumlah entri di memori (0 = nonaktif)
+    - GRADING_CACHE_DIR: folder tier disk (kosong = tanpa tier disk)
+    - GRADING_CACHE_DISK_MAX_BYTES: batas ukuran tier disk, file paling
+      lama tidak dipakai dihapus lebih dulu
+    """
+
+    def __init__(
+        self,
+        memory_items: int | None = None,
+        disk_dir: str | None = None,
+        disk_max_bytes: int | None = None,
+    ):
+        if memory_items is None:
+            memory_items = _get_int_env("GRADING_CACHE_MEMORY_ITEMS", 256)
+        if disk_dir is None:
+            disk_dir = os.getenv("GRADING_CACHE_DIR", "/home/ubuntu/fotohasil/cache")
+        if disk_max_bytes is None:
+            disk_max_bytes = _get_int_env("GRADING_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024)
+
+        self.memory_items = max(int(memory_items), 0)
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = max(int(disk_max_bytes), 0)
+
+        self._memory = OrderedDict()
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.disk_evictions = 0
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _remember(self, key: str, value: dict):
+        if self.memory_items == 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_memory(self, key: str) -> dict | None:
+        """Baca tier memori; hit / miss dicatat pemanggil lewat `record_*` setelah entri divalidasi."""
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+        return value
+
+    def get_disk(self, key: str) -> dict | None:
+        """Baca tier disk (blocking, panggil dari thread)."""
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            # Perbarui mtime agar eviction berperilaku seperti LRU.
+            os.utime(path, None)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"⚠️  Ignoring unreadable grading cache entry {path}: {e}")
+            return None
+        return value
+
+    def record_memory_hit(self):
+        self.memory_hits += 1
+
+    def record_disk_hit(self, key: str, value: dict):
+        self.disk_hits += 1
+        self._remember(key, value)
+
+    def record_miss(self):
+        self.misses += 1
+
+    def put_memory(self, key: str, value: dict):
+        self.stores += 1
+        self._remember(key, value)
+
+    def put_disk(self, key: str, value: dict):
+        """Tulis tier disk lalu evict file terlama jika melebihi batas (blocking)."""
+        if not self.disk_dir or self.disk_max_bytes == 0:
+            return
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        with self._disk_lock:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+
+            path = self._disk_path(key)
+            try:
+                previous_size = os.path.getsize(path)
+            except OSError:
+                previous_size = 0
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._disk_bytes += len(data) - previous_size
+
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _scan_disk(self):
+        entries = []
+        try:
+            with os.scandir(self.disk_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _evict_disk(self):
+        entries = sorted(self._scan_disk(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        # Sisakan ruang ~10% agar tidak evict di setiap penulisan.
+        target = int(self.disk_max_bytes * 0.9)
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.disk_evictions += 1
+        self._disk_bytes = total
+
+    def clear(self):
+        self._memory.clear()
+        if not self.disk_dir:
+            return
+        with self._disk_lock:
+            for path, _, _ in self._scan_disk():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "memory_items": len(self._memory),
+            "memory_capacity": self.memory_items,
+            "disk_dir": self.disk_dir,
+            "disk_bytes": self._disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes,
+            "disk_evictions": self.disk_evictions,
+        }
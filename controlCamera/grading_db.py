@@ -0,0 +1,276 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import anyio
+import pymysql
+
+
+class DatabasePoolTimeout(pymysql.err.OperationalError):
+    """Tidak ada koneksi MySQL yang bebas dalam batas waktu tunggu."""
+
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return int(default)
+
+
+def _get_float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return float(default)
+
+
+def connect_mysql():
+    host = os.getenv("MYSQL_HOST", "127.0.0.1")
+    port = int(os.getenv("MYSQL_PORT", "3306"))
+    user = os.getenv("MYSQL_USER", "aflatoksin")
+    password = os.getenv("MYSQL_PASSWORD", "aflatoksin")
+    database = os.getenv("MYSQL_DATABASE", "aflatoksin")
+
+    return pymysql.connect(
+        host=host,
+        port=port,
+        user=user,
+        password=password,
+        database=database,
+        charset="utf8mb4",
+        autocommit=False,
+        connect_timeout=_get_float_env("MYSQL_CONNECT_TIMEOUT", 5.0),
+    )
+
+
+class _LatencyStats:
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_seconds": self.total_seconds,
+            "avg_seconds": self.total_seconds / self.count if self.count else 0.0,
+            "max_seconds": self.max_seconds,
+        }
+
+
+class MySQLPool:
+    """Pool koneksi PyMySQL dengan batas ukuran dan health check.
+
+    Query dijalankan di thread lewat `run()` dengan limiter sendiri, sehingga
+    tidak memakai kuota thread default anyio. Konfigurasi lewat environment:
+    - MYSQL_POOL_SIZE: jumlah koneksi maksimum
+    - MYSQL_POOL_TIMEOUT: lama menunggu koneksi bebas (detik)
+    - MYSQL_POOL_PING_INTERVAL: koneksi yang menganggur lebih lama dari ini di-ping dulu
+    - MYSQL_POOL_RECYCLE: umur maksimum koneksi sebelum dibuat ulang (detik)
+
+    `on_query(name, seconds, error)` (opsional) dipanggil setiap `call()` selesai:
+    `name` = nama fungsi query, `seconds` None jika koneksi tidak didapat.
+    """
+
+    def __init__(
+        self,
+        size: int | None = None,
+        timeout: float | None = None,
+        ping_interval: float | None = None,
+        recycle: float | None = None,
+        connect=connect_mysql,
+        on_query=None,
+    ):
+        if size is None:
+            size = _get_int_env("MYSQL_POOL_SIZE", 4)
+        if timeout is None:
+            timeout = _get_float_env("MYSQL_POOL_TIMEOUT", 10.0)
+        if ping_interval is None:
+            ping_interval = _get_float_env("MYSQL_POOL_PING_INTERVAL", 30.0)
+        if recycle is None:
+            recycle = _get_float_env("MYSQL_POOL_RECYCLE", 3600.0)
+
+        self.size = max(int(size), 1)
+        self.timeout = max(float(timeout), 0.0)
+        self.ping_interval = max(float(ping_interval), 0.0)
+        self.recycle = float(recycle) if recycle and recycle > 0 else None
+        self._connect = connect
+        self.on_query = on_query
+
+        self._lock = threading.Condition()
+        self._idle = []  # (conn, created_at, last_used_at)
+        self._in_use = 0
+        self._waiting = 0
+        self._closed = True
+        self._limiter = None
+
+        self.connections_created = 0
+        self.connections_discarded = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.wait_stats = _LatencyStats()
+        self.query_stats = _LatencyStats()
+
+    def open(self):
+        """Dipanggil saat startup; koneksi pertama dibuka agar error terlihat di log."""
+        self._closed = False
+        try:
+            with self.connection():
+                pass
+            print(f"✅ MySQL pool ready (size={self.size})")
+        except Exception as e:
+            print(f"⚠️  MySQL not reachable at startup, pool will retry on demand: {e}")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _checkout(self, started: float):
+        deadline = started + self.timeout
+        with self._lock:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._closed:
+                        raise pymysql.err.InterfaceError("MySQL pool is closed")
+                    if self._idle:
+                        self._in_use += 1
+                        entry = self._idle.pop()
+                        break
+                    if self._in_use < self.size:
+                        self._in_use += 1
+                        entry = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise DatabasePoolTimeout(f"No MySQL connection available within {self.timeout:g}s")
+                    self._lock.wait(remaining)
+            finally:
+                self._waiting -= 1
+                self.wait_stats.observe(time.monotonic() - started)
+
+        try:
+            return self._prepare(entry)
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+                self._lock.notify()
+            raise
+
+    def _prepare(self, entry):
+        now = time.monotonic()
+        if entry is not None:
+            conn, created_at, last_used_at = entry
+            if self.recycle is not None and now - created_at > self.recycle:
+                self._discard(conn)
+            elif now - last_used_at > self.ping_interval:
+                try:
+                    conn.ping(reconnect=False)
+                    return conn, created_at
+                except Exception:
+                    self._discard(conn)
+            else:
+                return conn, created_at
+
+        conn = self._connect()
+        self.connections_created += 1
+        return conn, now
+
+    def _discard(self, conn):
+        self.connections_discarded += 1
+        self._close_quietly(conn)
+
+    def _checkin(self, conn, created_at, healthy: bool):
+        with self._lock:
+            self._in_use -= 1
+            if healthy and not self._closed:
+                self._idle.append((conn, created_at, time.monotonic()))
+                conn = None
+            self._lock.notify()
+        if conn is not None:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self, queued_at: float | None = None):
+        """Pinjam satu koneksi; rollback dan buang koneksi jika terjadi error."""
+        conn, created_at = self._checkout(time.monotonic() if queued_at is None else queued_at)
+        healthy = True
+        try:
+            yield conn
+        except Exception as e:
+            self.errors += 1
+            try:
+                conn.rollback()
+            except Exception:
+                healthy = False
+            if isinstance(e, (pymysql.err.OperationalError, pymysql.err.InterfaceError)):
+                healthy = False
+            raise
+        finally:
+            self._checkin(conn, created_at, healthy)
+
+    def call(self, func, *args, queued_at: float | None = None):
+        """Jalankan `func(conn, *args)` dengan koneksi dari pool (blocking)."""
+        seconds = None
+        error = None
+        try:
+            with self.connection(queued_at) as conn:
+                started = time.monotonic()
+                try:
+                    return func(conn, *args)
+                finally:
+                    seconds = time.monotonic() - started
+                    self.query_stats.observe(seconds)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.on_query is not None:
+                self.on_query(getattr(func, "__name__", "query"), seconds, error)
+
+    async def run(self, func, *args):
+        """Seperti `call`, tetapi di thread terpisah dengan limiter seukuran pool."""
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.size)
+        # Waktu antre di limiter ikut dihitung sebagai pool wait.
+        queued_at = time.monotonic()
+        return await anyio.to_thread.run_sync(
+            lambda: self.call(func, *args, queued_at=queued_at), limiter=self._limiter
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+            in_use = self._in_use
+            waiting = self._waiting
+        return {
+            "size": self.size,
+            "idle": idle,
+            "in_use": in_use,
+            "waiting": waiting,
+            "connections_created": self.connections_created,
+            "connections_discarded": self.connections_discarded,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "pool_wait": self.wait_stats.as_dict(),
+            "query": self.query_stats.as_dict(),
+        }
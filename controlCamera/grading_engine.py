@@ -0,0 +1,401 @@
+import cv2
+import numpy as np
+
+
+GRADE_SHORT_NAMES = ("REJECT", "GRADE D", "GRADE C")
+
+# Naikkan setiap kali angka hasil grading bisa berubah (dipakai sebagai kunci cache).
+ENGINE_VERSION = "1"
+
+
+def _build_ndfi_lut() -> np.ndarray:
+    """Tabel 256x256 uint8: [B, G] -> NDFI_normalized.
+
+    Dihitung dengan rumus float yang sama persis dengan versi lama untuk
+    semua pasangan (B, G), jadi hasil lookup identik bit per bit.
+    """
+    B, G = np.meshgrid(np.arange(256, dtype=float), np.arange(256, dtype=float), indexing="ij")
+    NDFI = (B - G) / (B + G + 0.0001)
+    return ((NDFI + 1.0) * 127.5).astype(np.uint8)
+
+
+# Dibuat sekali saat import; worker hasil fork memakai halaman memori yang sama.
+NDFI_LUT = _build_ndfi_lut()
+NDFI_LUT.flags.writeable = False
+_NDFI_LUT_FLAT = NDFI_LUT.ravel()
+
+
+def compute_ndfi_normalized(filtered_image: np.ndarray, rows_per_chunk: int = 256) -> np.ndarray:
+    """NDFI_normalized dari gambar BGR uint8 lewat tabel (B, G), tanpa array float.
+
+    Diproses per potongan baris agar indeks sementara tetap kecil.
+    """
+    B = cv2.extractChannel(filtered_image, 0)
+    G = cv2.extractChannel(filtered_image, 1)
+    ndfi_normalized = np.empty(B.shape, dtype=np.uint8)
+    for row in range(0, B.shape[0], rows_per_chunk):
+        index = B[row : row + rows_per_chunk].astype(np.intp)
+        index <<= 8
+        index |= G[row : row + rows_per_chunk]
+        ndfi_normalized[row : row + rows_per_chunk] = _NDFI_LUT_FLAT[index]
+    return ndfi_normalized
+
+
+def build_grade_lut(level_ranges) -> np.ndarray:
+    """LUT 256 entri: nilai NDFI_normalized -> label grade (0 = bukan objek).
+
+    `level_ranges` berurutan dari grade terparah. Diisi dari yang teringan
+    supaya grade terparah selalu menang jika rentangnya tumpang tindih.
+    """
+    lut = np.zeros(256, dtype=np.uint8)
+    for grade_index in range(len(level_ranges), 0, -1):
+        low, high = level_ranges[grade_index - 1]
+        low = max(int(low), 0)
+        high = min(int(high), 255)
+        if low <= high:
+            lut[low : high + 1] = grade_index
+    return lut
+
+
+def classify_ndfi(ndfi_normalized: np.ndarray, level_ranges) -> np.ndarray:
+    """Ubah NDFI_normalized menjadi satu plane label grade uint8 (satu kali LUT)."""
+    return cv2.LUT(ndfi_normalized, build_grade_lut(level_ranges))
+
+
+def grade_label_histogram(grade_labels: np.ndarray, num_grades: int, rows_per_chunk: int = 256) -> np.ndarray:
+    """Jumlah pixel per label grade (indeks 0 = latar belakang).
+
+    Dihitung per potongan baris agar buffer int64 dari bincount tetap kecil.
+    """
+    counts = np.zeros(num_grades + 1, dtype=np.int64)
+    for row in range(0, grade_labels.shape[0], rows_per_chunk):
+        chunk = grade_labels[row : row + rows_per_chunk].ravel()
+        counts += np.bincount(chunk, minlength=num_grades + 1)[: num_grades + 1]
+    return counts
+
+
+def paint_grade_overlay(
+    image: np.ndarray,
+    grade_labels: np.ndarray,
+    palette,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Warnai pixel objek sesuai palet grade lewat LUT warna.
+
+    Tanpa `out`, hasilnya salinan `image`. Dengan `out` (misalnya view ROI
+    dari gambar penuh), pixel objek langsung ditulis ke sana.
+    """
+    palette_lut = np.zeros((1, 256, 3), dtype=np.uint8)
+    for grade_index, color in enumerate(palette, start=1):
+        palette_lut[0, grade_index] = color
+    colored = cv2.LUT(cv2.merge((grade_labels, grade_labels, grade_labels)), palette_lut)
+
+    overlay = image.copy() if out is None else out
+    cv2.copyTo(colored, cv2.compare(grade_labels, 0, cv2.CMP_GT), overlay)
+    return overlay
+
+
+def vectorize_grade_labels(
+    grade_labels: np.ndarray,
+    num_grades: int,
+    offset: tuple[int, int] = (0, 0),
+    epsilon: float = 1.0,
+    min_area: float = 0.0,
+) -> list:
+    """Plane label grade -> poligon tersederhanakan per grade (pengganti isian overlay).
+
+    Hasil: satu list per grade (urutan label 1..num_grades); setiap poligon
+    adalah list ring `[x0, y0, x1, y1, ...]` dengan ring pertama = batas luar
+    dan sisanya lubang (diisi dengan aturan even-odd). Koordinat sudah
+    ditambah `offset` (posisi ROI di gambar penuh).
+    """
+    dx, dy = int(offset[0]), int(offset[1])
+    polygons_per_grade = []
+    for grade_index in range(1, num_grades + 1):
+        mask = cv2.compare(grade_labels, grade_index, cv2.CMP_EQ)
+        contours, hierarchy = cv2.findContours(mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE, offset=(dx, dy))
+        polygons = []
+        if hierarchy is not None:
+            hierarchy = hierarchy[0]
+            for outer_index, contour in enumerate(contours):
+                # RETR_CCOMP: kontur tanpa parent adalah batas luar, anak-anaknya lubang.
+                if hierarchy[outer_index][3] != -1:
+                    continue
+                if min_area > 0 and cv2.contourArea(contour) < min_area:
+                    continue
+                rings = [cv2.approxPolyDP(contour, epsilon, True).ravel().tolist()]
+                hole_index = hierarchy[outer_index][2]
+                while hole_index != -1:
+                    hole = contours[hole_index]
+                    if min_area <= 0 or cv2.contourArea(hole) >= min_area:
+                        rings.append(cv2.approxPolyDP(hole, epsilon, True).ravel().tolist())
+                    hole_index = hierarchy[hole_index][0]
+                polygons.append(rings)
+        polygons_per_grade.append(polygons)
+    return polygons_per_grade
+
+
+# medianBlur(5) + GaussianBlur(9x9) membaca paling jauh 2 + 4 pixel dari tepi.
+_FILTER_PAD = 8
+
+
+def filter_frame(image: np.ndarray, box: tuple[int, int, int, int] | None = None) -> np.ndarray:
+    """Median + Gaussian blur, opsional hanya pada `box` (x, y, w, h).
+
+    Potongan diberi margin agar pixel di dalam box sama persis dengan hasil
+    blur pada frame penuh.
+    """
+    if box is None:
+        filtered = cv2.medianBlur(image, 5)
+        return cv2.GaussianBlur(filtered, (9, 9), 0)
+
+    height, width = image.shape[:2]
+    x, y, w, h = box
+    pad_x0 = max(x - _FILTER_PAD, 0)
+    pad_y0 = max(y - _FILTER_PAD, 0)
+    pad_x1 = min(x + w + _FILTER_PAD, width)
+    pad_y1 = min(y + h + _FILTER_PAD, height)
+
+    filtered = cv2.medianBlur(image[pad_y0:pad_y1, pad_x0:pad_x1], 5)
+    filtered = cv2.GaussianBlur(filtered, (9, 9), 0)
+    return filtered[y - pad_y0 : y - pad_y0 + h, x - pad_x0 : x - pad_x0 + w]
+
+
+def parse_roi_spec(spec: str | None) -> dict | None:
+    """Parse konfigurasi ROI.
+
+    Format yang didukung:
+    - "x,y,w,h": persegi panjang (pixel)
+    - "x1,y1;x2,y2;x3,y3;...": poligon, minimal 3 titik
+    - "auto": deteksi area kernel otomatis di resolusi rendah
+    - kosong / "none" / "full": tanpa ROI (frame penuh)
+    """
+    if spec is None:
+        return None
+    spec = str(spec).strip()
+    if spec == "" or spec.lower() in ("none", "full", "null"):
+        return None
+    if spec.lower() == "auto":
+        return {"mode": "auto"}
+
+    try:
+        if ";" in spec:
+            points = []
+            for point in spec.split(";"):
+                if not point.strip():
+                    continue
+                px, py = (int(float(v)) for v in point.split(","))
+                points.append((px, py))
+            if len(points) < 3:
+                raise ValueError
+            return {"mode": "polygon", "points": points}
+
+        x, y, w, h = (int(float(v)) for v in spec.split(","))
+    except ValueError:
+        raise ValueError("ROI must be 'x,y,w,h', 'x1,y1;x2,y2;x3,y3;...' or 'auto'")
+    if w <= 0 or h <= 0:
+        raise ValueError("ROI width and height must be positive")
+    return {"mode": "rect", "rect": (x, y, w, h)}
+
+
+def detect_kernel_roi(
+    image: np.ndarray,
+    max_ndfi: int,
+    max_side: int = 512,
+    slack: int = 16,
+    min_brightness: int = 48,
+    margin: int = 64,
+) -> tuple[int, int, int, int] | None:
+    """Cari kotak pembatas area kernel dari versi kecil gambar (x, y, w, h).
+
+    Kandidat kernel = pixel dengan NDFI <= `max_ndfi` + `slack` yang tidak
+    gelap (B + G >= `min_brightness`), jadi latar tray dan bingkai hitam
+    dibuang. Bintik yang jauh lebih kecil dari faktor skala bisa terlewat.
+    """
+    height, width = image.shape[:2]
+    scale = min(float(max_side) / max(height, width), 1.0)
+    if scale < 1.0:
+        small = cv2.resize(
+            image,
+            (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1)),
+            interpolation=cv2.INTER_AREA,
+        )
+    else:
+        small = image
+
+    ndfi_small = compute_ndfi_normalized(small)
+    brightness = cv2.add(cv2.extractChannel(small, 0), cv2.extractChannel(small, 1))
+    candidates = cv2.bitwise_and(
+        cv2.compare(ndfi_small, min(int(max_ndfi) + slack, 255), cv2.CMP_LE),
+        cv2.compare(brightness, min_brightness, cv2.CMP_GE),
+    )
+    points = cv2.findNonZero(candidates)
+    if points is None:
+        return None
+
+    x, y, w, h = cv2.boundingRect(points)
+    x0 = max(int(x / scale) - margin, 0)
+    y0 = max(int(y / scale) - margin, 0)
+    x1 = min(int(np.ceil((x + w) / scale)) + margin, width)
+    y1 = min(int(np.ceil((y + h) / scale)) + margin, height)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def resolve_roi(roi: dict | None, image: np.ndarray, max_ndfi: int) -> dict | None:
+    """Ubah ROI hasil `parse_roi_spec` menjadi kotak yang sudah di-clip ke gambar.
+
+    Hasil: dict dengan mode, x, y, width, height dan (untuk poligon) points
+    dalam koordinat gambar penuh. None berarti frame penuh.
+    """
+    if roi is None:
+        return None
+
+    height, width = image.shape[:2]
+    points = None
+    if roi["mode"] == "auto":
+        box = detect_kernel_roi(image, max_ndfi)
+        if box is None:
+            box = (0, 0, 0, 0)
+    elif roi["mode"] == "polygon":
+        points = np.array(roi["points"], dtype=np.int32)
+        box = cv2.boundingRect(points)
+    else:
+        box = roi["rect"]
+
+    x, y, w, h = box
+    x0 = min(max(int(x), 0), width)
+    y0 = min(max(int(y), 0), height)
+    x1 = min(max(int(x + w), 0), width)
+    y1 = min(max(int(y + h), 0), height)
+    if roi["mode"] != "auto" and (x1 <= x0 or y1 <= y0):
+        raise ValueError("ROI is outside the image")
+
+    resolved = {"mode": roi["mode"], "x": x0, "y": y0, "width": x1 - x0, "height": y1 - y0}
+    if points is not None:
+        resolved["points"] = [[int(px), int(py)] for px, py in points]
+    return resolved
+
+
+def _fill_object_holes(mask: np.ndarray) -> np.ndarray:
+    """Isi lubang di dalam objek.
+
+    Hasilnya sama dengan `cv2.drawContours(..., cv2.FILLED)` untuk setiap
+    kontur RETR_EXTERNAL: latar belakang yang tidak terhubung (4-connected)
+    ke tepi gambar ikut menjadi bagian objek.
+    """
+    height, width = mask.shape
+    padded = np.zeros((height + 2, width + 2), dtype=np.uint8)
+    padded[1:-1, 1:-1] = mask
+    cv2.floodFill(padded, None, (0, 0), 128, flags=4)
+    return cv2.compare(padded[1:-1, 1:-1], 128, cv2.CMP_NE)
+
+
+def _label_objects(foreground: np.ndarray, gray: np.ndarray):
+    """Connected components dari mask objek yang lubangnya sudah diisi.
+
+    Mengembalikan (jumlah label, label image, stats, indeks pixel objek,
+    label per pixel objek, jumlah kecerahan per label) atau None jika kosong.
+    """
+    filled_mask = _fill_object_holes(foreground)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+        filled_mask, connectivity=8, ltype=cv2.CV_32S
+    )
+    if num_labels <= 1:
+        return None
+
+    # Hanya pixel objek yang dibaca ulang, bukan seluruh frame.
+    fg_index = np.flatnonzero(filled_mask)
+    object_of_pixel = labels.ravel()[fg_index]
+    brightness_sum = np.bincount(
+        object_of_pixel,
+        weights=gray.ravel()[fg_index],
+        minlength=num_labels,
+    )
+    return num_labels, labels, stats, fg_index, object_of_pixel, brightness_sum
+
+
+def _ordered_objects(num_labels, labels, stats, brightness_sum) -> list[dict]:
+    """Data dasar per objek dengan urutan `cv2.findContours(RETR_EXTERNAL)`."""
+    objects = []
+    for label in range(1, num_labels):
+        x, y, w, h, area = (int(v) for v in stats[label])
+        start_x = x + int(np.argmax(labels[y, x : x + w] == label))
+        objects.append(
+            {
+                "label": label,
+                "start": (y, start_x),
+                "bounding_box": (x, y, w, h),
+                "area": area,
+                # Sama dengan cv2.mean: sum * (1 / n), bukan sum / n.
+                "mean_brightness": float(brightness_sum[label] * (1.0 / area)) if area > 0 else 0.0,
+            }
+        )
+
+    # findContours menemukan kontur dengan raster scan lalu mengembalikannya terbalik.
+    objects.sort(key=lambda obj: obj["start"], reverse=True)
+    return objects
+
+
+def compute_object_stats(grade_labels: np.ndarray, gray: np.ndarray) -> list[dict]:
+    """Statistik per objek dari satu kali pelabelan connected components.
+
+    `grade_labels` berisi 0 untuk latar belakang dan 1..3 untuk
+    REJECT / GRADE D / GRADE C. Objek dikembalikan dengan urutan yang sama
+    seperti `cv2.findContours(RETR_EXTERNAL)` sehingga nomor ID objek tidak
+    berubah dibanding loop per kontur yang lama.
+    """
+    num_grades = len(GRADE_SHORT_NAMES)
+    labeled = _label_objects(cv2.compare(grade_labels, 0, cv2.CMP_GT), gray)
+    if labeled is None:
+        return []
+    num_labels, labels, stats, fg_index, object_of_pixel, brightness_sum = labeled
+
+    grade_of_pixel = grade_labels.ravel()[fg_index]
+    pixels_per_grade = np.bincount(
+        object_of_pixel * (num_grades + 1) + grade_of_pixel,
+        minlength=num_labels * (num_grades + 1),
+    ).reshape(num_labels, num_grades + 1)
+
+    objects = _ordered_objects(num_labels, labels, stats, brightness_sum)
+    for obj in objects:
+        obj["pixels_per_grade"] = tuple(int(v) for v in pixels_per_grade[obj["label"], 1:])
+    return objects
+
+
+def ndfi_histogram(ndfi_normalized: np.ndarray, mask: np.ndarray | None = None) -> np.ndarray:
+    """Histogram 256 bin NDFI_normalized (opsional hanya di dalam `mask`)."""
+    if mask is not None:
+        return np.bincount(ndfi_normalized[mask > 0], minlength=256)[:256].astype(np.int64)
+    return grade_label_histogram(ndfi_normalized, 255)
+
+
+def compute_object_ndfi_histograms(
+    ndfi_normalized: np.ndarray,
+    max_ndfi: int,
+    gray: np.ndarray,
+    mask: np.ndarray | None = None,
+) -> tuple[list[dict], np.ndarray]:
+    """Objek untuk ambang atas `max_ndfi` (t3) beserta histogram NDFI kumulatif per objek.
+
+    Baris ke-i dari matriks kumulatif adalah objek ke-i (urutan findContours);
+    kolom v = jumlah pixel objek dengan NDFI <= v. Dari sini pixel per grade
+    untuk t1/t2 apa pun bisa dihitung tanpa memproses gambar lagi.
+    """
+    foreground = cv2.compare(ndfi_normalized, int(max_ndfi), cv2.CMP_LE)
+    if mask is not None:
+        foreground = cv2.bitwise_and(foreground, mask)
+    labeled = _label_objects(foreground, gray)
+    if labeled is None:
+        return [], np.zeros((0, 256), dtype=np.int64)
+    num_labels, labels, stats, fg_index, object_of_pixel, brightness_sum = labeled
+
+    # Pixel lubang (bukan foreground) ikut di area objek tetapi tidak punya grade.
+    counted = foreground.ravel()[fg_index] > 0
+    histograms = np.bincount(
+        object_of_pixel[counted] * 256 + ndfi_normalized.ravel()[fg_index][counted],
+        minlength=num_labels * 256,
+    ).reshape(num_labels, 256)
+
+    objects = _ordered_objects(num_labels, labels, stats, brightness_sum)
+    order = [obj["label"] for obj in objects]
+    return objects, np.cumsum(histograms[order], axis=1)
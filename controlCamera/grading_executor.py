@@ -0,0 +1,209 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import anyio
+import cv2
+import numpy as np
+
+
+class GradingQueueFull(RuntimeError):
+    """Antrian grading sudah penuh; request sebaiknya dijawab 503."""
+
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return int(default)
+
+
+def _get_float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return float(default)
+
+
+# Frame sebesar ini (mis. 24 MP) disalin ke shared memory di thread, bukan di event loop.
+_THREAD_COPY_BYTES = 4 * 1024 * 1024
+
+
+def _noop(_=None):
+    return None
+
+
+def _copy_to_shared_memory(shm: shared_memory.SharedMemory, source: np.ndarray):
+    frame_view = np.ndarray(source.shape, dtype=source.dtype, buffer=shm.buf)
+    frame_view[...] = source
+    del frame_view
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    try:
+        # Python >= 3.13: jangan daftarkan ke resource tracker, parent yang unlink.
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _run_job(job, source, args):
+    """Dijalankan di worker: siapkan frame lalu panggil `job(frame, *args)`.
+
+    `source` berupa path gambar (di-decode di worker) atau referensi
+    shared memory berisi frame yang sudah di-decode oleh parent. Jika
+    `source` None, job dipanggil tanpa frame: `job(*args)`.
+
+    Jika hasil job berupa dict dengan `stage_seconds`, lama decode gambar
+    ikut dicatat di sana sebagai tahap "decode".
+    """
+    if source is None:
+        return job(*args)
+
+    shm = None
+    frame = None
+    decode_seconds = None
+    try:
+        if isinstance(source, dict):
+            shm = _attach_shared_memory(source["shm_name"])
+            frame = np.ndarray(source["shape"], dtype=source["dtype"], buffer=shm.buf)
+        else:
+            started = time.perf_counter()
+            frame = cv2.imread(str(source))
+            decode_seconds = time.perf_counter() - started
+            if frame is None:
+                print(f"Error: Image not found at path: {source}")
+                raise ValueError("Image not found or the path is incorrect")
+        result = job(frame, *args)
+        if decode_seconds is not None and isinstance(result, dict) and isinstance(result.get("stage_seconds"), dict):
+            result["stage_seconds"]["decode"] = decode_seconds
+        return result
+    finally:
+        if shm is not None:
+            del frame
+            shm.close()
+
+
+class GradingExecutor:
+    """Process pool untuk kerja CPU grading agar event loop tetap responsif.
+
+    Konfigurasi lewat environment variables:
+    - GRADING_WORKERS: jumlah proses worker (default: jumlah CPU)
+    - GRADING_MAX_QUEUE: job yang boleh menunggu di luar yang sedang jalan
+    - GRADING_JOB_TIMEOUT: batas waktu per job dalam detik (0 = tanpa batas)
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_queue: int | None = None,
+        job_timeout: float | None = None,
+    ):
+        if max_workers is None:
+            max_workers = _get_int_env("GRADING_WORKERS", os.cpu_count() or 1)
+        if max_queue is None:
+            max_queue = _get_int_env("GRADING_MAX_QUEUE", 8)
+        if job_timeout is None:
+            job_timeout = _get_float_env("GRADING_JOB_TIMEOUT", 120.0)
+
+        self.max_workers = max(int(max_workers), 1)
+        self.max_queue = max(int(max_queue), 0)
+        self.job_timeout = job_timeout if job_timeout and job_timeout > 0 else None
+        self.in_flight = 0
+        self._pool = None
+
+    def start(self):
+        if self._pool is not None:
+            return
+        # Worker harus memakai resource tracker yang sama dengan parent,
+        # supaya shared memory yang di-attach worker tidak dianggap bocor.
+        resource_tracker.ensure_running()
+        mp_context = None
+        if "fork" in multiprocessing.get_all_start_methods():
+            # fork: tabel NDFI yang dibuat saat import ikut terbagi ke worker.
+            mp_context = multiprocessing.get_context("fork")
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context)
+        # Jalankan semua worker sekarang, bukan saat request pertama masuk.
+        list(self._pool.map(_noop, range(self.max_workers)))
+        print(f"✅ Grading executor started with {self.max_workers} worker(s)")
+
+    def shutdown(self):
+        if self._pool is None:
+            return
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._pool = None
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.max_workers, 0)
+
+    def worker_pids(self) -> list:
+        """PID proses worker yang sedang hidup (untuk metrik memori)."""
+        if self._pool is None:
+            return []
+        return list(getattr(self._pool, "_processes", None) or {})
+
+    async def run(self, job, source, *args):
+        """Jalankan `job(frame, *args)` di worker dan tunggu hasilnya.
+
+        `source` boleh path gambar atau frame numpy; frame dikirim lewat
+        `multiprocessing.shared_memory`, bukan di-pickle. Dengan `source`
+        None, job yang membaca gambarnya sendiri dipanggil sebagai `job(*args)`.
+
+        Timeout (atau pemanggil yang batal) tidak menghentikan job yang sudah
+        berjalan di worker. Slot `in_flight` dan shared memory baru dilepas
+        saat job di worker benar-benar selesai, jadi backpressure tetap
+        menghitung job tersebut.
+        """
+        if self._pool is None:
+            self.start()
+        if self.in_flight >= self.max_workers + self.max_queue:
+            raise GradingQueueFull("Grading queue is full, try again later")
+
+        self.in_flight += 1
+        shm = None
+        pool_future = None
+        try:
+            if isinstance(source, np.ndarray):
+                shm = shared_memory.SharedMemory(create=True, size=max(int(source.nbytes), 1))
+                if source.nbytes >= _THREAD_COPY_BYTES:
+                    await anyio.to_thread.run_sync(_copy_to_shared_memory, shm, source)
+                else:
+                    _copy_to_shared_memory(shm, source)
+                payload = {"shm_name": shm.name, "shape": source.shape, "dtype": source.dtype.str}
+            elif source is None:
+                payload = None
+            else:
+                payload = str(source)
+            pool_future = self._pool.submit(_run_job, job, payload, args)
+        finally:
+            if pool_future is None:
+                self._release(shm)
+
+        loop = asyncio.get_running_loop()
+        pool_future.add_done_callback(lambda _: self._on_job_done(loop, shm))
+
+        future = asyncio.wrap_future(pool_future)
+        if self.job_timeout is None:
+            return await future
+        try:
+            return await asyncio.wait_for(future, self.job_timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Grading job exceeded {self.job_timeout:g}s timeout")
+
+    def _on_job_done(self, loop, shm):
+        # Dipanggil dari thread pengelola ProcessPoolExecutor.
+        try:
+            loop.call_soon_threadsafe(self._release, shm)
+        except RuntimeError:
+            # Event loop sudah ditutup (shutdown): lepaskan langsung.
+            self._release(shm)
+
+    def _release(self, shm):
+        self.in_flight -= 1
+        if shm is not None:
+            shm.close()
+            shm.unlink()
@@ -0,0 +1,316 @@
+"""Tabel rollup grading_runs (per jam, per hari, per batch).
+
+Rollup di-update secara inkremental di transaksi yang sama dengan insert
+grading_runs. Untuk membangun ulang dari data yang sudah ada:
+
+    python grading_rollups.py
+"""
+
+import json
+from collections import defaultdict
+from datetime import datetime
+
+# Urutan kolom baris grading_runs: INSERT dan `_build_grading_row` di main2.py
+# dibangun dari tuple ini, jadi posisi di bawah selalu ikut jika kolom berubah.
+GRADING_RUN_COLUMNS = (
+    "run_uuid",
+    "captured_at",
+    "final_grade",
+    "batch_id",
+    "tray_id",
+    "total_area_pixels",
+    "total_area_percentage",
+    "total_objects",
+    "reject_total_pixels",
+    "reject_total_objects",
+    "grade_d_total_pixels",
+    "grade_d_total_objects",
+    "grade_c_total_pixels",
+    "grade_c_total_objects",
+    "original_image_path",
+    "graded_image_path",
+    "detail_json",
+)
+
+_RUN_CAPTURED_AT = GRADING_RUN_COLUMNS.index("captured_at")
+_RUN_FINAL_GRADE = GRADING_RUN_COLUMNS.index("final_grade")
+_RUN_BATCH_ID = GRADING_RUN_COLUMNS.index("batch_id")
+_RUN_TOTAL_AREA_PIXELS = GRADING_RUN_COLUMNS.index("total_area_pixels")
+_RUN_REJECT_TOTAL_PIXELS = GRADING_RUN_COLUMNS.index("reject_total_pixels")
+_RUN_DETAIL_JSON = GRADING_RUN_COLUMNS.index("detail_json")
+
+ROLLUP_GROUPS = ("hour", "day", "batch")
+
+_UPSERT_TIME_SQL = """
+    INSERT INTO {table} (
+        bucket_start,
+        final_grade,
+        runs,
+        ppb_total_sum,
+        reject_pixels_sum,
+        total_area_pixels_sum
+    ) VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        runs = runs + VALUES(runs),
+        ppb_total_sum = ppb_total_sum + VALUES(ppb_total_sum),
+        reject_pixels_sum = reject_pixels_sum + VALUES(reject_pixels_sum),
+        total_area_pixels_sum = total_area_pixels_sum + VALUES(total_area_pixels_sum)
+"""
+
+_UPSERT_BATCH_SQL = """
+    INSERT INTO grading_rollup_batch (
+        batch_id,
+        final_grade,
+        runs,
+        ppb_total_sum,
+        reject_pixels_sum,
+        total_area_pixels_sum,
+        first_captured_at,
+        last_captured_at
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        runs = runs + VALUES(runs),
+        ppb_total_sum = ppb_total_sum + VALUES(ppb_total_sum),
+        reject_pixels_sum = reject_pixels_sum + VALUES(reject_pixels_sum),
+        total_area_pixels_sum = total_area_pixels_sum + VALUES(total_area_pixels_sum),
+        first_captured_at = LEAST(first_captured_at, VALUES(first_captured_at)),
+        last_captured_at = GREATEST(last_captured_at, VALUES(last_captured_at))
+"""
+
+# ppb_total hanya ada di detail_json untuk baris lama.
+_PPB_TOTAL_SQL = """
+    CASE
+        WHEN JSON_TYPE(JSON_EXTRACT(detail_json, '$.ppb_total')) IN ('INTEGER', 'UNSIGNED INTEGER', 'DOUBLE', 'DECIMAL')
+        THEN JSON_EXTRACT(detail_json, '$.ppb_total')
+        ELSE 0
+    END
+"""
+
+_REBUILD_SQL = (
+    "DELETE FROM grading_rollup_hourly",
+    "DELETE FROM grading_rollup_daily",
+    "DELETE FROM grading_rollup_batch",
+    f"""
+    INSERT INTO grading_rollup_hourly
+        (bucket_start, final_grade, runs, ppb_total_sum, reject_pixels_sum, total_area_pixels_sum)
+    SELECT
+        DATE_FORMAT(captured_at, '%Y-%m-%d %H:00:00'),
+        final_grade,
+        COUNT(*),
+        SUM({_PPB_TOTAL_SQL}),
+        SUM(reject_total_pixels),
+        SUM(total_area_pixels)
+    FROM grading_runs
+    GROUP BY DATE_FORMAT(captured_at, '%Y-%m-%d %H:00:00'), final_grade
+    """,
+    """
+    INSERT INTO grading_rollup_daily
+        (bucket_start, final_grade, runs, ppb_total_sum, reject_pixels_sum, total_area_pixels_sum)
+    SELECT
+        DATE(bucket_start),
+        final_grade,
+        SUM(runs),
+        SUM(ppb_total_sum),
+        SUM(reject_pixels_sum),
+        SUM(total_area_pixels_sum)
+    FROM grading_rollup_hourly
+    GROUP BY DATE(bucket_start), final_grade
+    """,
+    f"""
+    INSERT INTO grading_rollup_batch (
+        batch_id, final_grade, runs, ppb_total_sum, reject_pixels_sum, total_area_pixels_sum,
+        first_captured_at, last_captured_at
+    )
+    SELECT
+        batch_id,
+        final_grade,
+        COUNT(*),
+        SUM({_PPB_TOTAL_SQL}),
+        SUM(reject_total_pixels),
+        SUM(total_area_pixels),
+        MIN(captured_at),
+        MAX(captured_at)
+    FROM grading_runs
+    WHERE batch_id IS NOT NULL
+    GROUP BY batch_id, final_grade
+    """,
+)
+
+
+def _run_ppb_total(run, ppb_total=None) -> float:
+    if ppb_total is None:
+        try:
+            ppb_total = json.loads(run[_RUN_DETAIL_JSON]).get("ppb_total")
+        except Exception:
+            ppb_total = None
+    try:
+        return float(ppb_total or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def apply_rollups(cursor, runs, ppb_totals=None):
+    """Tambahkan run baru ke tabel rollup (panggil di transaksi insert grading_runs).
+
+    Hanya boleh dipanggil untuk run yang benar-benar baru masuk, bukan
+    duplikat dari replay spool, agar tidak terhitung dua kali.
+    """
+    hourly = defaultdict(lambda: [0, 0.0, 0, 0])
+    daily = defaultdict(lambda: [0, 0.0, 0, 0])
+    batches = {}
+
+    for index, run in enumerate(runs):
+        captured_at = datetime.strptime(str(run[_RUN_CAPTURED_AT]), "%Y-%m-%d %H:%M:%S")
+        final_grade = run[_RUN_FINAL_GRADE]
+        ppb_total = _run_ppb_total(run, None if ppb_totals is None else ppb_totals[index])
+        values = (1, ppb_total, int(run[_RUN_REJECT_TOTAL_PIXELS]), int(run[_RUN_TOTAL_AREA_PIXELS]))
+
+        for buckets, bucket_start in (
+            (hourly, captured_at.strftime("%Y-%m-%d %H:00:00")),
+            (daily, captured_at.strftime("%Y-%m-%d")),
+        ):
+            totals = buckets[(bucket_start, final_grade)]
+            for i, value in enumerate(values):
+                totals[i] += value
+
+        batch_id = run[_RUN_BATCH_ID]
+        if batch_id is None:
+            continue
+        key = (batch_id, final_grade)
+        if key not in batches:
+            batches[key] = [0, 0.0, 0, 0, captured_at, captured_at]
+        totals = batches[key]
+        for i, value in enumerate(values):
+            totals[i] += value
+        totals[4] = min(totals[4], captured_at)
+        totals[5] = max(totals[5], captured_at)
+
+    if hourly:
+        cursor.executemany(
+            _UPSERT_TIME_SQL.format(table="grading_rollup_hourly"),
+            [key + tuple(totals) for key, totals in hourly.items()],
+        )
+        cursor.executemany(
+            _UPSERT_TIME_SQL.format(table="grading_rollup_daily"),
+            [key + tuple(totals) for key, totals in daily.items()],
+        )
+    if batches:
+        cursor.executemany(
+            _UPSERT_BATCH_SQL,
+            [
+                key
+                + tuple(totals[:4])
+                + (totals[4].strftime("%Y-%m-%d %H:%M:%S"), totals[5].strftime("%Y-%m-%d %H:%M:%S"))
+                for key, totals in batches.items()
+            ],
+        )
+
+
+def rebuild_rollups(conn):
+    """Bangun ulang semua tabel rollup dari grading_runs dalam satu transaksi."""
+    try:
+        with conn.cursor() as cursor:
+            for sql in _REBUILD_SQL:
+                cursor.execute(sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def select_rollups(conn, group_by: str, filters: dict) -> list:
+    """Bucket rollup dengan filter; satu item per bucket, jumlah run per grade di `runs_by_grade`."""
+    if group_by == "batch":
+        table, key_column = "grading_rollup_batch", "batch_id"
+        extra = ", first_captured_at, last_captured_at"
+    else:
+        table = "grading_rollup_hourly" if group_by == "hour" else "grading_rollup_daily"
+        key_column = "bucket_start"
+        extra = ""
+
+    conditions = []
+    params = []
+    if group_by == "batch":
+        if filters.get("batch_id") is not None:
+            conditions.append("batch_id = %s")
+            params.append(filters["batch_id"])
+        if filters.get("date_from") is not None:
+            conditions.append("last_captured_at >= %s")
+            params.append(filters["date_from"])
+        if filters.get("date_to") is not None:
+            conditions.append("first_captured_at < %s")
+            params.append(filters["date_to"])
+    else:
+        if filters.get("date_from") is not None:
+            conditions.append("bucket_start >= %s")
+            params.append(filters["date_from"])
+        if filters.get("date_to") is not None:
+            conditions.append("bucket_start < %s")
+            params.append(filters["date_to"])
+    if filters.get("final_grade") is not None:
+        conditions.append("final_grade = %s")
+        params.append(filters["final_grade"])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT {key_column}, final_grade, runs, ppb_total_sum, reject_pixels_sum, total_area_pixels_sum{extra}
+            FROM {table}
+            {where}
+            ORDER BY {key_column}
+            """,
+            params,
+        )
+        rows = cursor.fetchall() or []
+    conn.commit()
+
+    buckets = {}
+    for row in rows:
+        key, final_grade, runs, ppb_sum, reject_sum, area_sum = row[:6]
+        if isinstance(key, datetime):
+            key = key.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            key = str(key)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = {
+                "bucket": key,
+                "runs": 0,
+                "runs_by_grade": {},
+                "ppb_total_sum": 0.0,
+                "reject_pixels_sum": 0,
+                "total_area_pixels_sum": 0,
+            }
+            if group_by == "batch":
+                bucket["first_captured_at"] = None
+                bucket["last_captured_at"] = None
+            buckets[key] = bucket
+
+        bucket["runs"] += int(runs)
+        bucket["runs_by_grade"][final_grade] = int(runs)
+        bucket["ppb_total_sum"] += float(ppb_sum)
+        bucket["reject_pixels_sum"] += int(reject_sum)
+        bucket["total_area_pixels_sum"] += int(area_sum)
+        if group_by == "batch":
+            first, last = (value.strftime("%Y-%m-%d %H:%M:%S") for value in row[6:8])
+            if bucket["first_captured_at"] is None or first < bucket["first_captured_at"]:
+                bucket["first_captured_at"] = first
+            if bucket["last_captured_at"] is None or last > bucket["last_captured_at"]:
+                bucket["last_captured_at"] = last
+
+    result = list(buckets.values())
+    for bucket in result:
+        bucket["ppb_total_mean"] = bucket["ppb_total_sum"] / bucket["runs"] if bucket["runs"] else 0.0
+    return result
+
+
+if __name__ == "__main__":
+    from grading_db import connect_mysql
+
+    conn = connect_mysql()
+    try:
+        rebuild_rollups(conn)
+        print("✅ Grading rollup tables rebuilt from grading_runs")
+    finally:
+        conn.close()
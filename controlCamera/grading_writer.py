@@ -0,0 +1,313 @@
+import asyncio
+import json
+import os
+from collections import OrderedDict
+
+import anyio
+import pymysql
+
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return int(default)
+
+
+def _get_float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return float(default)
+
+
+class GradingWriter:
+    """Penulis grading_runs di background (write-behind) dengan spool lokal.
+
+    Record (harus bisa di-serialisasi JSON) diambil dari antrian in-process
+    dan ditulis per batch lewat `insert_rows(records) -> {run_uuid: id}`.
+    Jika MySQL tidak bisa dihubungi, record ditulis ke file spool append-only
+    (NDJSON) dan di-replay sesuai urutan saat MySQL kembali. Insert harus
+    idempoten per `run_uuid` karena spool bisa di-replay ulang setelah crash.
+
+    Hanya error koneksi / pool (`transient_errors`) yang masuk spool. Error
+    lain (mis. IntegrityError, DataError) tidak akan sembuh dengan diulang:
+    batch dicoba ulang per record, dan record yang tetap gagal dipindah ke
+    file dead-letter agar tidak memblokir replay record sesudahnya.
+
+    Konfigurasi lewat environment variables:
+    - GRADING_SPOOL_PATH: lokasi file spool
+    - GRADING_DEAD_LETTER_PATH: lokasi file record yang gagal permanen
+    - GRADING_WRITER_BATCH: jumlah record maksimum per INSERT
+    - GRADING_WRITER_QUEUE: panjang antrian in-process (lebih dari ini langsung ke spool)
+    - GRADING_WRITER_RETRY: jeda percobaan replay spool (detik)
+    """
+
+    def __init__(
+        self,
+        insert_rows,
+        spool_path: str | None = None,
+        batch_size: int | None = None,
+        max_queue: int | None = None,
+        retry_interval: float | None = None,
+        dead_letter_path: str | None = None,
+        transient_errors: tuple | None = None,
+    ):
+        if spool_path is None:
+            spool_path = os.getenv("GRADING_SPOOL_PATH", "/home/ubuntu/fotohasil/grading_spool.ndjson")
+        if dead_letter_path is None:
+            dead_letter_path = os.getenv(
+                "GRADING_DEAD_LETTER_PATH", "/home/ubuntu/fotohasil/grading_dead_letter.ndjson"
+            )
+        if transient_errors is None:
+            # DatabasePoolTimeout (grading_db) adalah turunan OperationalError.
+            transient_errors = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+        if batch_size is None:
+            batch_size = _get_int_env("GRADING_WRITER_BATCH", 50)
+        if max_queue is None:
+            max_queue = _get_int_env("GRADING_WRITER_QUEUE", 1000)
+        if retry_interval is None:
+            retry_interval = _get_float_env("GRADING_WRITER_RETRY", 5.0)
+
+        self.insert_rows = insert_rows
+        self.spool_path = spool_path
+        self.dead_letter_path = dead_letter_path
+        self.transient_errors = tuple(transient_errors)
+        self.batch_size = max(int(batch_size), 1)
+        self.max_queue = max(int(max_queue), 1)
+        self.retry_interval = max(float(retry_interval), 0.1)
+
+        self._queue = None
+        self._task = None
+        self._spool_lock = None
+        self._spool_pending = False
+        self._saved_ids = OrderedDict()
+
+        self.written = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_error = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._spool_lock = asyncio.Lock()
+        self._spool_pending = await anyio.to_thread.run_sync(self._spool_has_records)
+        if self._spool_pending:
+            print(f"⚠️  Found spooled grading records in {self.spool_path}, will replay them")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Hentikan writer; record yang masih di antrian ditulis atau di-spool."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, run_uuid: str, record) -> asyncio.Future:
+        """Antrekan satu record; future berisi id grading_runs, atau None jika di-spool."""
+        if self._task is None:
+            raise RuntimeError("Grading writer is not running")
+        future = asyncio.get_running_loop().create_future()
+        item = (run_uuid, record, future)
+        if self._queue.qsize() >= self.max_queue:
+            asyncio.get_running_loop().create_task(self._spool_items([item]))
+        else:
+            self._queue.put_nowait(item)
+        return future
+
+    def saved_id(self, run_uuid: str) -> int | None:
+        return self._saved_ids.get(run_uuid)
+
+    def _remember_ids(self, ids: dict):
+        for run_uuid, grading_run_id in ids.items():
+            self._saved_ids[run_uuid] = grading_run_id
+            self._saved_ids.move_to_end(run_uuid)
+        while len(self._saved_ids) > 1000:
+            self._saved_ids.popitem(last=False)
+
+    async def _run(self):
+        while True:
+            try:
+                if self._spool_pending:
+                    item = await asyncio.wait_for(self._queue.get(), self.retry_interval)
+                else:
+                    item = await self._queue.get()
+            except asyncio.TimeoutError:
+                await self._replay_spool()
+                continue
+            if item is None:
+                return
+
+            batch = [item]
+            stopping = False
+            while len(batch) < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write_batch(batch)
+            if stopping:
+                return
+
+    async def _write_batch(self, batch):
+        if self._spool_pending:
+            # Record lama di spool harus masuk lebih dulu agar urutan terjaga.
+            await self._spool_items(batch)
+            await self._replay_spool()
+            return
+
+        dead_before = self.dead_lettered
+        try:
+            ids = await self._insert_or_quarantine([(run_uuid, record) for run_uuid, record, _ in batch])
+        except self.transient_errors as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print(f"⚠️  Failed to save grading to MySQL, spooling {len(batch)} record(s): {e}")
+            await self._spool_items(batch)
+            return
+
+        saved = len(batch) - (self.dead_lettered - dead_before)
+        self.written += saved
+        self._remember_ids(ids)
+        for run_uuid, _, future in batch:
+            if not future.done():
+                future.set_result(ids.get(run_uuid))
+        if saved:
+            print(f"✅ Grading result saved to MySQL: {saved} record(s)")
+
+    async def _insert_or_quarantine(self, entries) -> dict:
+        """Insert `entries` [(run_uuid, record)]; error transient dilempar ke pemanggil.
+
+        Jika batch gagal karena error lain, record dicoba satu per satu dan
+        record yang tetap gagal ditulis ke dead-letter.
+        """
+        try:
+            return await self.insert_rows([record for _, record in entries])
+        except self.transient_errors:
+            raise
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            if len(entries) == 1:
+                await self._dead_letter(entries[0], e)
+                return {}
+
+        ids = {}
+        for entry in entries:
+            ids.update(await self._insert_or_quarantine([entry]))
+        return ids
+
+    async def _dead_letter(self, entry, error: Exception):
+        run_uuid, record = entry
+        print(f"⚠️  Grading record {run_uuid} rejected by MySQL, moved to {self.dead_letter_path}: {error}")
+        line = json.dumps(
+            {"run_uuid": run_uuid, "row": record, "error": f"{type(error).__name__}: {error}"},
+            ensure_ascii=False,
+        )
+        await anyio.to_thread.run_sync(self._append_lines, self.dead_letter_path, line + "\n")
+        self.dead_lettered += 1
+
+    async def _spool_items(self, items):
+        lines = "".join(
+            json.dumps({"run_uuid": run_uuid, "row": record}, ensure_ascii=False) + "\n"
+            for run_uuid, record, _ in items
+        )
+        async with self._spool_lock:
+            await anyio.to_thread.run_sync(self._append_lines, self.spool_path, lines)
+            self._spool_pending = True
+        self.spooled += len(items)
+        for _, _, future in items:
+            if not future.done():
+                future.set_result(None)
+
+    @staticmethod
+    def _append_lines(path: str, lines: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _spool_has_records(self) -> bool:
+        try:
+            return os.path.getsize(self.spool_path) > 0
+        except OSError:
+            return False
+
+    def _read_spool(self) -> list:
+        records = []
+        try:
+            with open(self.spool_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # Baris terakhir bisa terpotong jika proses mati saat menulis.
+                        print(f"⚠️  Skipping corrupt grading spool line: {line[:80]}")
+        except FileNotFoundError:
+            pass
+        return records
+
+    async def _replay_spool(self):
+        async with self._spool_lock:
+            records = await anyio.to_thread.run_sync(self._read_spool)
+            for start in range(0, len(records), self.batch_size):
+                chunk = records[start : start + self.batch_size]
+                dead_before = self.dead_lettered
+                try:
+                    ids = await self._insert_or_quarantine([(record["run_uuid"], record["row"]) for record in chunk])
+                except self.transient_errors as e:
+                    self.last_error = str(e)
+                    if start > 0:
+                        # Buang record yang sudah masuk / sudah di dead-letter dari spool.
+                        await anyio.to_thread.run_sync(self._rewrite_spool, records[start:])
+                    return
+                self.replayed += len(chunk) - (self.dead_lettered - dead_before)
+                self._remember_ids(ids)
+
+            await anyio.to_thread.run_sync(self._truncate_spool)
+            self._spool_pending = False
+            if records:
+                print(f"✅ Replayed {len(records)} spooled grading record(s) to MySQL")
+
+    def _rewrite_spool(self, records: list):
+        tmp_path = f"{self.spool_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.spool_path)
+
+    def _truncate_spool(self):
+        try:
+            os.remove(self.spool_path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "spool_pending": self._spool_pending,
+            "spool_path": self.spool_path,
+            "written": self.written,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "dead_letter_path": self.dead_letter_path,
+            "last_error": self.last_error,
+        }
@@ -1,23 +1,232 @@
 from time import sleep
-from datetime import datetime
-from sh import gphoto2 as gp
+from datetime import datetime, timedelta
+from decimal import Decimal
 import signal, os, subprocess
 from typing import Union
 from fastapi import FastAPI
 from fastapi import HTTPException
-from fastapi.responses import FileResponse
+from fastapi import Request
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
 import cv2
 import numpy as np
 import aiofiles
 import json
+import base64
+import glob
+import asyncio
+import itertools
+import time
+import uuid
+from collections import OrderedDict
 import anyio
 import pymysql
 from pymysql.cursors import DictCursor
 
+from grading_engine import (
+    ENGINE_VERSION,
+    GRADE_SHORT_NAMES,
+    classify_ndfi,
+    compute_ndfi_normalized,
+    compute_object_ndfi_histograms,
+    compute_object_stats,
+    filter_frame,
+    grade_label_histogram,
+    ndfi_histogram,
+    paint_grade_overlay,
+    parse_roi_spec,
+    resolve_roi,
+    vectorize_grade_labels,
+)
+from grading_executor import GradingExecutor, GradingQueueFull
+from grading_artifacts import ArtifactCorrupt, GradingArtifactStore, load_artifact, save_artifact
+from grading_db import MySQLPool
+from grading_metrics import MetricsRegistry, process_rss_bytes, stage_timer
+from grading_writer import GradingWriter
+from grading_rollups import GRADING_RUN_COLUMNS, ROLLUP_GROUPS, apply_rollups, select_rollups
+from camera_service import CameraService
+from capture_manager import CaptureManager, CaptureQueueFull
+from tile_pyramid import TilePyramidStore
+from scan_session import ScanSession
+from grading_cache import GradingResultCache, hash_image_array, hash_image_file, make_cache_key
+
 
 
 app = FastAPI()
 
+# Metrik untuk GET /metrics (format teks Prometheus). Tahap grading di worker
+# dikirim balik lewat `stage_seconds` lalu di-observe di proses ini.
+metrics = MetricsRegistry()
+grading_stage_seconds = metrics.histogram(
+    "aflatoxin_grading_stage_seconds", "Duration of each grading pipeline stage", ("stage",)
+)
+grading_seconds = metrics.histogram(
+    "aflatoxin_grading_seconds", "End-to-end grade_using_cv duration", ("cache",)
+)
+grading_runs = metrics.counter(
+    "aflatoxin_grading_runs_total", "Graded images by final grade", ("final_grade", "cache")
+)
+grading_errors = metrics.counter("aflatoxin_grading_errors_total", "Failed grading jobs", ("reason",))
+capture_seconds = metrics.histogram(
+    "aflatoxin_capture_seconds", "Camera capture duration including waiting for the camera lock"
+)
+db_query_seconds = metrics.histogram("aflatoxin_db_query_seconds", "MySQL query duration", ("query",))
+db_failures = metrics.counter("aflatoxin_db_failures_total", "Failed MySQL calls", ("query",))
+http_request_seconds = metrics.histogram(
+    "aflatoxin_http_request_seconds", "HTTP request duration until response headers", ("route", "status")
+)
+http_in_flight = 0
+
+
+def _observe_db_query(name: str, seconds: float | None, error: Exception | None):
+    if seconds is not None:
+        db_query_seconds.observe(seconds, query=name)
+    if error is not None:
+        db_failures.inc(query=name)
+
+
+grading_executor = GradingExecutor()
+grading_cache = GradingResultCache()
+grading_artifacts = GradingArtifactStore()
+tile_pyramids = TilePyramidStore(lambda job, *args: grading_executor.run(job, None, *args))
+mysql_pool = MySQLPool(on_query=_observe_db_query)
+grading_writer = GradingWriter(lambda rows: mysql_pool.run(_insert_grading_rows_sync, rows))
+camera_service = CameraService()
+scan_sessions = {}
+
+# Folder foto hasil capture (default: folder kerja saat server start).
+CAPTURE_ROOT = os.path.abspath(os.getenv("CAPTURE_DIR") or os.getcwd())
+capture_manager = CaptureManager(camera_service, CAPTURE_ROOT)
+
+metrics.gauge("aflatoxin_http_requests_in_flight", "HTTP requests being handled", lambda: http_in_flight)
+metrics.gauge("aflatoxin_grading_in_flight", "Grading jobs running or queued", lambda: grading_executor.in_flight)
+metrics.gauge(
+    "aflatoxin_grading_queue_depth", "Grading jobs waiting for a worker", lambda: grading_executor.queue_depth
+)
+metrics.gauge("aflatoxin_grading_workers", "Grading worker processes", lambda: grading_executor.max_workers)
+metrics.gauge(
+    "aflatoxin_db_writer_queue_depth", "Grading rows waiting for MySQL", lambda: grading_writer.stats()["queue_depth"]
+)
+metrics.gauge(
+    "aflatoxin_db_writer_spool_pending", "Grading rows spooled to disk", lambda: grading_writer.stats()["spool_pending"]
+)
+metrics.counter_func(
+    "aflatoxin_db_writer_failures_total", "Failed grading batch inserts", lambda: grading_writer.stats()["failures"]
+)
+metrics.counter_func(
+    "aflatoxin_db_writer_dead_lettered_total",
+    "Grading records rejected by MySQL and moved to the dead-letter file",
+    lambda: grading_writer.dead_lettered,
+)
+metrics.gauge(
+    "aflatoxin_db_pool_connections",
+    "MySQL pool connections by state",
+    lambda: [((state,), mysql_pool.stats()[state]) for state in ("idle", "in_use", "waiting")],
+    ("state",),
+)
+metrics.counter_func("aflatoxin_db_pool_timeouts_total", "MySQL pool checkout timeouts", lambda: mysql_pool.timeouts)
+metrics.gauge(
+    "aflatoxin_capture_waiting", "Requests waiting for the camera", lambda: capture_manager.stats()["waiting"]
+)
+metrics.gauge(
+    "aflatoxin_capture_archive_pending",
+    "Captured images not yet written to disk",
+    lambda: capture_manager.stats()["archive_pending"],
+)
+metrics.counter_func(
+    "aflatoxin_grading_cache_lookups_total",
+    "Grading cache lookups by result",
+    lambda: [((result,), grading_cache.stats()[result]) for result in ("memory_hits", "disk_hits", "misses")],
+    ("result",),
+)
+metrics.gauge(
+    "aflatoxin_scan_sessions_active",
+    "Running scan sessions",
+    lambda: sum(1 for session in scan_sessions.values() if session.active),
+)
+metrics.gauge("process_resident_memory_bytes", "Resident memory of the API process", process_rss_bytes)
+metrics.gauge(
+    "aflatoxin_grading_workers_resident_memory_bytes",
+    "Resident memory of all grading worker processes",
+    lambda: sum(process_rss_bytes(pid) or 0 for pid in grading_executor.worker_pids()),
+)
+
+
+@app.middleware("http")
+async def _observe_http_request(request: Request, call_next):
+    global http_in_flight
+    started = time.perf_counter()
+    http_in_flight += 1
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        http_in_flight -= 1
+        # Label memakai template route (mis. /tiles/{pyramid_id}/image.dzi), bukan path asli.
+        route = request.scope.get("route")
+        http_request_seconds.observe(
+            time.perf_counter() - started,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
+
+
+@app.on_event("startup")
+def _start_grading_executor():
+    grading_executor.start()
+
+
+@app.on_event("startup")
+def _open_mysql_pool():
+    mysql_pool.open()
+
+
+@app.on_event("startup")
+def _open_camera():
+    camera_service.open()
+
+
+@app.on_event("startup")
+async def _start_grading_writer():
+    await grading_writer.start()
+
+
+@app.on_event("shutdown")
+async def _stop_scan_sessions():
+    for session in scan_sessions.values():
+        session.stop()
+    for session in scan_sessions.values():
+        await session.wait_closed()
+
+
+@app.on_event("shutdown")
+async def _flush_capture_archives():
+    await capture_manager.flush()
+
+
+# Urutan shutdown penting: sesi scan dan arsip capture selesai dulu (hasil
+# gradingnya masih masuk writer), baru writer, executor lalu pool MySQL.
+@app.on_event("shutdown")
+async def _stop_grading_writer():
+    await grading_writer.stop()
+
+
+@app.on_event("shutdown")
+def _stop_grading_executor():
+    grading_executor.shutdown()
+
+
+@app.on_event("shutdown")
+def _close_mysql_pool():
+    mysql_pool.close()
+
+
+@app.on_event("shutdown")
+def _close_camera():
+    camera_service.close()
+
 
 def _get_ppb_scoring_params(overrides: dict | None = None) -> dict:
     """Parameter scoring ppb berbasis ukuran (pixel) dan kecerahan.
@@ -107,70 +316,329 @@ def _estimate_ppb_for_object(
     return base * (1.0 + float(brightness_weight) * brightness_norm)
 
 
-def _get_mysql_connection():
-    host = os.getenv("MYSQL_HOST", "127.0.0.1")
-    port = int(os.getenv("MYSQL_PORT", "3306"))
-    user = os.getenv("MYSQL_USER", "aflatoksin")
-    password = os.getenv("MYSQL_PASSWORD", "aflatoksin")
-    database = os.getenv("MYSQL_DATABASE", "aflatoksin")
-
-    return pymysql.connect(
-        host=host,
-        port=port,
-        user=user,
-        password=password,
-        database=database,
-        charset="utf8mb4",
-        autocommit=False,
-    )
+_HISTORY_COLUMNS = (
+    "id",
+    "captured_at",
+    "final_grade",
+    "batch_id",
+    "tray_id",
+    "total_area_pixels",
+    "total_area_percentage",
+    "total_objects",
+    "original_image_path",
+    "graded_image_path",
+)
 
 
-def _select_grading_history_sync(limit: int):
+def _encode_history_cursor(captured_at: str, grading_run_id: int) -> str:
+    raw = json.dumps([captured_at, int(grading_run_id)], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_history_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        captured_at, grading_run_id = json.loads(raw)
+        datetime.strptime(captured_at, "%Y-%m-%d %H:%M:%S")
+        return captured_at, int(grading_run_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_history_date(value: str | None, name: str, end_of_range: bool = False) -> str | None:
+    """Terima `YYYY-MM-DD` atau datetime ISO; tanggal saja pada date_to berarti sampai akhir hari."""
+    if value is None or value.strip() == "":
+        return None
+    value = value.strip()
+    try:
+        if len(value) == 10:
+            parsed = datetime.strptime(value, "%Y-%m-%d")
+            if end_of_range:
+                parsed += timedelta(days=1)
+        else:
+            parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be YYYY-MM-DD or an ISO datetime")
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _select_grading_history_sync(
+    conn,
+    limit: int,
+    filters: dict | None = None,
+    cursor_key: tuple[str, int] | None = None,
+    include_detail: bool = True,
+):
+    """Riwayat grading terbaru dengan keyset pagination pada (captured_at, id).
+
+    Setiap filter punya index komposit (filter, captured_at, id) di
+    mysql_schema.sql, sehingga halaman yang dalam tetap berupa range scan.
+    """
     limit = int(limit)
     if limit < 1:
         limit = 1
     if limit > 200:
         limit = 200
+    filters = filters or {}
+
+    conditions = []
+    params = []
+    for column in ("batch_id", "tray_id", "final_grade"):
+        if filters.get(column) is not None:
+            conditions.append(f"{column} = %s")
+            params.append(filters[column])
+    if filters.get("date_from") is not None:
+        conditions.append("captured_at >= %s")
+        params.append(filters["date_from"])
+    if filters.get("date_to") is not None:
+        conditions.append("captured_at < %s")
+        params.append(filters["date_to"])
+    if cursor_key is not None:
+        conditions.append("(captured_at < %s OR (captured_at = %s AND id < %s))")
+        params.extend([cursor_key[0], cursor_key[0], cursor_key[1]])
+
+    columns = list(_HISTORY_COLUMNS)
+    if include_detail:
+        columns.append("detail_json")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with conn.cursor(DictCursor) as cursor:
+        cursor.execute(
+            f"""
+            SELECT {", ".join(columns)}
+            FROM grading_runs
+            {where}
+            ORDER BY captured_at DESC, id DESC
+            LIMIT %s
+            """,
+            (*params, limit + 1),
+        )
+        rows = list(cursor.fetchall() or [])
+    conn.commit()
 
-    conn = _get_mysql_connection()
-    try:
-        with conn.cursor(DictCursor) as cursor:
-            cursor.execute(
-                """
-                SELECT
-                    id,
-                    captured_at,
-                    final_grade,
-                    batch_id,
-                    tray_id,
-                    total_area_pixels,
-                    total_area_percentage,
-                    total_objects,
-                    original_image_path,
-                    graded_image_path,
-                    detail_json
-                FROM grading_runs
-                ORDER BY captured_at DESC, id DESC
-                LIMIT %s
-                """,
-                (limit,),
-            )
-            rows = cursor.fetchall() or []
-
-        for row in rows:
-            if isinstance(row.get("captured_at"), datetime):
-                row["captured_at"] = row["captured_at"].strftime("%Y-%m-%d %H:%M:%S")
-            if isinstance(row.get("detail_json"), (bytes, bytearray)):
-                row["detail_json"] = row["detail_json"].decode("utf-8", errors="replace")
-        return rows
-    finally:
-        conn.close()
+    # Satu baris ekstra hanya untuk mengetahui apakah masih ada halaman berikutnya.
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    for row in rows:
+        if isinstance(row.get("captured_at"), datetime):
+            row["captured_at"] = row["captured_at"].strftime("%Y-%m-%d %H:%M:%S")
+        if isinstance(row.get("detail_json"), (bytes, bytearray)):
+            row["detail_json"] = row["detail_json"].decode("utf-8", errors="replace")
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = _encode_history_cursor(str(rows[-1]["captured_at"]), rows[-1]["id"])
+    return rows, next_cursor
 
 
 @app.get("/gradingHistory")
-async def grading_history(limit: int = 20):
+async def grading_history(
+    limit: int = 20,
+    cursor: Union[str, None] = None,
+    batch_id: Union[str, None] = None,
+    tray_id: Union[str, None] = None,
+    final_grade: Union[str, None] = None,
+    date_from: Union[str, None] = None,
+    date_to: Union[str, None] = None,
+    include_detail: bool = True,
+):
+    filters = {
+        "batch_id": batch_id,
+        "tray_id": tray_id,
+        "final_grade": final_grade,
+        "date_from": _parse_history_date(date_from, "date_from"),
+        "date_to": _parse_history_date(date_to, "date_to", end_of_range=True),
+    }
+    cursor_key = _decode_history_cursor(cursor) if cursor else None
+    try:
+        rows, next_cursor = await mysql_pool.run(
+            _select_grading_history_sync, limit, filters, cursor_key, include_detail
+        )
+        return {"data": rows, "next_cursor": next_cursor}
+    except pymysql.err.OperationalError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+_OBJECT_COLUMNS = (
+    "o.id",
+    "o.grading_run_id",
+    "o.captured_at",
+    "o.object_id",
+    "o.grade",
+    "o.total_pixels",
+    "o.reject_pixels",
+    "o.grade_d_pixels",
+    "o.grade_c_pixels",
+    "o.mean_brightness",
+    "o.ppb",
+    "o.bbox_x",
+    "o.bbox_y",
+    "o.bbox_width",
+    "o.bbox_height",
+    "r.batch_id",
+    "r.tray_id",
+)
+
+
+def _grading_objects_where(filters: dict) -> tuple[list, list, bool]:
+    """Kondisi WHERE untuk grading_objects; join grading_runs hanya jika perlu."""
+    conditions = []
+    params = []
+    needs_run = False
+    if filters.get("grade") is not None:
+        conditions.append("o.grade = %s")
+        params.append(filters["grade"])
+    if filters.get("min_ppb") is not None:
+        conditions.append("o.ppb >= %s")
+        params.append(float(filters["min_ppb"]))
+    if filters.get("max_ppb") is not None:
+        conditions.append("o.ppb <= %s")
+        params.append(float(filters["max_ppb"]))
+    if filters.get("date_from") is not None:
+        conditions.append("o.captured_at >= %s")
+        params.append(filters["date_from"])
+    if filters.get("date_to") is not None:
+        conditions.append("o.captured_at < %s")
+        params.append(filters["date_to"])
+    if filters.get("grading_run_id") is not None:
+        conditions.append("o.grading_run_id = %s")
+        params.append(int(filters["grading_run_id"]))
+    for column in ("batch_id", "tray_id"):
+        if filters.get(column) is not None:
+            conditions.append(f"r.{column} = %s")
+            params.append(filters[column])
+            needs_run = True
+    return conditions, params, needs_run
+
+
+def _select_grading_objects_sync(conn, filters: dict, limit: int, before_id: int | None):
+    limit = max(1, min(int(limit), 1000))
+    conditions, params, _ = _grading_objects_where(filters)
+    if before_id is not None:
+        conditions.append("o.id < %s")
+        params.append(int(before_id))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with conn.cursor(DictCursor) as cursor:
+        cursor.execute(
+            f"""
+            SELECT {", ".join(_OBJECT_COLUMNS)}
+            FROM grading_objects o
+            JOIN grading_runs r ON r.id = o.grading_run_id
+            {where}
+            ORDER BY o.id DESC
+            LIMIT %s
+            """,
+            (*params, limit + 1),
+        )
+        rows = list(cursor.fetchall() or [])
+    conn.commit()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for row in rows:
+        if isinstance(row.get("captured_at"), datetime):
+            row["captured_at"] = row["captured_at"].strftime("%Y-%m-%d %H:%M:%S")
+    next_cursor = int(rows[-1]["id"]) if has_more and rows else None
+    return rows, next_cursor
+
+
+def _summarize_grading_objects_sync(conn, filters: dict):
+    conditions, params, needs_run = _grading_objects_where(filters)
+    join = "JOIN grading_runs r ON r.id = o.grading_run_id" if needs_run else ""
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with conn.cursor(DictCursor) as cursor:
+        cursor.execute(
+            f"""
+            SELECT
+                o.grade AS grade,
+                COUNT(*) AS total_objects,
+                COUNT(DISTINCT o.grading_run_id) AS total_runs,
+                SUM(o.total_pixels) AS total_pixels,
+                SUM(o.ppb) AS ppb_sum,
+                AVG(o.ppb) AS ppb_avg,
+                MAX(o.ppb) AS ppb_max,
+                AVG(o.mean_brightness) AS mean_brightness_avg
+            FROM grading_objects o
+            {join}
+            {where}
+            GROUP BY o.grade
+            ORDER BY o.grade
+            """,
+            params,
+        )
+        rows = list(cursor.fetchall() or [])
+    conn.commit()
+
+    for row in rows:
+        for key, value in row.items():
+            if isinstance(value, Decimal):
+                row[key] = float(value) if key != "total_pixels" else int(value)
+    return rows
+
+
+def _grading_object_filters(
+    grade, min_ppb, max_ppb, date_from, date_to, batch_id, tray_id, grading_run_id
+) -> dict:
+    return {
+        "grade": grade,
+        "min_ppb": min_ppb,
+        "max_ppb": max_ppb,
+        "date_from": _parse_history_date(date_from, "date_from"),
+        "date_to": _parse_history_date(date_to, "date_to", end_of_range=True),
+        "batch_id": batch_id,
+        "tray_id": tray_id,
+        "grading_run_id": grading_run_id,
+    }
+
+
+@app.get("/gradingObjects")
+async def grading_objects(
+    grade: Union[str, None] = None,
+    min_ppb: Union[float, None] = None,
+    max_ppb: Union[float, None] = None,
+    date_from: Union[str, None] = None,
+    date_to: Union[str, None] = None,
+    batch_id: Union[str, None] = None,
+    tray_id: Union[str, None] = None,
+    grading_run_id: Union[int, None] = None,
+    limit: int = 100,
+    cursor: Union[int, None] = None,
+):
+    """Daftar objek terdeteksi (terbaru dulu); `next_cursor` untuk halaman berikutnya."""
+    filters = _grading_object_filters(
+        grade, min_ppb, max_ppb, date_from, date_to, batch_id, tray_id, grading_run_id
+    )
     try:
-        rows = await anyio.to_thread.run_sync(_select_grading_history_sync, limit)
+        rows, next_cursor = await mysql_pool.run(_select_grading_objects_sync, filters, limit, cursor)
+        return {"data": rows, "next_cursor": next_cursor}
+    except pymysql.err.OperationalError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/gradingObjects/summary")
+async def grading_objects_summary(
+    grade: Union[str, None] = None,
+    min_ppb: Union[float, None] = None,
+    max_ppb: Union[float, None] = None,
+    date_from: Union[str, None] = None,
+    date_to: Union[str, None] = None,
+    batch_id: Union[str, None] = None,
+    tray_id: Union[str, None] = None,
+    grading_run_id: Union[int, None] = None,
+):
+    """Agregat objek per grade (jumlah, pixel, ppb) dihitung di MySQL."""
+    filters = _grading_object_filters(
+        grade, min_ppb, max_ppb, date_from, date_to, batch_id, tray_id, grading_run_id
+    )
+    try:
+        rows = await mysql_pool.run(_summarize_grading_objects_sync, filters)
         return {"data": rows}
     except pymysql.err.OperationalError as e:
         raise HTTPException(status_code=503, detail=str(e))
@@ -178,7 +646,14 @@ async def grading_history(limit: int = 20):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _insert_grading_sync(data) -> int:
+_INSERT_GRADING_SQL = f"""
+    INSERT INTO grading_runs ({", ".join(GRADING_RUN_COLUMNS)})
+    VALUES ({", ".join(["%s"] * len(GRADING_RUN_COLUMNS))})
+    ON DUPLICATE KEY UPDATE id = id
+"""
+
+
+def _build_grading_row(data, run_uuid: str) -> tuple:
     captured_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     summary = data["summary_by_grade"]
 
@@ -196,104 +671,195 @@ def _insert_grading_sync(data) -> int:
     }
     detail_json = json.dumps(detail_payload, ensure_ascii=False)
 
-    conn = _get_mysql_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO grading_runs (
-                    captured_at,
-                    final_grade,
-                    batch_id,
-                    tray_id,
-                    total_area_pixels,
-                    total_area_percentage,
-                    total_objects,
-                    reject_total_pixels,
-                    reject_total_objects,
-                    grade_d_total_pixels,
-                    grade_d_total_objects,
-                    grade_c_total_pixels,
-                    grade_c_total_objects,
-                    original_image_path,
-                    graded_image_path,
-                    detail_json
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
+    row = {
+        "run_uuid": run_uuid,
+        "captured_at": captured_at,
+        "final_grade": str(data["final_grade"]),
+        "batch_id": data.get("batch_id"),
+        "tray_id": data.get("tray_id"),
+        "total_area_pixels": int(data["total_area_pixels"]),
+        "total_area_percentage": float(data["total_area_percentage"]),
+        "total_objects": int(data["total_objects"]),
+        "reject_total_pixels": reject_total_pixels,
+        "reject_total_objects": reject_total_objects,
+        "grade_d_total_pixels": grade_d_total_pixels,
+        "grade_d_total_objects": grade_d_total_objects,
+        "grade_c_total_pixels": grade_c_total_pixels,
+        "grade_c_total_objects": grade_c_total_objects,
+        "original_image_path": str(data["original_image_path"]),
+        # Run tanpa overlay (render=False): kolom NOT NULL diisi string kosong.
+        "graded_image_path": str(data["graded_image_path"] or ""),
+        "detail_json": detail_json,
+    }
+    # Tuple (bukan dict) agar tetap bisa di-spool sebagai list JSON dan dipakai executemany.
+    return tuple(row[name] for name in GRADING_RUN_COLUMNS)
+
+
+_INSERT_GRADING_OBJECT_SQL = """
+    INSERT INTO grading_objects (
+        grading_run_id,
+        captured_at,
+        object_id,
+        grade,
+        total_pixels,
+        reject_pixels,
+        grade_d_pixels,
+        grade_c_pixels,
+        mean_brightness,
+        ppb,
+        bbox_x,
+        bbox_y,
+        bbox_width,
+        bbox_height
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE id = id
+"""
+
+
+def _build_object_rows(data) -> list:
+    """Baris grading_objects (tanpa grading_run_id) dari summary_by_grade."""
+    rows = []
+    for grade_data in data["summary_by_grade"].values():
+        for obj in grade_data.get("objects", []):
+            pixels = obj.get("pixels_per_grade", {})
+            bbox = obj["bounding_box"]
+            rows.append(
                 (
-                    captured_at,
-                    str(data["final_grade"]),
-                    data.get("batch_id"),
-                    data.get("tray_id"),
-                    int(data["total_area_pixels"]),
-                    float(data["total_area_percentage"]),
-                    int(data["total_objects"]),
-                    reject_total_pixels,
-                    reject_total_objects,
-                    grade_d_total_pixels,
-                    grade_d_total_objects,
-                    grade_c_total_pixels,
-                    grade_c_total_objects,
-                    str(data["original_image_path"]),
-                    str(data["graded_image_path"]),
-                    detail_json,
-                ),
+                    int(obj["object_id"]),
+                    str(obj["grade"]),
+                    int(obj["total_pixels"]),
+                    int(pixels.get("REJECT", 0)),
+                    int(pixels.get("GRADE D", 0)),
+                    int(pixels.get("GRADE C", 0)),
+                    float(obj["mean_brightness"]),
+                    float(obj["ppb"]),
+                    int(bbox["x"]),
+                    int(bbox["y"]),
+                    int(bbox["width"]),
+                    int(bbox["height"]),
+                )
             )
-            grading_run_id = int(cursor.lastrowid)
+    rows.sort(key=lambda row: row[0])
+    return rows
 
-        conn.commit()
-        return grading_run_id
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+
+def _build_grading_record(data, run_uuid: str) -> dict:
+    return {
+        "run": _build_grading_row(data, run_uuid),
+        "objects": _build_object_rows(data),
+        "ppb_total": data.get("ppb_total"),
+    }
 
 
-async def save_grading_to_mysql(data) -> int:
-    """Simpan hasil grading ke database MySQL (bukan CSV)."""
-    grading_run_id = await anyio.to_thread.run_sync(_insert_grading_sync, data)
-    print(f"✅ Grading result saved to MySQL: grading_runs.id={grading_run_id}")
-    return grading_run_id
+def _insert_grading_rows_sync(conn, records) -> dict:
+    """Multi-row INSERT grading_runs + grading_objects + rollup dalam satu transaksi.
 
+    Mengembalikan {run_uuid: id}. Idempoten per run_uuid dan per
+    (grading_run_id, object_id), sehingga aman di-replay dari spool.
+    """
+    runs = []
+    objects_by_uuid = {}
+    ppb_totals = []
+    for record in records:
+        if isinstance(record, dict):
+            run = tuple(record["run"])
+            objects_by_uuid[run[0]] = record.get("objects") or []
+            ppb_totals.append(record.get("ppb_total"))
+        else:
+            # Format spool lama: hanya baris grading_runs.
+            run = tuple(record)
+            ppb_totals.append(None)
+        runs.append(run)
+    if not runs:
+        return {}
+
+    run_uuids = [run[0] for run in runs]
+    captured_at_by_uuid = {run[0]: run[1] for run in runs}
+    placeholders = ", ".join(["%s"] * len(run_uuids))
+    with conn.cursor() as cursor:
+        # Run yang sudah ada (replay spool) tidak boleh dihitung ulang di rollup.
+        cursor.execute(
+            f"SELECT run_uuid FROM grading_runs WHERE run_uuid IN ({placeholders}) FOR UPDATE",
+            run_uuids,
+        )
+        existing = {row[0] for row in cursor.fetchall()}
 
+        # PyMySQL menggabungkan executemany INSERT ... VALUES menjadi satu statement multi-row.
+        cursor.executemany(_INSERT_GRADING_SQL, runs)
+        cursor.execute(
+            f"SELECT run_uuid, id FROM grading_runs WHERE run_uuid IN ({placeholders})",
+            run_uuids,
+        )
+        ids = {run_uuid: int(grading_run_id) for run_uuid, grading_run_id in cursor.fetchall()}
 
+        for run_uuid, object_rows in objects_by_uuid.items():
+            if not object_rows or run_uuid not in ids:
+                continue
+            prefix = (ids[run_uuid], captured_at_by_uuid[run_uuid])
+            cursor.executemany(_INSERT_GRADING_OBJECT_SQL, [prefix + tuple(row) for row in object_rows])
 
+        new_runs = [(run, ppb_total) for run, ppb_total in zip(runs, ppb_totals) if run[0] not in existing]
+        if new_runs:
+            apply_rollups(cursor, [run for run, _ in new_runs], [ppb_total for _, ppb_total in new_runs])
+
+    conn.commit()
+    return ids
 
-def createSaveFolder(folder_name):
-    try:
-        os.makedirs(folder_name)
-    except:
-        print("Failed to create the new directory.")
-    os.chdir(folder_name)
-    print("Changed to directory: " + folder_name)
 
-def captureImages(command, picID):
-    gp(command)
-    print("Captured the image: "+picID+".jpg")
+def _select_grading_run_id_sync(conn, run_uuid: str) -> int | None:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT id FROM grading_runs WHERE run_uuid = %s", (run_uuid,))
+        row = cursor.fetchone()
+    conn.commit()
+    return int(row[0]) if row else None
+
+
+def save_grading_to_mysql(data) -> tuple[str, asyncio.Future]:
+    """Antrekan hasil grading ke writer MySQL (bukan CSV).
+
+    Mengembalikan run_uuid (dibuat di sini, langsung bisa dipakai klien) dan
+    future yang berisi grading_runs.id setelah baris benar-benar tersimpan.
+    """
+    run_uuid = str(uuid.uuid4())
+    future = grading_writer.submit(run_uuid, _build_grading_record(data, run_uuid))
+    return run_uuid, future
+
 
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
 
 
-@app.get("/captureImage")
-def read_root():
-    prev_cwd = os.getcwd()
-    shot_date = datetime.now().strftime("%Y-%m-%d")
-    shot_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    picID = "PiShots_" + shot_time
+def _decode_jpeg(data: bytes) -> np.ndarray:
+    with grading_stage_seconds.time(stage="jpeg_decode"):
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Captured image could not be decoded")
+    return frame
 
-    captureAndDownloadCommand = ["--capture-image-and-download","--filename",picID+".jpg"]
 
-    folder_name = shot_date
+async def _capture_image(**kwargs):
+    started = time.perf_counter()
+    shot = await capture_manager.capture_image(**kwargs)
+    capture_seconds.observe(time.perf_counter() - started)
+    return shot
+
+
+@app.get("/captureImage")
+async def read_root():
+    """JPEG langsung dari memori; file arsip ditulis di background.
+
+    File di `X-Image-Path` bisa belum ada sesaat setelah response dikirim.
+    """
     try:
-        createSaveFolder(folder_name)
-        captureImages(captureAndDownloadCommand, picID)
-        image_path = os.path.abspath(picID + ".jpg")
-        return FileResponse(image_path)
-    finally:
-        os.chdir(prev_cwd)
+        shot = await _capture_image()
+    except CaptureQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return Response(
+        content=shot.data,
+        media_type="image/jpeg",
+        headers={"X-Image-Path": shot.path},
+    )
 
 def _validate_thresholds(t1: int, t2: int, t3: int) -> tuple[int, int, int]:
     try:
@@ -315,6 +881,15 @@ def _validate_thresholds(t1: int, t2: int, t3: int) -> tuple[int, int, int]:
     return t1, t2, t3
 
 
+def _validate_roi(roi: str | None) -> dict | None:
+    """ROI dari query param; jika kosong pakai GRADING_ROI per stasiun."""
+    spec = roi if roi is not None else os.getenv("GRADING_ROI")
+    try:
+        return parse_roi_spec(spec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 def _build_intensity_levels(t1: int, t2: int, t3: int):
     reject_min, reject_max = 0, t1
     grade_d_min, grade_d_max = t1 + 1, t2
@@ -342,69 +917,64 @@ def _build_intensity_levels(t1: int, t2: int, t3: int):
     }
 
 
-async def grade_using_cv(
-    filepath: str,
-    thresholds: tuple[int, int, int] = (150, 160, 168),
-    ppb_overrides: dict | None = None,
-    batch_id: str | None = None,
-    tray_id: str | None = None,
-):
+def _final_grade_from_areas(reject_area: int, grade_d_area: int, grade_c_area: int, total_area: int) -> str:
+    if reject_area > 0:
+        return "REJECT"
+    if grade_d_area > 0:
+        return "GRADE D"
+    if grade_c_area > 0:
+        return "GRADE C"
+    if total_area > 0:
+        return "GRADE B (Kontaminasi Minor)"
+    return "GRADE A (Bersih)"
+
+
+def _grade_planes_sync(
+    ndfi: np.ndarray | None,
+    gray: np.ndarray | None,
+    thresholds: tuple[int, int, int],
+    ppb_params: dict,
+    roi_box: dict | None,
+    image_shape: tuple[int, int],
+    timings: dict | None = None,
+) -> dict:
+    """Angka grading dari plane NDFI + grayscale (ter-filter) area ROI.
+
+    Dipakai saat grading frame baru maupun re-threshold dari artifact.
+    Selain angka, mengembalikan `grade_labels` dan `overlay` (data untuk
+    menggambar overlay lewat `_render_overlay_sync`). Durasi tahap
+    "classify" dan "objects" ditambahkan ke `timings` jika diberikan.
     """
-    Mendeteksi dan mengklasifikasikan aflatoksin pada gambar jagung.
-    - Warna isian sesuai dengan grade piksel masing-masing.
-    - Warna kotak dan label sesuai dengan grade terparah dalam satu area.
-    """
-    print("Detecting and Grading Aflatoxin using OpenCV..")
-    image = cv2.imread(str(filepath))
-    if image is None:
-        print(f"Error: Image not found at path: {filepath}")
-        raise ValueError("Image not found or the path is incorrect")
-
-    filtered_image = cv2.medianBlur(image, 5)
-    filtered_image = cv2.GaussianBlur(filtered_image, (9, 9), 0)
-
-    B, G, R = cv2.split(filtered_image)
-    B = B.astype(float)
-    G = G.astype(float)
-    NDFI = (B - G) / (B + G + 0.0001)
-    NDFI_normalized = ((NDFI + 1.0) * 127.5).astype(np.uint8)
-
     t1, t2, t3 = thresholds
     INTENSITY_LEVELS = _build_intensity_levels(t1, t2, t3)
 
-    labeled_image = image.copy()
-    ppb_params = _get_ppb_scoring_params(ppb_overrides)
-    level_masks = {}
-
-    for level_name in INTENSITY_LEVELS.keys():
-        INTENSITY_LEVELS[level_name]["area"] = 0
-        INTENSITY_LEVELS[level_name]["count"] = 0
-
-    all_masks = {}
-    for level_name, prop in INTENSITY_LEVELS.items():
-        mask = cv2.inRange(NDFI_normalized, prop["range"][0], prop["range"][1])
-        all_masks[level_name] = mask
-
-    processed_pixels = np.zeros(NDFI_normalized.shape, dtype=np.uint8)
-
-    for level_name in INTENSITY_LEVELS.keys():
-        raw_mask = all_masks[level_name]
-
-        exclusive_mask = cv2.bitwise_and(raw_mask, cv2.bitwise_not(processed_pixels))
-        level_masks[level_name] = exclusive_mask
-
-        processed_pixels = cv2.bitwise_or(processed_pixels, exclusive_mask)
-
-        labeled_image[exclusive_mask > 0] = INTENSITY_LEVELS[level_name]["color"]
-
-        INTENSITY_LEVELS[level_name]["area"] = int(np.count_nonzero(exclusive_mask))
-
-        contours, _ = cv2.findContours(exclusive_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        INTENSITY_LEVELS[level_name]["count"] = len(contours)
-
-    processed_mask = processed_pixels
-
-    contours, _ = cv2.findContours(processed_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    height, width = image_shape
+    if roi_box is None:
+        x0, y0, region_w, region_h = 0, 0, width, height
+    else:
+        x0, y0, region_w, region_h = roi_box["x"], roi_box["y"], roi_box["width"], roi_box["height"]
+    region_area = region_w * region_h
+
+    level_areas = [0] * (len(INTENSITY_LEVELS) + 1)
+    object_stats = []
+    grade_labels = None
+
+    if ndfi is not None:
+        with stage_timer(timings, "classify"):
+            grade_labels = classify_ndfi(ndfi, [prop["range"] for prop in INTENSITY_LEVELS.values()])
+            if roi_box is not None and "points" in roi_box:
+                roi_mask = np.zeros(grade_labels.shape, dtype=np.uint8)
+                polygon = np.array(roi_box["points"], dtype=np.int32) - np.array([x0, y0], dtype=np.int32)
+                cv2.fillPoly(roi_mask, [polygon], 255)
+                grade_labels = cv2.bitwise_and(grade_labels, roi_mask)
+                region_area = cv2.countNonZero(roi_mask)
+
+            level_areas = grade_label_histogram(grade_labels, len(INTENSITY_LEVELS))
+        with stage_timer(timings, "objects"):
+            object_stats = compute_object_stats(grade_labels, gray)
+
+    for grade_index, level_name in enumerate(INTENSITY_LEVELS.keys(), start=1):
+        INTENSITY_LEVELS[level_name]["area"] = int(level_areas[grade_index])
 
     objects_by_grade = {
         "REJECT": [],
@@ -414,22 +984,22 @@ async def grade_using_cv(
 
     object_counter = 0
     ppb_total = 0.0
+    boxes = []
 
-    gray_for_brightness = cv2.cvtColor(filtered_image, cv2.COLOR_BGR2GRAY)
-    for contour in contours:
-        object_counter += 1
+    level_names = list(INTENSITY_LEVELS.keys())
+    for grade_index, level_name in enumerate(level_names):
+        INTENSITY_LEVELS[level_name]["count"] = sum(
+            1 for obj in object_stats if obj["pixels_per_grade"][grade_index] > 0
+        )
 
-        contour_mask_temp = np.zeros_like(processed_mask)
-        cv2.drawContours(contour_mask_temp, [contour], -1, 255, cv2.FILLED)
+    for obj in object_stats:
+        object_counter += 1
 
         object_pixels_per_grade = {}
         total_object_pixels = 0
         priority_level_name = None
 
-        for level_name in INTENSITY_LEVELS.keys():
-            intersection = cv2.bitwise_and(contour_mask_temp, level_masks[level_name])
-            pixel_count = int(np.count_nonzero(intersection))
-
+        for level_name, pixel_count in zip(level_names, obj["pixels_per_grade"]):
             if pixel_count > 0:
                 grade_short = level_name.split("(")[0].strip()
                 object_pixels_per_grade[grade_short] = pixel_count
@@ -439,16 +1009,9 @@ async def grade_using_cv(
                     priority_level_name = level_name
 
         if priority_level_name:
-            properties = INTENSITY_LEVELS[priority_level_name]
-            priority_color = properties["color"]
             grade_short = priority_level_name.split("(")[0].strip()
-            label = f"ID {object_counter}"
 
-            contour_pixels = cv2.countNonZero(contour_mask_temp)
-            if contour_pixels > 0:
-                mean_brightness = float(cv2.mean(gray_for_brightness, mask=contour_mask_temp)[0])
-            else:
-                mean_brightness = 0.0
+            mean_brightness = obj["mean_brightness"]
 
             px_reject = int(object_pixels_per_grade.get("REJECT", 0))
             px_grade_d = int(object_pixels_per_grade.get("GRADE D", 0))
@@ -469,9 +1032,10 @@ async def grade_using_cv(
                 ppb_object = 0.0
             ppb_total += ppb_object
 
-            x, y, w, h = cv2.boundingRect(contour)
-            cv2.rectangle(labeled_image, (x, y), (x + w, y + h), priority_color, 2)
-            cv2.putText(labeled_image, label, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, priority_color, 2)
+            x, y, w, h = obj["bounding_box"]
+            x += x0
+            y += y0
+            boxes.append([int(x), int(y), int(w), int(h), level_names.index(priority_level_name), object_counter])
 
             object_info = {
                 "object_id": object_counter,
@@ -485,24 +1049,85 @@ async def grade_using_cv(
             objects_by_grade[grade_short].append(object_info)
 
     total_detected_area = sum(level["area"] for level in INTENSITY_LEVELS.values())
-    height, width, _ = image.shape
     total_image_area = height * width
-    percentage = (total_detected_area / total_image_area) * 100
-
-    final_grade = "GRADE A (Bersih)"
-    if INTENSITY_LEVELS["REJECT (Sangat Terang)"]["area"] > 0:
-        final_grade = "REJECT"
-    elif INTENSITY_LEVELS["GRADE D (Terang)"]["area"] > 0:
-        final_grade = "GRADE D"
-    elif INTENSITY_LEVELS["GRADE C (Redup)"]["area"] > 0:
-        final_grade = "GRADE C"
-    elif total_detected_area > 0:
-        final_grade = "GRADE B (Kontaminasi Minor)"
+    if roi_box is not None and roi_box["mode"] != "auto":
+        # ROI tray tetap: persentase dihitung terhadap area tray, bukan frame penuh.
+        total_image_area = region_area
+    percentage = (total_detected_area / total_image_area) * 100 if total_image_area > 0 else 0.0
+
+    final_grade = _final_grade_from_areas(
+        INTENSITY_LEVELS["REJECT (Sangat Terang)"]["area"],
+        INTENSITY_LEVELS["GRADE D (Terang)"]["area"],
+        INTENSITY_LEVELS["GRADE C (Redup)"]["area"],
+        total_detected_area,
+    )
+
+    return {
+        "final_grade": final_grade,
+        "total_area_pixels": total_detected_area,
+        "total_area_percentage": percentage,
+        "total_objects": object_counter,
+        "ppb_total": float(ppb_total),
+        "summary_by_grade": {
+            "REJECT": {
+                "total_pixels": INTENSITY_LEVELS["REJECT (Sangat Terang)"]["area"],
+                "total_objects": len(objects_by_grade["REJECT"]),
+                "objects": objects_by_grade["REJECT"],
+            },
+            "GRADE D": {
+                "total_pixels": INTENSITY_LEVELS["GRADE D (Terang)"]["area"],
+                "total_objects": len(objects_by_grade["GRADE D"]),
+                "objects": objects_by_grade["GRADE D"],
+            },
+            "GRADE C": {
+                "total_pixels": INTENSITY_LEVELS["GRADE C (Redup)"]["area"],
+                "total_objects": len(objects_by_grade["GRADE C"]),
+                "objects": objects_by_grade["GRADE C"],
+            },
+        },
+        "roi": roi_box,
+        "grade_labels": grade_labels,
+        "overlay": {
+            "region": [int(x0), int(y0), int(region_w), int(region_h)],
+            "palette": [list(prop["color"]) for prop in INTENSITY_LEVELS.values()],
+            "boxes": boxes,
+            "roi": roi_box,
+            "final_grade": final_grade,
+            "total_area_pixels": total_detected_area,
+            "total_area_percentage": percentage,
+        },
+    }
+
+
+def _render_overlay_sync(image: np.ndarray, grade_labels: np.ndarray | None, overlay: dict) -> bytes:
+    """Gambar overlay (isian grade, kotak objek, ROI, teks) lalu encode JPEG."""
+    labeled_image = image.copy()
+    x0, y0, region_w, region_h = overlay["region"]
+    palette = [tuple(int(c) for c in color) for color in overlay["palette"]]
+
+    if grade_labels is not None:
+        paint_grade_overlay(
+            image[y0 : y0 + region_h, x0 : x0 + region_w],
+            grade_labels,
+            palette,
+            out=labeled_image[y0 : y0 + region_h, x0 : x0 + region_w],
+        )
+
+    for x, y, w, h, level_index, object_id in overlay["boxes"]:
+        color = palette[level_index]
+        cv2.rectangle(labeled_image, (x, y), (x + w, y + h), color, 2)
+        cv2.putText(labeled_image, f"ID {object_id}", (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+    roi_box = overlay["roi"]
+    if roi_box is not None and "points" in roi_box:
+        cv2.polylines(labeled_image, [np.array(roi_box["points"], dtype=np.int32)], True, (255, 255, 255), 2)
+    elif roi_box is not None and roi_box["mode"] == "rect":
+        cv2.rectangle(labeled_image, (x0, y0), (x0 + region_w, y0 + region_h), (255, 255, 255), 2)
 
     info_text_y = 30
     cv2.putText(
         labeled_image,
-        f"Final Grade: {final_grade}",
+        f"Final Grade: {overlay['final_grade']}",
         (10, info_text_y),
         cv2.FONT_HERSHEY_SIMPLEX,
         1,
@@ -513,7 +1138,7 @@ async def grade_using_cv(
     info_text_y += 30
     cv2.putText(
         labeled_image,
-        f"Total Area Terdeteksi: {total_detected_area:.2f} px ({percentage:.4f}%)",
+        f"Total Area Terdeteksi: {overlay['total_area_pixels']:.2f} px ({overlay['total_area_percentage']:.4f}%)",
         (10, info_text_y),
         cv2.FONT_HERSHEY_SIMPLEX,
         0.7,
@@ -521,20 +1146,323 @@ async def grade_using_cv(
         2,
     )
 
-    timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    _, img_encoded = cv2.imencode(".jpg", labeled_image)
+    return img_encoded.tobytes()
+
+
+def _color_hex(bgr) -> str:
+    blue, green, red = (int(c) for c in bgr)
+    return f"#{red:02X}{green:02X}{blue:02X}"
+
+
+def _vector_overlay_sync(grade_labels: np.ndarray | None, overlay: dict, image_shape) -> dict:
+    """Overlay dalam bentuk vektor (poligon per grade + kotak objek) untuk digambar client.
+
+    - GRADING_VECTOR_EPSILON: toleransi penyederhanaan poligon (pixel, 0 = tanpa kehilangan)
+    - GRADING_VECTOR_MIN_AREA: abaikan poligon dengan luas kontur lebih kecil dari ini
+      (hati-hati: bercak selebar 1 pixel punya luas kontur ~0)
+    """
+    try:
+        epsilon = float(os.getenv("GRADING_VECTOR_EPSILON", "1.0"))
+    except Exception:
+        epsilon = 1.0
+    try:
+        min_area = float(os.getenv("GRADING_VECTOR_MIN_AREA", "0"))
+    except Exception:
+        min_area = 0.0
+
+    grade_names = list(GRADE_SHORT_NAMES)
+    x0, y0 = overlay["region"][:2]
+    polygons = [[] for _ in grade_names]
+    if grade_labels is not None:
+        polygons = vectorize_grade_labels(grade_labels, len(grade_names), (x0, y0), epsilon, min_area)
+
+    return {
+        "image_size": {"width": int(image_shape[1]), "height": int(image_shape[0])},
+        "epsilon": epsilon,
+        "min_area": min_area,
+        "fill_rule": "evenodd",
+        "grades": [
+            {"grade": name, "color": _color_hex(color), "polygons": grade_polygons}
+            for name, color, grade_polygons in zip(grade_names, overlay["palette"], polygons)
+        ],
+        "boxes": [
+            {
+                "object_id": object_id,
+                "grade": grade_names[level_index],
+                "color": _color_hex(overlay["palette"][level_index]),
+                "x": x,
+                "y": y,
+                "width": w,
+                "height": h,
+            }
+            for x, y, w, h, level_index, object_id in overlay["boxes"]
+        ],
+        "roi": overlay["roi"],
+        "final_grade": overlay["final_grade"],
+    }
+
+
+def _grade_frame_sync(
+    image: np.ndarray,
+    thresholds: tuple[int, int, int],
+    ppb_params: dict,
+    roi: dict | None = None,
+    artifact: dict | None = None,
+    render: bool = True,
+    vector: bool = False,
+) -> dict:
+    """Bagian CPU dari grading (dijalankan di worker process).
+
+    Mengembalikan angka hasil grading dan gambar overlay yang sudah di-encode JPEG.
+    Jika `roi` diberikan, filter dan klasifikasi hanya berjalan di dalam ROI;
+    koordinat bounding box tetap dalam koordinat gambar penuh.
+
+    Dengan `artifact` ({"path", "store_ndfi", "original_image_path", "roi_config"}),
+    overlay tidak digambar (`encoded_image` None); plane label disimpan ke
+    artifact agar overlay bisa dirender nanti lewat `_render_artifact_sync`.
+    Dengan `render=False` hanya angka yang dihitung: tanpa overlay dan tanpa artifact.
+    Dengan `vector=True` hasil juga berisi `vector_overlay` (poligon, bukan gambar).
+    `stage_seconds` berisi durasi tiap tahap (untuk GET /metrics).
+    """
+    timings = {}
+    height, width, _ = image.shape
+    with stage_timer(timings, "roi"):
+        roi_box = resolve_roi(roi, image, thresholds[2])
+    if roi_box is None:
+        x0, y0, region_w, region_h = 0, 0, width, height
+    else:
+        x0, y0, region_w, region_h = roi_box["x"], roi_box["y"], roi_box["width"], roi_box["height"]
+
+    ndfi = None
+    gray = None
+    if region_w > 0 and region_h > 0:
+        with stage_timer(timings, "filter"):
+            filtered_image = filter_frame(image, None if roi_box is None else (x0, y0, region_w, region_h))
+        with stage_timer(timings, "ndfi"):
+            ndfi = compute_ndfi_normalized(filtered_image)
+            gray = cv2.cvtColor(filtered_image, cv2.COLOR_BGR2GRAY)
+
+    graded = _grade_planes_sync(ndfi, gray, thresholds, ppb_params, roi_box, (height, width), timings)
+    graded["stage_seconds"] = timings
+    grade_labels = graded.pop("grade_labels")
+    overlay = graded.pop("overlay")
+    if vector:
+        with stage_timer(timings, "vector"):
+            graded["vector_overlay"] = _vector_overlay_sync(grade_labels, overlay, (height, width))
+
+    if not render:
+        graded["encoded_image"] = None
+        return graded
+    if artifact is None:
+        with stage_timer(timings, "render"):
+            graded["encoded_image"] = _render_overlay_sync(image, grade_labels, overlay)
+        return graded
+
+    planes = {"labels": grade_labels}
+    if artifact.get("store_ndfi"):
+        planes["ndfi"] = ndfi
+        planes["gray"] = gray
+    meta = {
+        "engine_version": ENGINE_VERSION,
+        "image_shape": [height, width],
+        "thresholds": [int(t) for t in thresholds],
+        "original_image_path": artifact.get("original_image_path"),
+        "roi_config": artifact.get("roi_config"),
+        "overlay": overlay,
+    }
+    with stage_timer(timings, "artifact"):
+        save_artifact(artifact["path"], meta, planes)
+    graded["encoded_image"] = None
+    return graded
+
+
+def _render_artifact_sync(artifact_path: str, out_path: str) -> str:
+    """Render overlay dari artifact + gambar original, simpan ke `out_path` (worker)."""
+    meta, planes = load_artifact(artifact_path, ("labels",))
+    image = cv2.imread(str(meta["original_image_path"]))
+    if image is None:
+        raise ValueError("Original image for this run is no longer available")
+    encoded = _render_overlay_sync(image, planes["labels"], meta["overlay"])
+    tmp_path = f"{out_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(encoded)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _vector_artifact_sync(artifact_path: str) -> dict:
+    """Overlay vektor dari artifact run lama, tanpa membaca gambar original (worker)."""
+    meta, planes = load_artifact(artifact_path, ("labels",))
+    try:
+        return _vector_overlay_sync(planes["labels"], meta["overlay"], meta["image_shape"])
+    except (KeyError, IndexError, TypeError) as e:
+        raise ArtifactCorrupt(f"Grading artifact {artifact_path} has invalid overlay metadata: {e!r}") from e
+
+
+def _rethreshold_sync(artifact_path: str, thresholds: tuple[int, int, int], ppb_params: dict) -> dict:
+    """Grading ulang dari artifact dengan threshold / parameter ppb baru (worker).
+
+    Memakai plane NDFI + grayscale jika tersimpan; jika tidak, gambar
+    original di-decode dan di-filter ulang. Plane hanya berisi area ROI run
+    lama, sedangkan ROI "auto" dideteksi dari t3; jadi untuk ROI auto dengan
+    t3 berbeda (atau artifact lama tanpa threshold) gambar original juga
+    di-grading ulang agar hasilnya sama dengan grading baru.
+    """
+    meta, planes = load_artifact(artifact_path, ("ndfi", "gray"))
+    overlay_roi = meta["overlay"]["roi"]
+    stored_thresholds = meta.get("thresholds")
+    roi_reusable = (
+        overlay_roi is None
+        or overlay_roi["mode"] != "auto"
+        or (stored_thresholds is not None and int(stored_thresholds[2]) == int(thresholds[2]))
+    )
+    if planes["ndfi"] is not None and planes["gray"] is not None and roi_reusable:
+        graded = _grade_planes_sync(
+            planes["ndfi"], planes["gray"], thresholds, ppb_params, overlay_roi, tuple(meta["image_shape"])
+        )
+        graded.pop("grade_labels")
+        graded.pop("overlay")
+        graded["source"] = "artifact"
+        return graded
+
+    image = cv2.imread(str(meta["original_image_path"]))
+    if image is None:
+        raise ValueError("Original image for this run is no longer available")
+    graded = _grade_frame_sync(image, thresholds, ppb_params, meta.get("roi_config"), render=False)
+    graded.pop("encoded_image")
+    graded.pop("stage_seconds")
+    graded["source"] = "original"
+    return graded
+
+
+async def grade_using_cv(
+    filepath: str,
+    thresholds: tuple[int, int, int] = (150, 160, 168),
+    ppb_overrides: dict | None = None,
+    batch_id: str | None = None,
+    tray_id: str | None = None,
+    image: np.ndarray | None = None,
+    save_to_db: bool = True,
+    roi: dict | None = None,
+    use_cache: bool = False,
+    render: bool = True,
+    vector: bool = False,
+):
+    """
+    Mendeteksi dan mengklasifikasikan aflatoksin pada gambar jagung.
+    - Warna isian sesuai dengan grade piksel masing-masing.
+    - Warna kotak dan label sesuai dengan grade terparah dalam satu area.
+
+    Kerja CPU dijalankan di `grading_executor`; jika `image` sudah di-decode,
+    frame dikirim ke worker lewat shared memory. Dengan `use_cache`, hasil
+    untuk isi gambar + parameter yang sama diambil dari `grading_cache`
+    tanpa grading ulang, tanpa encode overlay dan tanpa insert MySQL baru.
+
+    Dengan `render=False` (untuk pemanggil otomatis yang hanya butuh angka)
+    semua tahap visualisasi dilewati dan `graded_image_path` bernilai None.
+    Dengan `vector=True` respons berisi `vector_overlay` (poligon per grade +
+    kotak objek, beberapa KB) agar client menggambar overlay sendiri.
+
+    Dengan GRADING_OVERLAY_MODE=lazy (default), file di `graded_image_path`
+    belum ada saat respons dikirim: overlay baru dirender saat pertama kali
+    diminta lewat /openImage atau /tiles. Jangan membaca path itu langsung
+    dari disk.
+    """
+    print("Detecting and Grading Aflatoxin using OpenCV..")
+    started = time.perf_counter()
+    t1, t2, t3 = thresholds
+    ppb_params = _get_ppb_scoring_params(ppb_overrides)
+
+    cache_key = None
+    cached = None
+    if use_cache:
+        with grading_stage_seconds.time(stage="cache_lookup"):
+            cache_key = await _grading_cache_key(filepath, image, (t1, t2, t3), ppb_params, roi)
+            if cache_key is not None:
+                cached = await _grading_cache_lookup(cache_key, need_overlay=render, need_vector=vector)
+    if cache_key is not None:
+        if cached is not None:
+            response_data = dict(cached)
+            response_data["original_image_path"] = filepath
+            print(f"{response_data['final_grade']} (cache hit)")
+            # batch_id / tray_id di respons harus sama dengan baris grading_runs yang dirujuk run_uuid.
+            if save_to_db and response_data.get("run_uuid") is None:
+                # Entri dari batch tanpa save_to_db belum punya baris grading_runs: buat baris untuk request ini.
+                response_data["batch_id"] = batch_id
+                response_data["tray_id"] = tray_id
+                await _save_grading_run(response_data)
+                await _grading_cache_store(cache_key, response_data)
+            elif save_to_db:
+                # Baris run yang di-cache dipakai ulang (tidak ada baris baru), jadi id-nya dikembalikan apa adanya.
+                if response_data.get("grading_run_id") is None:
+                    response_data["grading_run_id"] = grading_writer.saved_id(response_data["run_uuid"])
+            else:
+                # Tanpa save_to_db respons tidak merujuk baris mana pun, sama seperti grading baru.
+                response_data["batch_id"] = batch_id
+                response_data["tray_id"] = tray_id
+                response_data.pop("run_uuid", None)
+                response_data.pop("grading_run_id", None)
+            if not vector:
+                response_data.pop("vector_overlay", None)
+            response_data["cache_hit"] = True
+            grading_runs.inc(final_grade=response_data["final_grade"], cache="hit")
+            grading_seconds.observe(time.perf_counter() - started, cache="hit")
+            return response_data
+
+    timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S-%f")
     save_path = os.path.join("/home/ubuntu/fotohasil/", f"graded_image_cv-{timestamp}.jpg")
 
-    _, img_encoded = cv2.imencode(".jpg", labeled_image)
-    async with aiofiles.open(save_path, "wb") as img_file:
-        await img_file.write(img_encoded.tobytes())
-    print(f"✅ Graded image successfully saved to {save_path}")
+    artifact = None
+    if render and grading_artifacts.lazy:
+        artifact = {
+            "path": grading_artifacts.path_for(save_path),
+            "store_ndfi": grading_artifacts.store_ndfi,
+            "original_image_path": os.path.abspath(str(filepath)),
+            "roi_config": roi,
+        }
+
+    executor_started = time.perf_counter()
+    try:
+        graded = await grading_executor.run(
+            _grade_frame_sync,
+            image if image is not None else filepath,
+            (t1, t2, t3),
+            ppb_params,
+            roi,
+            artifact,
+            render,
+            vector,
+        )
+    except Exception as e:
+        grading_errors.inc(reason=type(e).__name__)
+        raise
+    executor_seconds = time.perf_counter() - executor_started
+    stage_seconds = graded.pop("stage_seconds")
+    for stage, seconds in stage_seconds.items():
+        grading_stage_seconds.observe(seconds, stage=stage)
+    # Sisa waktu round-trip: antre di executor + kirim frame / hasil antar proses.
+    grading_stage_seconds.observe(max(executor_seconds - sum(stage_seconds.values()), 0.0), stage="executor_overhead")
+    final_grade = graded["final_grade"]
+    if not render:
+        save_path = None
+
+    if graded["encoded_image"] is not None:
+        with grading_stage_seconds.time(stage="write_overlay"):
+            async with aiofiles.open(save_path, "wb") as img_file:
+                await img_file.write(graded["encoded_image"])
+        print(f"✅ Graded image successfully saved to {save_path}")
+        if tile_pyramids.on_grade:
+            tile_pyramids.schedule(save_path)
+    if render and tile_pyramids.on_grade and os.path.isfile(filepath):
+        tile_pyramids.schedule(filepath)
 
     response_data = {
         "final_grade": final_grade,
-        "total_area_pixels": total_detected_area,
-        "total_area_percentage": percentage,
-        "total_objects": object_counter,
-        "ppb_total": float(ppb_total),
+        "total_area_pixels": graded["total_area_pixels"],
+        "total_area_percentage": graded["total_area_percentage"],
+        "total_objects": graded["total_objects"],
+        "ppb_total": graded["ppb_total"],
         "ppb_scoring_params": {
             "w_reject": float(ppb_params["w_reject"]),
             "w_grade_d": float(ppb_params["w_grade_d"]),
@@ -543,40 +1471,118 @@ async def grade_using_cv(
             "brightness_source": "grayscale_mean_on_object_mask",
             "formula": "ppb = w_reject*px_reject + w_grade_d*px_grade_d + w_grade_c*px_grade_c (optional * brightness factor)",
         },
-        "summary_by_grade": {
-            "REJECT": {
-                "total_pixels": INTENSITY_LEVELS["REJECT (Sangat Terang)"]["area"],
-                "total_objects": len(objects_by_grade["REJECT"]),
-                "objects": objects_by_grade["REJECT"],
-            },
-            "GRADE D": {
-                "total_pixels": INTENSITY_LEVELS["GRADE D (Terang)"]["area"],
-                "total_objects": len(objects_by_grade["GRADE D"]),
-                "objects": objects_by_grade["GRADE D"],
-            },
-            "GRADE C": {
-                "total_pixels": INTENSITY_LEVELS["GRADE C (Redup)"]["area"],
-                "total_objects": len(objects_by_grade["GRADE C"]),
-                "objects": objects_by_grade["GRADE C"],
-            },
-        },
+        "summary_by_grade": graded["summary_by_grade"],
         "graded_image_path": save_path,
         "original_image_path": filepath,
         "thresholds": {"t1": t1, "t2": t2, "t3": t3},
         "batch_id": batch_id,
         "tray_id": tray_id,
     }
+    if graded["roi"] is not None:
+        response_data["roi"] = graded["roi"]
+    if vector:
+        response_data["vector_overlay"] = graded["vector_overlay"]
     print(final_grade)
 
+    if save_to_db:
+        with grading_stage_seconds.time(stage="db_enqueue"):
+            await _save_grading_run(response_data)
+
+    if cache_key is not None:
+        await _grading_cache_store(cache_key, response_data)
+        response_data["cache_hit"] = False
+
+    cache_label = "miss" if cache_key is not None else "disabled"
+    grading_runs.inc(final_grade=final_grade, cache=cache_label)
+    grading_seconds.observe(time.perf_counter() - started, cache=cache_label)
+    return response_data
+
+
+async def _save_grading_run(response_data: dict):
+    """Antrekan ke MySQL tanpa memperlambat response; isi run_uuid / grading_run_id / db_status.
+
+    id hanya ditunggu sebentar (GRADING_DB_RESPONSE_WAIT detik). Jika belum ada,
+    klien bisa memakai run_uuid atau GET /gradingRun/{run_uuid} nanti.
+    """
     try:
-        grading_run_id = await save_grading_to_mysql(response_data)
-        response_data["grading_run_id"] = grading_run_id
+        run_uuid, future = save_grading_to_mysql(response_data)
     except Exception as e:
-        print(f"⚠️  Failed to save grading to MySQL: {e}")
+        print(f"⚠️  Failed to queue grading for MySQL: {e}")
         response_data["grading_run_id"] = None
         response_data["db_error"] = str(e)
+        return
+
+    try:
+        wait_seconds = float(os.getenv("GRADING_DB_RESPONSE_WAIT", "0.2"))
+    except Exception:
+        wait_seconds = 0.2
+
+    grading_run_id = None
+    if wait_seconds > 0:
+        try:
+            grading_run_id = await asyncio.wait_for(asyncio.shield(future), wait_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    response_data["run_uuid"] = run_uuid
+    response_data["grading_run_id"] = grading_run_id
+    if grading_run_id is not None:
+        response_data["db_status"] = "saved"
+    elif future.done():
+        response_data["db_status"] = "spooled"
+    else:
+        response_data["db_status"] = "queued"
 
-    return response_data
+
+async def _grading_cache_key(filepath, image, thresholds, ppb_params, roi) -> str | None:
+    try:
+        if image is not None:
+            image_digest = await anyio.to_thread.run_sync(hash_image_array, image)
+        else:
+            image_digest = await anyio.to_thread.run_sync(hash_image_file, str(filepath))
+    except OSError:
+        # Biarkan pipeline grading yang melaporkan gambar tidak ditemukan.
+        return None
+    return make_cache_key(image_digest, thresholds, ppb_params, roi, ENGINE_VERSION)
+
+
+async def _grading_cache_lookup(cache_key: str, need_overlay: bool = True, need_vector: bool = False) -> dict | None:
+    """Entri cache yang bisa dipakai request ini; setiap lookup dihitung tepat sekali (hit atau miss)."""
+    cached = grading_cache.get_memory(cache_key)
+    from_disk = False
+    if cached is None:
+        cached = await anyio.to_thread.run_sync(grading_cache.get_disk, cache_key)
+        from_disk = cached is not None
+
+    # Overlay (atau artifact-nya) yang sudah dihapus berarti entri tidak bisa dipakai lagi.
+    # Entri tanpa overlay (render=False) hanya berlaku untuk request yang juga tanpa overlay.
+    if cached is not None and need_overlay:
+        graded_image_path = cached.get("graded_image_path")
+        if graded_image_path is None or not grading_artifacts.available(str(graded_image_path)):
+            cached = None
+    if cached is not None and need_vector and "vector_overlay" not in cached:
+        cached = None
+
+    if cached is None:
+        grading_cache.record_miss()
+    elif from_disk:
+        grading_cache.record_disk_hit(cache_key, cached)
+    else:
+        grading_cache.record_memory_hit()
+    return cached
+
+
+async def _grading_cache_store(cache_key: str, response_data: dict):
+    entry = {
+        key: value
+        for key, value in response_data.items()
+        if key not in ("db_error", "db_status", "cache_hit")
+    }
+    grading_cache.put_memory(cache_key, entry)
+    try:
+        await anyio.to_thread.run_sync(grading_cache.put_disk, cache_key, entry)
+    except Exception as e:
+        print(f"⚠️  Failed to write grading cache: {e}")
 
 
 @app.get("/captureImage2")
@@ -589,39 +1595,43 @@ async def read_root(
     w_grade_c: Union[float, None] = None,
     batch_id: Union[str, None] = None,
     tray_id: Union[str, None] = None,
+    roi: Union[str, None] = None,
+    render: bool = True,
+    vector: bool = False,
 ):
-    prev_cwd = os.getcwd()
-    shot_date = datetime.now().strftime("%Y-%m-%d")
-    shot_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    picID = "PiShots_" + shot_time
-
-    captureAndDownloadCommand = ["--capture-image-and-download","--filename",picID+".jpg"]
-
-    folder_name = shot_date
     try:
         thresholds = _validate_thresholds(t1, t2, t3)
-        createSaveFolder(folder_name)
-        captureImages(captureAndDownloadCommand, picID)
-        original_path = os.path.abspath(picID + ".jpg")
+        roi_config = _validate_roi(roi)
+        shot = await _capture_image()
+        # Path arsip dipakai sebagai original_image_path (DB, render overlay lazy,
+        # /openImage), jadi tunggu file-nya tertulis; berjalan paralel dengan decode.
+        frame, _ = await asyncio.gather(
+            anyio.to_thread.run_sync(_decode_jpeg, shot.data),
+            shot.wait_archived(),
+        )
         ppb_overrides = {
             "w_reject": w_reject,
             "w_grade_d": w_grade_d,
             "w_grade_c": w_grade_c,
         }
         result = await grade_using_cv(
-            original_path,
+            shot.path,
             thresholds=thresholds,
             ppb_overrides=ppb_overrides,
             batch_id=batch_id,
             tray_id=tray_id,
+            image=frame,
+            roi=roi_config,
+            render=render,
+            vector=vector,
         )
         return result
     except HTTPException:
         raise
+    except (GradingQueueFull, CaptureQueueFull) as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         return {"error": str(e)}
-    finally:
-        os.chdir(prev_cwd)
 
 
 @app.get("/gradeImage")
@@ -633,28 +1643,747 @@ async def grade_image(
     w_reject: Union[float, None] = None,
     w_grade_d: Union[float, None] = None,
     w_grade_c: Union[float, None] = None,
+    roi: Union[str, None] = None,
+    use_cache: bool = True,
+    render: bool = True,
+    vector: bool = False,
 ):
     try:
         thresholds = _validate_thresholds(t1, t2, t3)
+        roi_config = _validate_roi(roi)
         ppb_overrides = {
             "w_reject": w_reject,
             "w_grade_d": w_grade_d,
             "w_grade_c": w_grade_c,
         }
-        result = await grade_using_cv(image_path, thresholds=thresholds, ppb_overrides=ppb_overrides)
+        result = await grade_using_cv(
+            image_path,
+            thresholds=thresholds,
+            ppb_overrides=ppb_overrides,
+            roi=roi_config,
+            use_cache=use_cache,
+            render=render,
+            vector=vector,
+        )
         return result
     except HTTPException:
         raise
+    except GradingQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         return {"error": str(e)}
 
+class GradeBatchRequest(BaseModel):
+    image_paths: list[str] = []
+    directory: Union[str, None] = None
+    pattern: str = "*.jpg"
+    t1: int = 150
+    t2: int = 160
+    t3: int = 168
+    w_reject: Union[float, None] = None
+    w_grade_d: Union[float, None] = None
+    w_grade_c: Union[float, None] = None
+    batch_id: Union[str, None] = None
+    tray_id: Union[str, None] = None
+    roi: Union[str, None] = None
+    save_to_db: bool = False
+    use_cache: bool = True
+    render: bool = True
+    vector: bool = False
+
+
+def _resolve_batch_paths(request: GradeBatchRequest) -> list[str]:
+    paths = [p.strip() for p in request.image_paths if p and p.strip()]
+
+    if request.directory:
+        if not os.path.isdir(request.directory):
+            raise HTTPException(status_code=404, detail="Directory not found")
+        pattern = os.path.join(request.directory, request.pattern or "*.jpg")
+        paths.extend(sorted(glob.glob(pattern, recursive=True)))
+
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        raise HTTPException(status_code=400, detail="No images to grade")
+
+    try:
+        max_images = int(os.getenv("GRADING_BATCH_MAX_IMAGES", "1000"))
+    except Exception:
+        max_images = 1000
+    if len(paths) > max_images:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images in one batch ({len(paths)} > {max_images})",
+        )
+    return paths
+
+
+@app.post("/gradeBatch")
+async def grade_batch(request: GradeBatchRequest):
+    """Grading banyak gambar paralel; hasil di-stream sebagai NDJSON per gambar selesai.
+
+    Baris terakhir berisi ringkasan (`"done": true`). Jika `save_to_db`,
+    semua hasil diantrekan ke writer grading_runs setelah batch selesai
+    (run_uuid per gambar ada di ringkasan).
+    """
+    thresholds = _validate_thresholds(request.t1, request.t2, request.t3)
+    roi_config = _validate_roi(request.roi)
+    paths = _resolve_batch_paths(request)
+    ppb_overrides = {
+        "w_reject": request.w_reject,
+        "w_grade_d": request.w_grade_d,
+        "w_grade_c": request.w_grade_c,
+    }
+    semaphore = asyncio.Semaphore(grading_executor.max_workers)
+
+    async def grade_one(index: int, path: str) -> dict:
+        async with semaphore:
+            try:
+                result = await grade_using_cv(
+                    path,
+                    thresholds=thresholds,
+                    ppb_overrides=ppb_overrides,
+                    batch_id=request.batch_id,
+                    tray_id=request.tray_id,
+                    save_to_db=False,
+                    roi=roi_config,
+                    use_cache=request.use_cache,
+                    render=request.render,
+                    vector=request.vector,
+                )
+                return {"index": index, "image_path": path, "result": result}
+            except Exception as e:
+                return {"index": index, "image_path": path, "error": str(e)}
+
+    async def stream_results():
+        tasks = [asyncio.create_task(grade_one(i, path)) for i, path in enumerate(paths)]
+        results = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                if "result" in item:
+                    results.append(item["result"])
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+
+            summary = {
+                "done": True,
+                "total_images": len(paths),
+                "graded": len(results),
+                "failed": len(paths) - len(results),
+            }
+            if request.save_to_db and results:
+                try:
+                    # Writer menggabungkan antrian ini menjadi INSERT multi-row.
+                    summary["run_uuids"] = {
+                        result["original_image_path"]: save_grading_to_mysql(result)[0] for result in results
+                    }
+                    summary["queued_to_db"] = len(results)
+                except Exception as e:
+                    print(f"⚠️  Failed to queue batch grading for MySQL: {e}")
+                    summary["queued_to_db"] = 0
+                    summary["db_error"] = str(e)
+            yield json.dumps(summary, ensure_ascii=False) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+_sweep_frames = OrderedDict()
+
+
+def _get_sweep_cache_entry(key) -> dict:
+    """Cache per worker process untuk bidang NDFI hasil filter (berumur pendek).
+
+    - GRADING_SWEEP_CACHE_ITEMS: jumlah gambar yang disimpan per worker
+    - GRADING_SWEEP_CACHE_TTL: umur entri dalam detik
+    """
+    try:
+        max_items = int(os.getenv("GRADING_SWEEP_CACHE_ITEMS", "4"))
+    except Exception:
+        max_items = 4
+    try:
+        ttl = float(os.getenv("GRADING_SWEEP_CACHE_TTL", "120"))
+    except Exception:
+        ttl = 120.0
+
+    now = time.monotonic()
+    for cached_key in [k for k, v in _sweep_frames.items() if now - v["created_at"] > ttl]:
+        del _sweep_frames[cached_key]
+
+    entry = _sweep_frames.get(key)
+    if entry is None:
+        entry = {"created_at": now, "shape": None, "boxes": {}, "planes": {}}
+        if max_items > 0:
+            _sweep_frames[key] = entry
+            while len(_sweep_frames) > max_items:
+                _sweep_frames.popitem(last=False)
+    else:
+        _sweep_frames.move_to_end(key)
+    return entry
+
+
+def _build_sweep_plane(frame: np.ndarray, roi_box: dict | None) -> dict:
+    """Bagian grading yang tidak bergantung pada threshold: filter, NDFI, grayscale."""
+    height, width, _ = frame.shape
+    if roi_box is None:
+        x0, y0, region_w, region_h = 0, 0, width, height
+    else:
+        x0, y0, region_w, region_h = roi_box["x"], roi_box["y"], roi_box["width"], roi_box["height"]
+
+    plane = {"ndfi": None, "gray": None, "mask": None, "region_area": region_w * region_h, "objects": {}}
+    if region_w > 0 and region_h > 0:
+        filtered_image = filter_frame(frame, None if roi_box is None else (x0, y0, region_w, region_h))
+        plane["ndfi"] = compute_ndfi_normalized(filtered_image)
+        plane["gray"] = cv2.cvtColor(filtered_image, cv2.COLOR_BGR2GRAY)
+        if roi_box is not None and "points" in roi_box:
+            roi_mask = np.zeros(plane["ndfi"].shape, dtype=np.uint8)
+            polygon = np.array(roi_box["points"], dtype=np.int32) - np.array([x0, y0], dtype=np.int32)
+            cv2.fillPoly(roi_mask, [polygon], 255)
+            plane["mask"] = roi_mask
+            plane["region_area"] = cv2.countNonZero(roi_mask)
+        plane["cumulative_histogram"] = np.cumsum(ndfi_histogram(plane["ndfi"], plane["mask"]))
+    else:
+        plane["cumulative_histogram"] = np.zeros(256, dtype=np.int64)
+    return plane
+
+
+def _sweep_ppb_total(px_reject, px_grade_d, px_grade_c, mean_brightness, ppb_params: dict) -> float:
+    """Versi vektor dari `_estimate_ppb_for_object` + penjumlahan seperti /gradeImage."""
+    ppb = (
+        px_reject.astype(np.float64) * float(ppb_params["w_reject"])
+        + px_grade_d.astype(np.float64) * float(ppb_params["w_grade_d"])
+        + px_grade_c.astype(np.float64) * float(ppb_params["w_grade_c"])
+    )
+    brightness_weight = float(ppb_params["brightness_weight"])
+    if brightness_weight != 0:
+        ppb = ppb * (1.0 + brightness_weight * np.clip(mean_brightness / 255.0, 0.0, 1.0))
+    ppb = np.where(ppb < 0, 0.0, ppb)
+    # Dijumlah berurutan (bukan np.sum) agar hasilnya identik dengan /gradeImage.
+    return float(sum(ppb.tolist()))
+
+
+def _sweep_frame_sync(
+    image_path: str,
+    image_digest: str,
+    roi: dict | None,
+    combos: list[tuple[int, int, int]],
+    ppb_param_sets: list[dict],
+) -> list[dict]:
+    """Evaluasi banyak kombinasi threshold untuk satu gambar (dijalankan di worker).
+
+    Decode, blur dan NDFI dihitung sekali lalu disimpan di cache worker;
+    pelabelan objek dilakukan sekali per nilai t3. Tidak ada overlay dan
+    tidak ada insert MySQL.
+    """
+    entry = _get_sweep_cache_entry((image_digest, json.dumps(roi, sort_keys=True)))
+    frame = None
+
+    def load_frame() -> np.ndarray:
+        nonlocal frame
+        if frame is None:
+            frame = cv2.imread(str(image_path))
+            if frame is None:
+                print(f"Error: Image not found at path: {image_path}")
+                raise ValueError("Image not found or the path is incorrect")
+            entry["shape"] = frame.shape[:2]
+        return frame
+
+    combos_by_t3 = {}
+    for index, (t1, t2, t3) in enumerate(combos):
+        combos_by_t3.setdefault(t3, []).append(index)
+
+    results = [None] * len(combos)
+    for t3, indices in combos_by_t3.items():
+        if t3 not in entry["boxes"]:
+            # ROI auto bergantung pada t3; ROI tetap menghasilkan kotak yang sama.
+            entry["boxes"][t3] = resolve_roi(roi, load_frame(), t3)
+        roi_box = entry["boxes"][t3]
+
+        plane_key = None if roi_box is None else (roi_box["x"], roi_box["y"], roi_box["width"], roi_box["height"])
+        plane = entry["planes"].get(plane_key)
+        if plane is None:
+            plane = _build_sweep_plane(load_frame(), roi_box)
+            entry["planes"][plane_key] = plane
+
+        if t3 not in plane["objects"]:
+            if plane["ndfi"] is None:
+                plane["objects"][t3] = (np.zeros(0), np.zeros((0, 256), dtype=np.int64))
+            else:
+                objects, cumulative = compute_object_ndfi_histograms(
+                    plane["ndfi"], t3, plane["gray"], plane["mask"]
+                )
+                mean_brightness = np.array([obj["mean_brightness"] for obj in objects], dtype=np.float64)
+                plane["objects"][t3] = (mean_brightness, cumulative)
+        mean_brightness, cumulative = plane["objects"][t3]
+
+        height, width = entry["shape"]
+        total_image_area = height * width
+        if roi_box is not None and roi_box["mode"] != "auto":
+            total_image_area = plane["region_area"]
+        area_cum = plane["cumulative_histogram"]
+
+        for index in indices:
+            t1, t2, _ = combos[index]
+            reject_area = int(area_cum[t1])
+            grade_d_area = int(area_cum[t2] - area_cum[t1])
+            grade_c_area = int(area_cum[t3] - area_cum[t2])
+            total_detected_area = reject_area + grade_d_area + grade_c_area
+            percentage = (total_detected_area / total_image_area) * 100 if total_image_area > 0 else 0.0
+
+            px_reject = cumulative[:, t1]
+            px_grade_d = cumulative[:, t2] - cumulative[:, t1]
+            px_grade_c = cumulative[:, t3] - cumulative[:, t2]
+            # Grade objek = grade terparah yang punya pixel di objek tersebut.
+            reject_objects = int(np.count_nonzero(px_reject > 0))
+            grade_d_objects = int(np.count_nonzero((px_reject == 0) & (px_grade_d > 0)))
+            total_objects = int(cumulative.shape[0])
+
+            ppb_totals = [
+                _sweep_ppb_total(px_reject, px_grade_d, px_grade_c, mean_brightness, ppb_params)
+                for ppb_params in ppb_param_sets
+            ]
+            results[index] = {
+                "t1": t1,
+                "t2": t2,
+                "t3": t3,
+                "final_grade": _final_grade_from_areas(reject_area, grade_d_area, grade_c_area, total_detected_area),
+                "total_area_pixels": total_detected_area,
+                "total_area_percentage": percentage,
+                "total_objects": total_objects,
+                "ppb_total": ppb_totals[0],
+                "ppb_totals": ppb_totals,
+                "summary_by_grade": {
+                    "REJECT": {"total_pixels": reject_area, "total_objects": reject_objects},
+                    "GRADE D": {"total_pixels": grade_d_area, "total_objects": grade_d_objects},
+                    "GRADE C": {
+                        "total_pixels": grade_c_area,
+                        "total_objects": total_objects - reject_objects - grade_d_objects,
+                    },
+                },
+            }
+    return results
+
+
+class GradeSweepRequest(BaseModel):
+    image_paths: list[str]
+    thresholds: list[list[int]] = []
+    t1_values: list[int] = []
+    t2_values: list[int] = []
+    t3_values: list[int] = []
+    ppb_param_sets: list[dict] = []
+    roi: Union[str, None] = None
+
+
+def _resolve_sweep_combos(request: GradeSweepRequest) -> list[tuple[int, int, int]]:
+    combos = []
+    for triple in request.thresholds:
+        if len(triple) != 3:
+            raise HTTPException(status_code=400, detail="Each threshold combination must be [t1, t2, t3]")
+        combos.append(_validate_thresholds(*triple))
+
+    grid = (request.t1_values, request.t2_values, request.t3_values)
+    if any(grid):
+        if not all(grid):
+            raise HTTPException(
+                status_code=400,
+                detail="t1_values, t2_values and t3_values must all be given for a grid sweep",
+            )
+        for t1, t2, t3 in itertools.product(*grid):
+            # Kombinasi grid yang tidak valid dilewati, bukan ditolak.
+            if 0 <= t1 < t2 < t3 <= 255:
+                combos.append((int(t1), int(t2), int(t3)))
+
+    combos = list(dict.fromkeys(combos))
+    if not combos:
+        raise HTTPException(status_code=400, detail="No valid threshold combinations to sweep")
+
+    try:
+        max_combos = int(os.getenv("GRADING_SWEEP_MAX_COMBINATIONS", "2000"))
+    except Exception:
+        max_combos = 2000
+    if len(combos) > max_combos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many threshold combinations ({len(combos)} > {max_combos})",
+        )
+    return combos
+
+
+@app.post("/gradeSweep")
+async def grade_sweep(request: GradeSweepRequest):
+    """Kalibrasi threshold: banyak kombinasi (t1, t2, t3) per gambar dalam satu request.
+
+    NDFI tiap gambar dihitung sekali; hasil per kombinasi hanya berisi angka
+    (final_grade, area, jumlah objek, ppb) tanpa overlay JPEG dan tanpa MySQL.
+    """
+    combos = _resolve_sweep_combos(request)
+    roi_config = _validate_roi(request.roi)
+    paths = list(dict.fromkeys(p.strip() for p in request.image_paths if p and p.strip()))
+    if not paths:
+        raise HTTPException(status_code=400, detail="No images to grade")
+
+    ppb_param_sets = [_get_ppb_scoring_params(overrides) for overrides in (request.ppb_param_sets or [None])]
+    semaphore = asyncio.Semaphore(grading_executor.max_workers)
+
+    async def sweep_one(path: str) -> dict:
+        async with semaphore:
+            try:
+                image_digest = await anyio.to_thread.run_sync(hash_image_file, path)
+            except OSError:
+                return {"image_path": path, "error": "Image not found or the path is incorrect"}
+            try:
+                results = await grading_executor.run(
+                    _sweep_frame_sync, None, path, image_digest, roi_config, combos, ppb_param_sets
+                )
+                return {"image_path": path, "results": results}
+            except Exception as e:
+                return {"image_path": path, "error": str(e)}
+
+    images = await asyncio.gather(*(sweep_one(path) for path in paths))
+    return {
+        "ppb_param_sets": ppb_param_sets,
+        "total_combinations": len(combos),
+        "data": images,
+    }
+
+
+class ScanSessionRequest(BaseModel):
+    batch_id: Union[str, None] = None
+    tray_prefix: str = "tray-"
+    mode: str = "interval"
+    interval: float = 0.0
+    max_trays: Union[int, None] = None
+    t1: int = 150
+    t2: int = 160
+    t3: int = 168
+    w_reject: Union[float, None] = None
+    w_grade_d: Union[float, None] = None
+    w_grade_c: Union[float, None] = None
+    roi: Union[str, None] = None
+
+
+def _get_scan_session(session_id: str) -> ScanSession:
+    session = scan_sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Scan session not found")
+    return session
+
+
+@app.post("/scanSessions")
+async def start_scan_session(request: ScanSessionRequest):
+    """Mulai scan kontinu: capture tray berikutnya berjalan selama tray sebelumnya di-grading.
+
+    Setiap hasil langsung disimpan ke grading_runs (tray_id = tray_prefix + nomor
+    urut). Status bisa diikuti lewat GET /scanSessions/{id}/events (NDJSON).
+    """
+    if any(session.active for session in scan_sessions.values()):
+        raise HTTPException(status_code=409, detail="Another scan session is already running")
+    thresholds = _validate_thresholds(request.t1, request.t2, request.t3)
+    roi_config = _validate_roi(request.roi)
+    ppb_overrides = {
+        "w_reject": request.w_reject,
+        "w_grade_d": request.w_grade_d,
+        "w_grade_c": request.w_grade_c,
+    }
+
+    # Foto per tray disimpan di memori sampai di-grading (maks. 2 karena antrian ukuran 1).
+    captured = {}
+
+    async def capture(index: int) -> str:
+        # Tanpa coalesce: setiap tray harus foto baru.
+        shot = await _capture_image(coalesce=False, suffix=f"_{session.id}-{index:04d}")
+        captured[index] = shot
+        return shot.path
+
+    async def grade(index: int, path: str) -> dict:
+        shot = captured.pop(index)
+        frame, _ = await asyncio.gather(
+            anyio.to_thread.run_sync(_decode_jpeg, shot.data),
+            shot.wait_archived(),
+        )
+        return await grade_using_cv(
+            path,
+            thresholds=thresholds,
+            ppb_overrides=ppb_overrides,
+            batch_id=request.batch_id,
+            tray_id=f"{request.tray_prefix}{index}",
+            image=frame,
+            roi=roi_config,
+        )
+
+    try:
+        session = ScanSession(
+            capture,
+            grade,
+            batch_id=request.batch_id,
+            mode=request.mode,
+            interval=request.interval,
+            max_trays=request.max_trays,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Simpan hanya beberapa sesi terakhir untuk dilihat statusnya.
+    for old_id in [sid for sid, old in scan_sessions.items() if not old.active][:-9]:
+        del scan_sessions[old_id]
+    scan_sessions[session.id] = session
+    session.start()
+    return {"data": session.status()}
+
+
+@app.get("/scanSessions")
+def list_scan_sessions():
+    return {"data": [session.status() for session in scan_sessions.values()]}
+
+
+@app.get("/scanSessions/{session_id}")
+def scan_session_status(session_id: str):
+    return {"data": _get_scan_session(session_id).status()}
+
+
+@app.post("/scanSessions/{session_id}/trigger")
+def trigger_scan_session(session_id: str, count: int = 1):
+    session = _get_scan_session(session_id)
+    if session.mode != "trigger":
+        raise HTTPException(status_code=400, detail="Scan session is not in trigger mode")
+    if not session.active:
+        raise HTTPException(status_code=409, detail="Scan session is not running")
+    session.trigger(count)
+    return {"data": session.status()}
+
+
+@app.post("/scanSessions/{session_id}/stop")
+def stop_scan_session(session_id: str):
+    session = _get_scan_session(session_id)
+    session.stop()
+    return {"data": session.status()}
+
+
+@app.get("/scanSessions/{session_id}/events")
+async def scan_session_events(session_id: str):
+    session = _get_scan_session(session_id)
+
+    async def stream_events():
+        async for event in session.events():
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
+
+
+@app.get("/gradingCache")
+def grading_cache_stats():
+    return {"data": grading_cache.stats()}
+
+
+@app.delete("/gradingCache")
+def clear_grading_cache():
+    grading_cache.clear()
+    return {"data": grading_cache.stats()}
+
+
+@app.get("/gradingAggregates")
+async def grading_aggregates(
+    group_by: str = "day",
+    date_from: Union[str, None] = None,
+    date_to: Union[str, None] = None,
+    batch_id: Union[str, None] = None,
+    final_grade: Union[str, None] = None,
+):
+    """Total per jam / hari / batch dari tabel rollup (O(bucket), bukan O(run))."""
+    if group_by not in ROLLUP_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(ROLLUP_GROUPS)}")
+    if batch_id is not None and group_by != "batch":
+        raise HTTPException(status_code=400, detail="batch_id filter requires group_by=batch")
+    filters = {
+        "date_from": _parse_history_date(date_from, "date_from"),
+        "date_to": _parse_history_date(date_to, "date_to", end_of_range=True),
+        "batch_id": batch_id,
+        "final_grade": final_grade,
+    }
+    try:
+        buckets = await mysql_pool.run(select_rollups, group_by, filters)
+        return {"group_by": group_by, "data": buckets}
+    except pymysql.err.OperationalError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/gradingRun/{run_uuid}")
+async def grading_run_status(run_uuid: str):
+    """Cari grading_runs.id untuk run_uuid dari response grading sebelumnya."""
+    grading_run_id = grading_writer.saved_id(run_uuid)
+    if grading_run_id is None:
+        try:
+            grading_run_id = await mysql_pool.run(_select_grading_run_id_sync, run_uuid)
+        except pymysql.err.OperationalError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "data": {
+            "run_uuid": run_uuid,
+            "grading_run_id": grading_run_id,
+            "status": "saved" if grading_run_id is not None else "pending",
+        }
+    }
+
+
+@app.get("/gradingWriter")
+def grading_writer_stats():
+    return {"data": grading_writer.stats()}
+
+
+@app.get("/camera")
+def camera_stats():
+    return {"data": {**camera_service.stats(), "capture": capture_manager.stats()}}
+
+
+@app.get("/dbPool")
+def db_pool_stats():
+    return {"data": mysql_pool.stats()}
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Histogram per tahap, counter dan gauge resource dalam format teks Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.content_type)
+
+
+# Tile tidak pernah berubah untuk id yang sama (id ikut berubah jika file berubah).
+_TILE_CACHE_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+
+
+@app.get("/tiles")
+async def tile_pyramid_info(image_path: str):
+    """Info pyramid Deep Zoom untuk satu gambar; dibuat dulu jika belum ada.
+
+    Client (mis. OpenSeadragon) memakai `dzi_url`, lalu hanya mengambil tile
+    yang terlihat dari `/tiles/{id}/image_files/{level}/{col}_{row}.jpg`.
+    """
+    if image_path is None or image_path.strip() == "" or not await _ensure_graded_image(image_path):
+        raise HTTPException(status_code=404, detail="Image not found at the specified path.")
+    try:
+        pid, meta = await tile_pyramids.ensure(image_path)
+    except GradingQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "data": {
+            "id": pid,
+            **meta,
+            "dzi_url": f"/tiles/{pid}/image.dzi",
+            "tile_url_template": f"/tiles/{pid}/image_files/{{level}}/{{col}}_{{row}}.jpg",
+        }
+    }
+
+
+@app.get("/tiles/{pyramid_id}/image.dzi")
+def tile_pyramid_dzi(pyramid_id: str):
+    path = tile_pyramids.dzi_path(pyramid_id) if pyramid_id.isalnum() else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Tile pyramid not found")
+    return FileResponse(path, media_type="application/xml", headers=_TILE_CACHE_HEADERS)
+
+
+@app.get("/tiles/{pyramid_id}/image_files/{level}/{tile_name}")
+def tile_pyramid_tile(pyramid_id: str, level: int, tile_name: str):
+    col, sep, row = tile_name.removesuffix(".jpg").partition("_")
+    path = None
+    if pyramid_id.isalnum() and sep and col.isdigit() and row.isdigit():
+        path = tile_pyramids.tile_path(pyramid_id, level, int(col), int(row))
+    if path is None:
+        raise HTTPException(status_code=404, detail="Tile not found")
+    return FileResponse(path, media_type="image/jpeg", headers=_TILE_CACHE_HEADERS)
+
+
+@app.get("/tilePyramids")
+def tile_pyramid_stats():
+    return {"data": tile_pyramids.stats()}
+
+
+async def _render_graded_image(artifact_path: str, out_path: str) -> str:
+    return await grading_executor.run(_render_artifact_sync, None, artifact_path, out_path)
+
+
+async def _ensure_graded_image(image_path: str) -> bool:
+    """Render overlay dari artifact jika `image_path` adalah overlay lazy yang belum ada."""
+    try:
+        return await grading_artifacts.ensure_rendered(image_path, _render_graded_image)
+    except GradingQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@app.get("/rethreshold")
+async def rethreshold_run(
+    graded_image_path: str,
+    t1: int = 150,
+    t2: int = 160,
+    t3: int = 168,
+    w_reject: Union[float, None] = None,
+    w_grade_d: Union[float, None] = None,
+    w_grade_c: Union[float, None] = None,
+):
+    """Hitung ulang run lama dengan threshold / bobot ppb lain dari artifact-nya.
+
+    Tanpa overlay dan tanpa insert MySQL (seperti /gradeSweep). Cepat jika run
+    disimpan dengan GRADING_ARTIFACT_NDFI=1; jika tidak (atau ROI auto dengan
+    t3 berbeda), gambar original di-decode ulang.
+    """
+    thresholds = _validate_thresholds(t1, t2, t3)
+    ppb_params = _get_ppb_scoring_params({"w_reject": w_reject, "w_grade_d": w_grade_d, "w_grade_c": w_grade_c})
+    artifact_path = grading_artifacts.path_for(graded_image_path)
+    if not os.path.isfile(artifact_path):
+        raise HTTPException(status_code=404, detail="No grading artifact for this run")
+    try:
+        graded = await grading_executor.run(_rethreshold_sync, None, artifact_path, thresholds, ppb_params)
+    except GradingQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if graded["roi"] is None:
+        graded.pop("roi")
+    graded["thresholds"] = {"t1": thresholds[0], "t2": thresholds[1], "t3": thresholds[2]}
+    graded["graded_image_path"] = graded_image_path
+    return {"data": graded}
+
+
+@app.get("/vectorOverlay")
+async def vector_overlay(graded_image_path: str):
+    """Overlay vektor untuk run yang sudah ada (dari artifact-nya, tanpa decode gambar)."""
+    artifact_path = grading_artifacts.path_for(graded_image_path)
+    if not os.path.isfile(artifact_path):
+        raise HTTPException(status_code=404, detail="Artifact grading untuk run ini tidak ditemukan")
+    try:
+        data = await grading_executor.run(_vector_artifact_sync, None, artifact_path)
+    except GradingQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except FileNotFoundError:
+        # Artifact terhapus (mis. pembersihan folder) setelah dicek di atas.
+        raise HTTPException(status_code=404, detail="Artifact grading untuk run ini tidak ditemukan")
+    except ValueError as e:
+        # ArtifactCorrupt (file rusak / terpotong) atau isi artifact yang tidak bisa divektorisasi.
+        raise HTTPException(status_code=422, detail=f"Artifact grading tidak bisa dibaca: {e}")
+    return {"data": data}
+
+
+@app.get("/gradingArtifacts")
+def grading_artifact_stats():
+    return {"data": grading_artifacts.stats()}
+
+
 @app.get("/openImage")
-def open_image(image_path: str):
+async def open_image(image_path: str):
     try:
         if image_path is None or image_path.strip() == "" or image_path.strip().lower() == "null":
             raise HTTPException(status_code=400, detail="image_path is required")
-        image = cv2.imread(image_path)
-        if image is None:
+        await _ensure_graded_image(image_path)
+        # Cek keberadaan saja; decode JPEG penuh di sini akan memblokir event loop.
+        if not os.path.isfile(image_path):
             raise HTTPException(status_code=404, detail="Image not found")
 
         return FileResponse(image_path)
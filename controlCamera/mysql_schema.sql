@@ -6,6 +6,8 @@
 
 CREATE TABLE IF NOT EXISTS grading_runs (
   id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  -- UUID dari aplikasi: response bisa langsung memakainya sebelum baris tersimpan
+  run_uuid CHAR(36) NULL,
   captured_at DATETIME NOT NULL,
   final_grade VARCHAR(32) NOT NULL,
   batch_id VARCHAR(64) NULL,
@@ -29,6 +31,84 @@ CREATE TABLE IF NOT EXISTS grading_runs (
 
   created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (id),
-  KEY idx_captured_at (captured_at),
-  KEY idx_final_grade (final_grade)
+  UNIQUE KEY uq_run_uuid (run_uuid),
+  -- Index untuk /gradingHistory: keyset (captured_at, id) + filter.
+  KEY idx_captured_at (captured_at, id),
+  KEY idx_batch_captured (batch_id, captured_at, id),
+  KEY idx_tray_captured (tray_id, captured_at, id),
+  KEY idx_final_grade_captured (final_grade, captured_at, id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Migrasi untuk tabel grading_runs yang sudah ada:
+-- ALTER TABLE grading_runs ADD COLUMN run_uuid CHAR(36) NULL AFTER id, ADD UNIQUE KEY uq_run_uuid (run_uuid);
+-- ALTER TABLE grading_runs
+--   DROP INDEX idx_final_grade,
+--   DROP INDEX idx_captured_at,
+--   ADD KEY idx_captured_at (captured_at, id),
+--   ADD KEY idx_batch_captured (batch_id, captured_at, id),
+--   ADD KEY idx_tray_captured (tray_id, captured_at, id),
+--   ADD KEY idx_final_grade_captured (final_grade, captured_at, id);
+
+-- Satu baris per objek terdeteksi, agar analitik per objek bisa dijalankan di database
+CREATE TABLE IF NOT EXISTS grading_objects (
+  id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+  grading_run_id BIGINT UNSIGNED NOT NULL,
+  captured_at DATETIME NOT NULL,
+  object_id INT UNSIGNED NOT NULL,
+  grade VARCHAR(16) NOT NULL,
+
+  total_pixels INT UNSIGNED NOT NULL,
+  reject_pixels INT UNSIGNED NOT NULL,
+  grade_d_pixels INT UNSIGNED NOT NULL,
+  grade_c_pixels INT UNSIGNED NOT NULL,
+  mean_brightness DOUBLE NOT NULL,
+  ppb DOUBLE NOT NULL,
+
+  bbox_x INT NOT NULL,
+  bbox_y INT NOT NULL,
+  bbox_width INT UNSIGNED NOT NULL,
+  bbox_height INT UNSIGNED NOT NULL,
+
+  PRIMARY KEY (id),
+  UNIQUE KEY uq_run_object (grading_run_id, object_id),
+  KEY idx_grade_ppb (grade, ppb),
+  KEY idx_grade_captured (grade, captured_at),
+  KEY idx_ppb (ppb),
+  CONSTRAINT fk_grading_objects_run FOREIGN KEY (grading_run_id)
+    REFERENCES grading_runs (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Rollup grading_runs, di-update inkremental saat insert.
+-- Bangun ulang dari data lama: python grading_rollups.py
+CREATE TABLE IF NOT EXISTS grading_rollup_hourly (
+  bucket_start DATETIME NOT NULL,
+  final_grade VARCHAR(32) NOT NULL,
+  runs INT UNSIGNED NOT NULL,
+  ppb_total_sum DOUBLE NOT NULL,
+  reject_pixels_sum BIGINT UNSIGNED NOT NULL,
+  total_area_pixels_sum BIGINT UNSIGNED NOT NULL,
+  PRIMARY KEY (bucket_start, final_grade)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS grading_rollup_daily (
+  bucket_start DATE NOT NULL,
+  final_grade VARCHAR(32) NOT NULL,
+  runs INT UNSIGNED NOT NULL,
+  ppb_total_sum DOUBLE NOT NULL,
+  reject_pixels_sum BIGINT UNSIGNED NOT NULL,
+  total_area_pixels_sum BIGINT UNSIGNED NOT NULL,
+  PRIMARY KEY (bucket_start, final_grade)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS grading_rollup_batch (
+  batch_id VARCHAR(64) NOT NULL,
+  final_grade VARCHAR(32) NOT NULL,
+  runs INT UNSIGNED NOT NULL,
+  ppb_total_sum DOUBLE NOT NULL,
+  reject_pixels_sum BIGINT UNSIGNED NOT NULL,
+  total_area_pixels_sum BIGINT UNSIGNED NOT NULL,
+  first_captured_at DATETIME NOT NULL,
+  last_captured_at DATETIME NOT NULL,
+  PRIMARY KEY (batch_id, final_grade),
+  KEY idx_last_captured (last_captured_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,188 @@
+import asyncio
+import time
+import uuid
+
+
+class ScanSession:
+    """Scan kontinu satu batch: capture tray N+1 berjalan saat tray N di-grading.
+
+    Dua tahap dihubungkan antrian berukuran 1, sehingga kamera tidak menunggu
+    grading selesai tetapi juga tidak menumpuk foto. Throughput mendekati
+    max(capture, grading), bukan jumlah keduanya.
+
+    - `capture(index) -> path` (async): ambil foto tray ke-`index`
+    - `grade(index, path) -> dict` (async): grading + simpan hasil
+    - mode "interval": capture otomatis tiap `interval` detik (0 = secepatnya)
+    - mode "trigger": capture hanya saat `trigger()` dipanggil
+    """
+
+    def __init__(
+        self,
+        capture,
+        grade,
+        batch_id: str | None = None,
+        mode: str = "interval",
+        interval: float = 0.0,
+        max_trays: int | None = None,
+    ):
+        if mode not in ("interval", "trigger"):
+            raise ValueError("mode must be 'interval' or 'trigger'")
+        self.id = uuid.uuid4().hex[:12]
+        self.batch_id = batch_id
+        self.mode = mode
+        self.interval = max(float(interval), 0.0)
+        self.max_trays = max_trays if max_trays and max_trays > 0 else None
+        self._capture = capture
+        self._grade = grade
+
+        self.state = "created"
+        self.started_at = None
+        self.stopped_at = None
+        self.captured = 0
+        self.graded = 0
+        self.failed = 0
+        self.capture_seconds_total = 0.0
+        self.grade_seconds_total = 0.0
+
+        self._pending = asyncio.Queue(maxsize=1)
+        self._triggers = asyncio.Queue()
+        self._stop = asyncio.Event()
+        self._events = []
+        self._subscribers = set()
+        self._tasks = []
+
+    @property
+    def active(self) -> bool:
+        return self.state in ("running", "stopping")
+
+    def start(self):
+        self.state = "running"
+        self.started_at = time.time()
+        self._tasks = [
+            asyncio.create_task(self._capture_loop()),
+            asyncio.create_task(self._grade_loop()),
+        ]
+        self._emit({"event": "started", **self.status()})
+
+    def stop(self):
+        """Hentikan capture; tray yang sudah difoto tetap di-grading."""
+        if self.state == "running":
+            self.state = "stopping"
+            self._stop.set()
+
+    def trigger(self, count: int = 1):
+        for _ in range(max(int(count), 1)):
+            self._triggers.put_nowait(True)
+
+    async def wait_closed(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _emit(self, event: dict):
+        event = {"session_id": self.id, "time": time.time(), **event}
+        self._events.append(event)
+        if len(self._events) > 500:
+            del self._events[:-500]
+        for queue in list(self._subscribers):
+            queue.put_nowait(event)
+
+    async def events(self, replay: bool = True):
+        """Async iterator status (event lama di-replay dulu); selesai saat sesi berhenti."""
+        queue = asyncio.Queue()
+        # Snapshot + subscribe tanpa await di antaranya: tidak ada event yang hilang/ganda.
+        self._subscribers.add(queue)
+        try:
+            if replay:
+                for event in list(self._events):
+                    yield event
+            if self.state == "stopped":
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] == "stopped":
+                    return
+        finally:
+            self._subscribers.discard(queue)
+
+    async def _next_shot(self) -> bool:
+        """Tunggu giliran capture berikutnya; False jika sesi dihentikan."""
+        if self.max_trays is not None and self.captured >= self.max_trays:
+            return False
+        stop_wait = asyncio.create_task(self._stop.wait())
+        if self.mode == "trigger":
+            waiter = asyncio.create_task(self._triggers.get())
+        else:
+            waiter = asyncio.create_task(asyncio.sleep(self.interval if self.captured else 0))
+        try:
+            await asyncio.wait({stop_wait, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop_wait.cancel()
+            waiter.cancel()
+        return not self._stop.is_set()
+
+    async def _capture_loop(self):
+        index = 0
+        try:
+            while await self._next_shot():
+                index += 1
+                started = time.monotonic()
+                try:
+                    path = await self._capture(index)
+                except Exception as e:
+                    self.failed += 1
+                    self._emit({"event": "error", "stage": "capture", "tray_index": index, "error": str(e)})
+                    # Jeda singkat agar kamera yang mati tidak memicu loop error tanpa henti.
+                    try:
+                        await asyncio.wait_for(self._stop.wait(), 1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                elapsed = time.monotonic() - started
+                self.captured += 1
+                self.capture_seconds_total += elapsed
+                self._emit({"event": "captured", "tray_index": index, "image_path": path, "capture_seconds": elapsed})
+                # Menunggu di sini jika grading tray sebelumnya belum mulai (antrian ukuran 1).
+                await self._pending.put((index, path))
+        finally:
+            await self._pending.put(None)
+
+    async def _grade_loop(self):
+        while True:
+            item = await self._pending.get()
+            if item is None:
+                break
+            index, path = item
+            started = time.monotonic()
+            try:
+                result = await self._grade(index, path)
+            except Exception as e:
+                self.failed += 1
+                self._emit({"event": "error", "stage": "grade", "tray_index": index, "image_path": path, "error": str(e)})
+                continue
+            elapsed = time.monotonic() - started
+            self.graded += 1
+            self.grade_seconds_total += elapsed
+            self._emit({"event": "graded", "tray_index": index, "grade_seconds": elapsed, "result": result})
+
+        self.state = "stopped"
+        self.stopped_at = time.time()
+        self._emit({"event": "stopped", **self.status()})
+
+    def status(self) -> dict:
+        end = self.stopped_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "session_id": self.id,
+            "state": self.state,
+            "batch_id": self.batch_id,
+            "mode": self.mode,
+            "interval": self.interval,
+            "max_trays": self.max_trays,
+            "captured": self.captured,
+            "graded": self.graded,
+            "failed": self.failed,
+            "avg_capture_seconds": self.capture_seconds_total / self.captured if self.captured else None,
+            "avg_grade_seconds": self.grade_seconds_total / self.graded if self.graded else None,
+            "trays_per_minute": self.graded * 60.0 / elapsed if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modul controlCamera di-import flat (seperti saat server dijalankan dari folder ini).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
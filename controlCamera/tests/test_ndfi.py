@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+
+from grading_engine import NDFI_LUT, compute_ndfi_normalized
+
+
+def _reference_ndfi(filtered_image: np.ndarray) -> np.ndarray:
+    """Rumus float64 asli sebelum tabel (B, G) dipakai."""
+    B, G, R = cv2.split(filtered_image)
+    B = B.astype(float)
+    G = G.astype(float)
+    NDFI = (B - G) / (B + G + 0.0001)
+    return ((NDFI + 1.0) * 127.5).astype(np.uint8)
+
+
+def test_lut_matches_formula_for_every_pair():
+    B, G = np.meshgrid(np.arange(256), np.arange(256), indexing="ij")
+    image = np.dstack([B, G, np.zeros_like(B)]).astype(np.uint8)
+
+    expected = _reference_ndfi(image)
+    assert np.array_equal(NDFI_LUT, expected)
+    assert np.array_equal(compute_ndfi_normalized(image), expected)
+
+
+def test_full_frame_matches_formula():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (1003, 1501, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(cv2.medianBlur(frame, 5), (9, 9), 0)
+
+    expected = _reference_ndfi(frame)
+    # Ukuran potongan yang tidak membagi tinggi frame, dan view ROI yang tidak contiguous.
+    assert np.array_equal(compute_ndfi_normalized(frame), expected)
+    assert np.array_equal(compute_ndfi_normalized(frame, rows_per_chunk=97), expected)
+    assert np.array_equal(compute_ndfi_normalized(frame[101:900, 33:1400]), expected[101:900, 33:1400])
@@ -0,0 +1,134 @@
+import asyncio
+import importlib
+import importlib.util
+import os
+
+import httpx
+import pytest
+
+# storage_uploader ada di folder firebase/; dimuat dari path agar `copyToRaspi2`
+# tetap merujuk relay di controlCamera/ (relay firebase butuh kredensial Firebase).
+_spec = importlib.util.spec_from_file_location(
+    "storage_uploader",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "firebase", "storage_uploader.py"),
+)
+storage_uploader = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(storage_uploader)
+StorageUploader = storage_uploader.StorageUploader
+
+JPEG = b"\xff\xd8" + bytes(range(256)) * 64 + b"\xff\xd9"
+
+
+class _StrictBlob:
+    """Blob palsu yang, seperti google-cloud-storage, hanya menerima bytes / str."""
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.public_url = f"https://storage.test/{name}"
+
+    def upload_from_string(self, data, content_type=None):
+        if not isinstance(data, (bytes, str)):
+            raise TypeError(f"{data!r:.20} could not be converted to bytes")
+        self.bucket.uploaded[self.name] = data
+
+    def make_public(self):
+        pass
+
+
+class _StrictBucket:
+    def __init__(self):
+        self.uploaded = {}
+
+    def blob(self, name):
+        return _StrictBlob(self, name)
+
+
+@pytest.fixture
+def relay(tmp_path, monkeypatch):
+    # Relay membuat FOLDER_PATH relatif saat di-import; arahkan ke folder sementara.
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("copyToRaspi2")
+
+    async def handler(request):
+        async def body():
+            for start in range(0, len(JPEG), 1000):
+                yield JPEG[start : start + 1000]
+
+        return httpx.Response(200, content=body())
+
+    monkeypatch.setattr(module, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return module
+
+
+def test_fetched_body_uploads_as_bytes(relay, tmp_path):
+    bucket = _StrictBucket()
+    uploader = StorageUploader(bucket_factory=lambda: bucket, retries=0)
+    save_path = str(tmp_path / "original.jpg")
+
+    async def fetch_and_upload():
+        data, _ = await relay.fetch_data_from_third_party_api("http://pi.test/captureImage", save_path)
+        assert type(data) is bytes
+        return await uploader.start_upload(data, "original.jpg")
+
+    try:
+        url = asyncio.run(fetch_and_upload())
+    finally:
+        uploader.shutdown()
+
+    assert url == "https://storage.test/image/original.jpg"
+    assert bucket.uploaded["image/original.jpg"] == JPEG
+    with open(save_path, "rb") as f:
+        assert f.read() == JPEG
+
+
+class _FlakyBucket(_StrictBucket):
+    """Bucket yang melempar `errors` berurutan sebelum upload berhasil."""
+
+    def __init__(self, errors):
+        super().__init__()
+        self.errors = list(errors)
+        self.attempts = 0
+
+    def blob(self, name):
+        blob = super().blob(name)
+        upload = blob.upload_from_string
+
+        def upload_from_string(data, content_type=None):
+            self.attempts += 1
+            if self.errors:
+                raise self.errors.pop(0)
+            upload(data, content_type)
+
+        blob.upload_from_string = upload_from_string
+        return blob
+
+
+def _upload(bucket, data=JPEG):
+    uploader = StorageUploader(bucket_factory=lambda: bucket, retries=3, backoff=0)
+    try:
+        asyncio.run(uploader.upload_bytes(data, "original.jpg"))
+    finally:
+        uploader.shutdown()
+    return uploader
+
+
+def test_transient_errors_are_retried():
+    bucket = _FlakyBucket([ConnectionError("reset"), TimeoutError("slow")])
+    uploader = _upload(bucket)
+    assert bucket.attempts == 3
+    assert uploader.stats()["retried"] == 2
+    assert bucket.uploaded["image/original.jpg"] == JPEG
+
+
+def test_other_errors_are_not_retried():
+    bucket = _FlakyBucket([PermissionError("403 Forbidden")])
+    with pytest.raises(PermissionError):
+        _upload(bucket)
+    assert bucket.attempts == 1
+
+
+def test_bytearray_is_coerced_to_bytes():
+    bucket = _StrictBucket()
+    _upload(bucket, bytearray(JPEG))
+    assert type(bucket.uploaded["image/original.jpg"]) is bytes
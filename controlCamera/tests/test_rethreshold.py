@@ -0,0 +1,76 @@
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+import main2
+from grading_engine import parse_roi_spec, resolve_roi
+
+COMPARED_KEYS = (
+    "final_grade",
+    "total_area_pixels",
+    "total_area_percentage",
+    "total_objects",
+    "ppb_total",
+    "summary_by_grade",
+    "roi",
+)
+
+
+@pytest.fixture(scope="module")
+def tray_image(tmp_path_factory):
+    """Latar gelap dengan kernel biasa dan satu kernel ber-NDFI tinggi jauh di pojok.
+
+    Kernel kedua hanya masuk ROI auto jika t3 cukup tinggi (168 ya, 120 tidak),
+    jadi ROI berubah bersama t3.
+    """
+    rng = np.random.default_rng(3)
+    image = rng.integers(0, 20, (600, 800, 3), dtype=np.uint8)
+    cv2.circle(image, (200, 200), 60, (120, 120, 90), -1)
+    cv2.circle(image, (230, 190), 15, (150, 110, 90), -1)
+    cv2.circle(image, (650, 450), 40, (200, 60, 40), -1)
+    path = tmp_path_factory.mktemp("rethreshold") / "tray.png"
+    cv2.imwrite(str(path), image)
+    return str(path), image
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _shutdown_executor():
+    yield
+    main2.grading_executor.shutdown()
+
+
+def _grade_fresh(path: str, thresholds, roi) -> dict:
+    return asyncio.run(
+        main2.grade_using_cv(path, thresholds=thresholds, roi=roi, save_to_db=False, render=False)
+    )
+
+
+@pytest.mark.parametrize("store_ndfi", [True, False])
+@pytest.mark.parametrize("new_thresholds", [(150, 160, 168), (100, 110, 120), (150, 160, 200)])
+def test_rethreshold_matches_fresh_grading(tmp_path, tray_image, store_ndfi, new_thresholds):
+    path, image = tray_image
+    roi = parse_roi_spec("auto")
+    ppb_params = main2._get_ppb_scoring_params()
+    artifact_path = str(tmp_path / "run.npz")
+    artifact = {
+        "path": artifact_path,
+        "store_ndfi": store_ndfi,
+        "original_image_path": path,
+        "roi_config": roi,
+    }
+    main2._grade_frame_sync(image, (150, 160, 168), ppb_params, roi, artifact)
+
+    rethresholded = main2._rethreshold_sync(artifact_path, new_thresholds, ppb_params)
+    fresh = _grade_fresh(path, new_thresholds, roi)
+
+    for key in COMPARED_KEYS:
+        assert rethresholded[key] == fresh.get(key), key
+
+
+def test_auto_roi_depends_on_t3(tray_image):
+    # Prasyarat test di atas: tanpa ini perbandingan t3 berbeda tidak menguji apa-apa.
+    _, image = tray_image
+    roi = parse_roi_spec("auto")
+    assert resolve_roi(roi, image, 168) != resolve_roi(roi, image, 120)
@@ -0,0 +1,65 @@
+import pymysql.cursors
+
+import main2
+from grading_rollups import GRADING_RUN_COLUMNS, apply_rollups
+
+
+class _RecordingCursor:
+    def __init__(self):
+        self.calls = []
+
+    def executemany(self, sql, rows):
+        self.calls.append((sql, list(rows)))
+
+
+def _grading_data(**overrides) -> dict:
+    data = {
+        "final_grade": "GRADE D",
+        "batch_id": "batch-7",
+        "tray_id": "tray-2",
+        "total_area_pixels": 1200,
+        "total_area_percentage": 1.5,
+        "total_objects": 3,
+        "ppb_total": 42.5,
+        "summary_by_grade": {
+            "REJECT": {"total_pixels": 40, "total_objects": 1},
+            "GRADE D": {"total_pixels": 300, "total_objects": 1},
+            "GRADE C": {"total_pixels": 860, "total_objects": 1},
+        },
+        "original_image_path": "/fotohasil/original.jpg",
+        "graded_image_path": None,
+    }
+    data.update(overrides)
+    return data
+
+
+def test_grading_row_follows_column_order():
+    row = main2._build_grading_row(_grading_data(), "uuid-1")
+    named = dict(zip(GRADING_RUN_COLUMNS, row))
+
+    assert len(row) == len(GRADING_RUN_COLUMNS)
+    assert named["run_uuid"] == "uuid-1"
+    assert named["final_grade"] == "GRADE D"
+    assert named["batch_id"] == "batch-7"
+    assert named["total_area_pixels"] == 1200
+    assert named["reject_total_pixels"] == 40
+    assert named["graded_image_path"] == ""
+
+
+def test_insert_sql_is_batched_by_pymysql():
+    # executemany hanya menggabungkan baris menjadi satu INSERT jika SQL cocok dengan pola ini.
+    assert pymysql.cursors.RE_INSERT_VALUES.match(main2._INSERT_GRADING_SQL)
+
+
+def test_rollups_read_the_built_row():
+    row = main2._build_grading_row(_grading_data(), "uuid-1")
+    captured_at = dict(zip(GRADING_RUN_COLUMNS, row))["captured_at"]
+    cursor = _RecordingCursor()
+
+    # Tanpa ppb_totals: nilai ppb dibaca dari detail_json (format spool lama).
+    apply_rollups(cursor, [row])
+
+    hourly, daily, batch = cursor.calls
+    assert hourly[1] == [(captured_at[:13] + ":00:00", "GRADE D", 1, 42.5, 40, 1200)]
+    assert daily[1] == [(captured_at[:10], "GRADE D", 1, 42.5, 40, 1200)]
+    assert batch[1] == [("batch-7", "GRADE D", 1, 42.5, 40, 1200, captured_at, captured_at)]
@@ -0,0 +1,64 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import main2
+from grading_engine import parse_roi_spec
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _shutdown_executor():
+    yield
+    main2.grading_executor.shutdown()
+
+
+@pytest.fixture
+def artifact_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(main2.grading_artifacts, "root", str(tmp_path))
+    return tmp_path
+
+
+def _vector_overlay(graded_image_path: str) -> dict:
+    return asyncio.run(main2.vector_overlay(graded_image_path))
+
+
+def _write_artifact(artifact_root) -> str:
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    image[40:80, 50:110] = (200, 60, 40)
+    artifact = {"path": str(artifact_root / "run.npz"), "store_ndfi": False, "roi_config": parse_roi_spec(None)}
+    main2._grade_frame_sync(image, (150, 160, 168), main2._get_ppb_scoring_params(), parse_roi_spec(None), artifact)
+    return artifact["path"]
+
+
+def test_valid_artifact(artifact_root):
+    _write_artifact(artifact_root)
+    data = _vector_overlay("/graded/run.jpg")["data"]
+    assert data["image_size"] == {"width": 160, "height": 120}
+
+
+def test_missing_artifact_is_404(artifact_root):
+    with pytest.raises(HTTPException) as excinfo:
+        _vector_overlay("/graded/missing.jpg")
+    assert excinfo.value.status_code == 404
+
+
+@pytest.mark.parametrize("damage", ["truncated", "garbage", "no_meta"])
+def test_unreadable_artifact_is_422(artifact_root, damage):
+    path = _write_artifact(artifact_root)
+    if damage == "truncated":
+        with open(path, "rb") as f:
+            content = f.read()
+        with open(path, "wb") as f:
+            f.write(content[: len(content) // 2])
+    elif damage == "garbage":
+        with open(path, "wb") as f:
+            f.write(b"not an npz file")
+    else:
+        with open(path, "wb") as f:
+            np.savez(f, labels=np.zeros(4, dtype=np.uint8))
+
+    with pytest.raises(HTTPException) as excinfo:
+        _vector_overlay("/graded/run.jpg")
+    assert excinfo.value.status_code == 422
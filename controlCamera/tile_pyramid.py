@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import shutil
+
+import cv2
+
+
+def _get_int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return int(default)
+
+
+def pyramid_id(image_path: str) -> str:
+    """Id pyramid dari path + mtime + ukuran file: file yang berubah dapat id baru."""
+    stat = os.stat(image_path)
+    key = f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def build_pyramid(image_path: str, out_dir: str, tile_size: int, overlap: int, quality: int) -> dict:
+    """Tulis pyramid tile gaya Deep Zoom (DZI) ke `out_dir` (dijalankan di worker).
+
+    Layout: `out_dir/info.json`, `out_dir/image.dzi` dan
+    `out_dir/image_files/{level}/{col}_{row}.jpg`. Level tertinggi = resolusi
+    penuh, tiap level di bawahnya setengah ukuran, level 0 = 1x1 piksel.
+    Ditulis ke folder sementara lalu di-rename, jadi pembaca tidak pernah
+    melihat pyramid setengah jadi.
+    """
+    image = cv2.imread(str(image_path))
+    if image is None:
+        raise ValueError("Image not found or the path is incorrect")
+    height, width = image.shape[:2]
+    max_level = int(math.ceil(math.log2(max(width, height, 1))))
+
+    tmp_dir = f"{out_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), int(quality)]
+    tiles = 0
+
+    level_image = image
+    for level in range(max_level, -1, -1):
+        level_height, level_width = level_image.shape[:2]
+        level_dir = os.path.join(tmp_dir, "image_files", str(level))
+        os.makedirs(level_dir)
+        for row in range(int(math.ceil(level_height / tile_size))):
+            for col in range(int(math.ceil(level_width / tile_size))):
+                x0 = max(col * tile_size - overlap, 0)
+                y0 = max(row * tile_size - overlap, 0)
+                x1 = min((col + 1) * tile_size + overlap, level_width)
+                y1 = min((row + 1) * tile_size + overlap, level_height)
+                ok, encoded = cv2.imencode(".jpg", level_image[y0:y1, x0:x1], params)
+                if not ok:
+                    raise ValueError("Failed to encode tile")
+                with open(os.path.join(level_dir, f"{col}_{row}.jpg"), "wb") as f:
+                    f.write(encoded.tobytes())
+                tiles += 1
+        if level > 0:
+            # Ukuran level berikutnya = ceil(ukuran / 2), sesuai spesifikasi DZI.
+            next_size = ((level_width + 1) // 2, (level_height + 1) // 2)
+            level_image = cv2.resize(level_image, next_size, interpolation=cv2.INTER_AREA)
+
+    meta = {
+        "width": int(width),
+        "height": int(height),
+        "tile_size": int(tile_size),
+        "overlap": int(overlap),
+        "format": "jpg",
+        "max_level": max_level,
+        "tiles": tiles,
+        "source_path": os.path.abspath(image_path),
+    }
+    with open(os.path.join(tmp_dir, "image.dzi"), "w") as f:
+        f.write(dzi_xml(meta))
+    with open(os.path.join(tmp_dir, "info.json"), "w") as f:
+        json.dump(meta, f)
+
+    try:
+        os.rename(tmp_dir, out_dir)
+    except OSError:
+        # Worker lain sudah selesai lebih dulu untuk gambar yang sama.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return meta
+
+
+def dzi_xml(meta: dict) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" '
+        f'Format="{meta["format"]}" Overlap="{meta["overlap"]}" TileSize="{meta["tile_size"]}">'
+        f'<Size Width="{meta["width"]}" Height="{meta["height"]}"/></Image>\n'
+    )
+
+
+class TilePyramidStore:
+    """Pyramid tile per gambar (original / hasil grading), dibuat lazy di background.
+
+    Pyramid dibuat saat pertama kali diminta (atau langsung setelah grading
+    jika TILE_PYRAMID_ON_GRADE=1) lewat `run_job(func, *args)`, biasanya
+    `grading_executor`. Permintaan bersamaan untuk gambar yang sama menunggu
+    satu job yang sama. Karena id berubah saat file berubah, tile boleh
+    di-cache client selamanya.
+
+    Konfigurasi lewat environment variables:
+    - TILE_CACHE_DIR: folder penyimpanan pyramid
+    - TILE_SIZE / TILE_OVERLAP: ukuran tile dan overlap (piksel)
+    - TILE_JPEG_QUALITY: kualitas JPEG tile
+    - TILE_PYRAMID_ON_GRADE: 1 untuk membuat pyramid langsung setelah grading
+    """
+
+    def __init__(
+        self,
+        run_job,
+        root: str | None = None,
+        tile_size: int | None = None,
+        overlap: int | None = None,
+        quality: int | None = None,
+    ):
+        if root is None:
+            root = os.getenv("TILE_CACHE_DIR", "/home/ubuntu/fotohasil/tiles")
+        if tile_size is None:
+            tile_size = _get_int_env("TILE_SIZE", 256)
+        if overlap is None:
+            overlap = _get_int_env("TILE_OVERLAP", 1)
+        if quality is None:
+            quality = _get_int_env("TILE_JPEG_QUALITY", 85)
+
+        self.run_job = run_job
+        self.root = root
+        self.tile_size = max(int(tile_size), 16)
+        self.overlap = max(int(overlap), 0)
+        self.quality = min(max(int(quality), 1), 100)
+        self.on_grade = os.getenv("TILE_PYRAMID_ON_GRADE", "0") == "1"
+
+        self._building = {}
+        self.built = 0
+        self.build_errors = 0
+        self.tiles_written = 0
+
+    def _dir(self, pid: str) -> str:
+        return os.path.join(self.root, pid)
+
+    def load_meta(self, pid: str) -> dict | None:
+        try:
+            with open(os.path.join(self._dir(pid), "info.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def ensure(self, image_path: str) -> tuple[str, dict]:
+        """Kembalikan (id, meta) pyramid untuk `image_path`, buat dulu jika belum ada."""
+        pid = pyramid_id(image_path)
+        meta = self.load_meta(pid)
+        if meta is not None:
+            return pid, meta
+
+        future = self._building.get(pid)
+        if future is None:
+            future = asyncio.ensure_future(self._build(pid, image_path))
+            self._building[pid] = future
+            future.add_done_callback(lambda _: self._building.pop(pid, None))
+        return pid, await asyncio.shield(future)
+
+    async def _build(self, pid: str, image_path: str) -> dict:
+        os.makedirs(self.root, exist_ok=True)
+        try:
+            meta = await self.run_job(
+                build_pyramid,
+                os.path.abspath(image_path),
+                self._dir(pid),
+                self.tile_size,
+                self.overlap,
+                self.quality,
+            )
+        except Exception:
+            self.build_errors += 1
+            raise
+        self.built += 1
+        self.tiles_written += meta["tiles"]
+        return meta
+
+    def schedule(self, image_path: str):
+        """Buat pyramid di background tanpa menunggu hasilnya."""
+
+        def _log_error(task):
+            if not task.cancelled() and task.exception() is not None:
+                print(f"⚠️  Failed to build tile pyramid for {image_path}: {task.exception()}")
+
+        asyncio.ensure_future(self.ensure(image_path)).add_done_callback(_log_error)
+
+    def tile_path(self, pid: str, level: int, col: int, row: int) -> str | None:
+        path = os.path.join(self._dir(pid), "image_files", str(int(level)), f"{int(col)}_{int(row)}.jpg")
+        return path if os.path.isfile(path) else None
+
+    def dzi_path(self, pid: str) -> str | None:
+        path = os.path.join(self._dir(pid), "image.dzi")
+        return path if os.path.isfile(path) else None
+
+    def stats(self) -> dict:
+        return {
+            "root": self.root,
+            "tile_size": self.tile_size,
+            "overlap": self.overlap,
+            "on_grade": self.on_grade,
+            "building": len(self._building),
+            "built": self.built,
+            "build_errors": self.build_errors,
+            "tiles_written": self.tiles_written,
+        }